@@ -12,6 +12,21 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+# Réplicas de solo lectura (opcional). Cada entrada sobrescribe los parámetros de DB_CONFIG
+# que indique, p. ej. [{'host': 'replica1.local'}, {'host': 'replica2.local', 'port': 3307}]
+DB_REPLICAS = []
+
+# Retraso máximo de replicación (segundos) tolerado para enviar lecturas a una réplica
+DB_REPLICA_MAX_LAG = 5
+
+# Agrupación de inserciones de pesajes (opcional): las filas que llegan dentro de la ventana, hasta
+# max_filas, se escriben en una sola transacción con un solo commit
+DB_AGRUPACION = {
+    'activa': False,
+    'ventana_ms': 2,
+    'max_filas': 200
+}
+
 # Función para obtener los parámetros de conexión
 def get_db_config():
     """Retorna la configuración actual de la base de datos"""
@@ -46,4 +61,45 @@ def get_connection_string():
         f"{config['host']}:{config['port']}/{config['database']}?"
         f"charset={config['charset']}"
     )
-    return conn_str
\ No newline at end of file
+    return conn_str
+
+# Función para obtener los parámetros de conexión de las réplicas
+def get_replicas_config():
+    """Retorna la configuración completa de cada réplica de solo lectura"""
+    return [{**DB_CONFIG, **replica} for replica in DB_REPLICAS]
+
+# Función para obtener el retraso máximo de replicación tolerado
+def get_replica_max_lag():
+    """Retorna el retraso máximo de replicación (segundos) tolerado para leer de una réplica"""
+    return DB_REPLICA_MAX_LAG
+
+# Función para modificar las réplicas de solo lectura
+def set_replicas_config(replicas=None, max_lag=None):
+    """Actualiza las réplicas de solo lectura y el retraso máximo tolerado"""
+    global DB_REPLICAS, DB_REPLICA_MAX_LAG
+    
+    if replicas is not None:
+        DB_REPLICAS = list(replicas)
+    if max_lag is not None:
+        DB_REPLICA_MAX_LAG = max_lag
+    
+    return DB_REPLICAS
+
+# Función para obtener la configuración de la agrupación de inserciones
+def get_agrupacion_config():
+    """Retorna la configuración de la agrupación de inserciones"""
+    return DB_AGRUPACION
+
+# Función para modificar la agrupación de inserciones
+def set_agrupacion_config(activa=None, ventana_ms=None, max_filas=None):
+    """Actualiza la configuración de la agrupación de inserciones"""
+    global DB_AGRUPACION
+    
+    if activa is not None:
+        DB_AGRUPACION['activa'] = activa
+    if ventana_ms is not None:
+        DB_AGRUPACION['ventana_ms'] = ventana_ms
+    if max_filas is not None:
+        DB_AGRUPACION['max_filas'] = max_filas
+    
+    return DB_AGRUPACION
@@ -0,0 +1,73 @@
+"""
+Configuración de los dispositivos de entrada (escáner y balanza)
+"""
+
+# Configuración del escáner de etiquetas
+ESCANER_CONFIG = {
+    # Ruta del puerto serie del escáner (p. ej. '/dev/ttyACM0'); None usa solo el modo teclado
+    'puerto': None,
+    # Lecturas idénticas dentro de esta ventana se consideran rebotes del mismo escaneo
+    'antirrebote_ms': 50,
+    # Intervalo con el que la interfaz procesa las lecturas pendientes
+    'intervalo_proceso_ms': 10
+}
+
+# Función para obtener la configuración del escáner
+def get_escaner_config():
+    """Retorna la configuración actual del escáner"""
+    return ESCANER_CONFIG
+
+# Función para modificar la configuración del escáner
+def set_escaner_config(puerto=None, antirrebote_ms=None, intervalo_proceso_ms=None):
+    """Actualiza la configuración del escáner"""
+    global ESCANER_CONFIG
+    
+    if puerto is not None:
+        ESCANER_CONFIG['puerto'] = puerto
+    if antirrebote_ms is not None:
+        ESCANER_CONFIG['antirrebote_ms'] = antirrebote_ms
+    if intervalo_proceso_ms is not None:
+        ESCANER_CONFIG['intervalo_proceso_ms'] = intervalo_proceso_ms
+    
+    return ESCANER_CONFIG
+
+# Configuración de la balanza conectada por puerto serie
+BALANZA_CONFIG = {
+    # Ruta del puerto serie de la balanza; None desactiva la integración directa
+    'puerto': None,
+    # Lecturas consecutivas dentro de la ventana que deben coincidir para considerar estable el peso
+    'ventana_ms': 300,
+    'lecturas_minimas': 3,
+    # Variación máxima entre lecturas de un peso estable
+    'tolerancia_kg': 0.005,
+    # Pesos menores se consideran balanza vacía
+    'peso_minimo_kg': 0.02,
+    # Segundos durante los que un peso estable puede emparejarse con el escaneo de un producto
+    'vigencia_s': 10
+}
+
+# Función para obtener la configuración de la balanza
+def get_balanza_config():
+    """Retorna la configuración actual de la balanza"""
+    return BALANZA_CONFIG
+
+# Función para modificar la configuración de la balanza
+def set_balanza_config(puerto=None, ventana_ms=None, lecturas_minimas=None, tolerancia_kg=None,
+                       peso_minimo_kg=None, vigencia_s=None):
+    """Actualiza la configuración de la balanza"""
+    global BALANZA_CONFIG
+    
+    if puerto is not None:
+        BALANZA_CONFIG['puerto'] = puerto
+    if ventana_ms is not None:
+        BALANZA_CONFIG['ventana_ms'] = ventana_ms
+    if lecturas_minimas is not None:
+        BALANZA_CONFIG['lecturas_minimas'] = lecturas_minimas
+    if tolerancia_kg is not None:
+        BALANZA_CONFIG['tolerancia_kg'] = tolerancia_kg
+    if peso_minimo_kg is not None:
+        BALANZA_CONFIG['peso_minimo_kg'] = peso_minimo_kg
+    if vigencia_s is not None:
+        BALANZA_CONFIG['vigencia_s'] = vigencia_s
+    
+    return BALANZA_CONFIG
@@ -0,0 +1,175 @@
+"""
+Configuración del registro (logging) de la aplicación
+
+Los módulos solo obtienen su logger con logging.getLogger(nombre); el punto de entrada
+(main.py o servicio.py) llama una única vez a configurar_logging(). Los registros se
+encolan sin bloquear al hilo que los emite y un hilo de fondo los escribe en formato
+JSON (una línea por registro) en un archivo que rota por tamaño.
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Configuración del registro
+LOGGING_CONFIG = {
+    'nivel': logging.INFO,
+    # Tamaño máximo de cada archivo antes de rotarlo y cantidad de archivos anteriores conservados
+    'max_bytes': 5 * 1024 * 1024,
+    'copias': 5,
+    # Registros de advertencia o error idénticos admitidos por ventana; el resto se descarta
+    # y se informa la cantidad descartada en el siguiente registro admitido
+    'rafaga_maxima': 5,
+    'ventana_rafaga_segundos': 60,
+    # Consultas a la base de datos más lentas que este umbral se registran como advertencia
+    'consulta_lenta_ms': 500
+}
+
+# Campos estándar de LogRecord; cualquier otro atributo proviene de 'extra' y se incluye en el JSON
+_CAMPOS_ESTANDAR = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+# Función para obtener la configuración del registro
+def get_logging_config():
+    """Retorna la configuración actual del registro"""
+    return LOGGING_CONFIG
+
+# Función para modificar la configuración del registro
+def set_logging_config(nivel=None, max_bytes=None, copias=None, rafaga_maxima=None,
+                       ventana_rafaga_segundos=None, consulta_lenta_ms=None):
+    """Actualiza la configuración del registro (se aplica en la próxima llamada a configurar_logging)"""
+    global LOGGING_CONFIG
+
+    if nivel is not None:
+        LOGGING_CONFIG['nivel'] = nivel
+    if max_bytes is not None:
+        LOGGING_CONFIG['max_bytes'] = max_bytes
+    if copias is not None:
+        LOGGING_CONFIG['copias'] = copias
+    if rafaga_maxima is not None:
+        LOGGING_CONFIG['rafaga_maxima'] = rafaga_maxima
+    if ventana_rafaga_segundos is not None:
+        LOGGING_CONFIG['ventana_rafaga_segundos'] = ventana_rafaga_segundos
+    if consulta_lenta_ms is not None:
+        LOGGING_CONFIG['consulta_lenta_ms'] = consulta_lenta_ms
+
+    return LOGGING_CONFIG
+
+class FormateadorJSON(logging.Formatter):
+    """Formatea cada registro como un objeto JSON en una línea"""
+
+    def format(self, record):
+        datos = {
+            'fecha_hora': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+            'hilo': record.threadName,
+            # Milisegundos desde el inicio del proceso, para medir intervalos entre registros
+            'relativo_ms': round(record.relativeCreated, 3),
+        }
+        # Campos adicionales pasados con extra={...} (duracion_ms, suprimidos, ...)
+        for campo, valor in vars(record).items():
+            if campo not in _CAMPOS_ESTANDAR and not campo.startswith('_'):
+                datos[campo] = valor
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos['excepcion'] = record.exc_text
+        if record.stack_info:
+            datos['pila'] = record.stack_info
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+class FiltroRafagas(logging.Filter):
+    """Limita los registros repetidos de advertencia o error (p. ej. una caída de la base de datos
+    que se registraría en cada escaneo) a rafaga_maxima por ventana
+
+    Los registros se agrupan por logger, nivel y plantilla del mensaje. El primer registro
+    admitido tras una ventana con descartes lleva el campo 'suprimidos' con su cantidad.
+    """
+
+    def __init__(self, rafaga_maxima, ventana_segundos):
+        super().__init__()
+        self.rafaga_maxima = rafaga_maxima
+        self.ventana_segundos = ventana_segundos
+        self._rafagas = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+
+        clave = (record.name, record.levelno, record.msg)
+        ahora = time.monotonic()
+        with self._lock:
+            inicio, admitidos, suprimidos = self._rafagas.get(clave, (ahora, 0, 0))
+            if ahora - inicio >= self.ventana_segundos:
+                if suprimidos:
+                    record.suprimidos = suprimidos
+                inicio, admitidos, suprimidos = ahora, 0, 0
+
+            if admitidos < self.rafaga_maxima:
+                self._rafagas[clave] = (inicio, admitidos + 1, suprimidos)
+                return True
+
+            self._rafagas[clave] = (inicio, admitidos, suprimidos + 1)
+            return False
+
+class ManejadorCola(QueueHandler):
+    """Encola los registros sin formatearlos; el formateo y la escritura ocurren en el hilo de fondo"""
+
+    def prepare(self, record):
+        # QueueHandler.prepare formatea el registro completo (incluida la traza de la excepción)
+        # en el hilo que registra; aquí solo se resuelven los argumentos del mensaje, por si
+        # son objetos que cambian después, y se deja el resto al hilo escritor
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+# Hilo escritor activo (uno por proceso)
+_listener = None
+
+def configurar_logging(archivo='app.log', nivel=None):
+    """Configura el registro asíncrono del proceso; las llamadas posteriores no tienen efecto
+
+    Retorna el QueueListener; detener_logging() lo detiene vaciando la cola, y se llama
+    automáticamente al terminar el proceso.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    config = get_logging_config()
+
+    escritor = RotatingFileHandler(
+        archivo,
+        maxBytes=config['max_bytes'],
+        backupCount=config['copias'],
+        encoding='utf-8'
+    )
+    escritor.setFormatter(FormateadorJSON())
+
+    # SimpleQueue no tiene límite ni bloquea al encolar: registrar nunca espera al disco
+    cola = queue.SimpleQueue()
+    manejador = ManejadorCola(cola)
+    manejador.addFilter(FiltroRafagas(config['rafaga_maxima'], config['ventana_rafaga_segundos']))
+
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel if nivel is not None else config['nivel'])
+    raiz.addHandler(manejador)
+
+    _listener = QueueListener(cola, escritor, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_logging)
+    return _listener
+
+def detener_logging():
+    """Escribe los registros pendientes y detiene el hilo escritor"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,35 @@
+"""
+Configuración de la exportación de métricas de funcionamiento
+"""
+
+# Configuración de la exportación de métricas
+METRICAS_CONFIG = {
+    # Puerto del endpoint HTTP /metrics en formato Prometheus; None lo desactiva
+    'puerto': None,
+    # Solo se escucha en la interfaz local salvo que se indique otra dirección
+    'host': '127.0.0.1',
+    # Archivo donde se vuelcan periódicamente las métricas; None lo desactiva
+    'archivo': None,
+    'intervalo_archivo_s': 15
+}
+
+# Función para obtener la configuración de las métricas
+def get_metricas_config():
+    """Retorna la configuración actual de la exportación de métricas"""
+    return METRICAS_CONFIG
+
+# Función para modificar la configuración de las métricas
+def set_metricas_config(puerto=None, host=None, archivo=None, intervalo_archivo_s=None):
+    """Actualiza la configuración de la exportación de métricas"""
+    global METRICAS_CONFIG
+
+    if puerto is not None:
+        METRICAS_CONFIG['puerto'] = puerto
+    if host is not None:
+        METRICAS_CONFIG['host'] = host
+    if archivo is not None:
+        METRICAS_CONFIG['archivo'] = archivo
+    if intervalo_archivo_s is not None:
+        METRICAS_CONFIG['intervalo_archivo_s'] = intervalo_archivo_s
+
+    return METRICAS_CONFIG
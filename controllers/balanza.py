@@ -0,0 +1,179 @@
+"""
+Integración directa con la balanza por puerto serie
+
+La balanza transmite el peso de forma continua. Un hilo lector interpreta cada trama, un
+filtro detecta las lecturas estables y el emparejador asocia cada peso estable al siguiente
+escaneo de un código de producto, sin pasar por la etiqueta impresa. Todo ocurre fuera del
+hilo de la interfaz; la ventana recibe los escaneos ya emparejados por el pipeline del escáner.
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from controllers.etiquetas import es_etiqueta_valida
+from controllers.puerto_serie import LectorTramas
+
+logger = logging.getLogger('balanza')
+
+# Trama de peso: estado opcional (ST estable, US inestable, OL sobrecarga), tipo opcional
+# (GS bruto, NT neto) y el peso con signo y unidad, p. ej. "ST,GS,+  1.234kg" o "  0.850 kg"
+PATRON_TRAMA = re.compile(
+    r'^\s*(?:(?P<estado>ST|US|OL)\s*,\s*)?(?:(?:GS|NT|GR|TR)\s*,\s*)?'
+    r'(?P<signo>[+-])?\s*(?P<peso>\d+(?:\.\d+)?)\s*(?P<unidad>kg|g|lb)?\s*$',
+    re.IGNORECASE
+)
+
+# Factor de conversión de cada unidad a kilogramos
+FACTORES_UNIDAD = {'kg': 1.0, 'g': 0.001, 'lb': 0.45359237}
+
+# Lectura de la balanza: peso en kg, si el dispositivo la informa estable y su instante (time.monotonic)
+LecturaPeso = namedtuple('LecturaPeso', ['peso', 'estable', 'marca_tiempo'])
+
+def interpretar_trama(trama, marca_tiempo=None):
+    """Convierte una trama de la balanza en LecturaPeso, o None si no es una trama de peso válida"""
+    coincidencia = PATRON_TRAMA.match(trama)
+    if not coincidencia:
+        return None
+
+    estado = (coincidencia.group('estado') or '').upper()
+    if estado == 'OL':
+        return None
+
+    peso = float(coincidencia.group('peso'))
+    if coincidencia.group('signo') == '-':
+        peso = -peso
+    peso *= FACTORES_UNIDAD[(coincidencia.group('unidad') or 'kg').lower()]
+    return LecturaPeso(peso, estado != 'US', marca_tiempo if marca_tiempo is not None else time.monotonic())
+
+class FiltroEstabilidad:
+    """Detecta pesos estables en el flujo continuo de lecturas
+
+    Un peso es estable cuando en la ventana de tiempo hay al menos lecturas_minimas lecturas
+    que el dispositivo no marca como inestables y todas difieren menos que la tolerancia.
+    Cada carga se informa una sola vez: para volver a informar, el peso debe volver a cero,
+    pasar por una lectura inestable o cambiar más que la tolerancia (otra pieza sobre la balanza).
+    """
+
+    def __init__(self, ventana_ms=300, lecturas_minimas=3, tolerancia_kg=0.005, peso_minimo_kg=0.02):
+        self.ventana = ventana_ms / 1000
+        self.lecturas_minimas = lecturas_minimas
+        self.tolerancia = tolerancia_kg
+        self.peso_minimo = peso_minimo_kg
+        self._lecturas = deque()
+        self._informado = None
+
+    def agregar(self, lectura):
+        """Agrega una lectura; retorna el peso estable (redondeado a gramos) si se acaba de estabilizar"""
+        if abs(lectura.peso) < self.peso_minimo:
+            # Balanza descargada: la próxima carga estable vuelve a informarse
+            self._lecturas.clear()
+            self._informado = None
+            return None
+
+        if not lectura.estable:
+            # La carga se está moviendo (quizá es otra pieza): informarla de nuevo al asentarse
+            self._lecturas.clear()
+            self._informado = None
+            return None
+
+        self._lecturas.append(lectura)
+        limite = lectura.marca_tiempo - self.ventana
+        while self._lecturas and self._lecturas[0].marca_tiempo < limite:
+            self._lecturas.popleft()
+        if len(self._lecturas) < self.lecturas_minimas:
+            return None
+
+        pesos = [l.peso for l in self._lecturas]
+        if max(pesos) - min(pesos) > self.tolerancia:
+            return None
+
+        peso = round(sum(pesos) / len(pesos), 3)
+        if self._informado is not None and abs(peso - self._informado) <= self.tolerancia:
+            return None
+        self._informado = peso
+        return peso
+
+class EmparejadorPesaje:
+    """Asocia cada peso estable con el siguiente escaneo de un código de producto
+
+    Si el producto se escanea antes de que el peso se estabilice, el escaneo pasa sin peso y,
+    cuando el peso se estabiliza dentro de la vigencia, se entrega un escaneo emparejado.
+    Cada peso se usa una sola vez.
+    """
+
+    def __init__(self, vigencia_s=10):
+        self.vigencia = vigencia_s
+        self.pipeline = None
+        self._peso = None
+        self._escaneo_pendiente = None
+        self._lock = threading.Lock()
+
+    def peso_estable(self, peso, marca_tiempo):
+        """Registra un peso estable (desde el hilo lector de la balanza)"""
+        with self._lock:
+            pendiente = self._escaneo_pendiente
+            self._escaneo_pendiente = None
+            if pendiente is not None and marca_tiempo - pendiente.marca_tiempo <= self.vigencia:
+                evento = pendiente._replace(origen='balanza', peso=peso)
+            else:
+                self._peso = (peso, marca_tiempo)
+                return
+        if self.pipeline is not None:
+            self.pipeline.encolar(evento)
+
+    def emparejar(self, evento):
+        """Completa el escaneo de un producto con el peso estable vigente, si lo hay
+
+        Las etiquetas impresas ya traen el peso y se entregan sin cambios.
+        """
+        if es_etiqueta_valida(evento.etiqueta):
+            return evento
+
+        with self._lock:
+            if self._peso is not None and evento.marca_tiempo - self._peso[1] <= self.vigencia:
+                peso = self._peso[0]
+                self._peso = None
+                return evento._replace(peso=peso)
+            self._peso = None
+            self._escaneo_pendiente = evento
+        return evento
+
+    def retirar(self):
+        """Olvida el peso estable vigente (la balanza se descargó o la carga se está moviendo)
+
+        El escaneo pendiente se conserva: espera el peso de la pieza que se apoye a continuación.
+        """
+        with self._lock:
+            self._peso = None
+
+    def descartar(self):
+        """Olvida el peso y el escaneo pendientes (p. ej. al limpiar el formulario)"""
+        with self._lock:
+            self._peso = None
+            self._escaneo_pendiente = None
+
+class LectorBalanzaSerie(LectorTramas):
+    """Hilo que lee la balanza, filtra las lecturas y entrega los pesos estables al emparejador"""
+
+    def __init__(self, ruta, filtro, emparejador):
+        super().__init__(ruta, nombre='lector-balanza')
+        self.filtro = filtro
+        self.emparejador = emparejador
+        # Última lectura recibida, para mostrar el peso en vivo
+        self.ultima_lectura = None
+
+    def procesar_trama(self, trama):
+        """Interpreta la trama y, si el peso se acaba de estabilizar, lo entrega al emparejador"""
+        lectura = interpretar_trama(trama)
+        if lectura is None:
+            logger.debug("Trama de balanza no reconocida: %r", trama)
+            return
+        self.ultima_lectura = lectura
+
+        if abs(lectura.peso) < self.filtro.peso_minimo or not lectura.estable:
+            # El peso estable anterior ya no corresponde a lo que hay sobre la balanza
+            self.emparejador.retirar()
+        peso = self.filtro.agregar(lectura)
+        if peso is not None:
+            self.emparejador.peso_estable(peso, lectura.marca_tiempo)
@@ -0,0 +1,118 @@
+"""
+Cargas en segundo plano que una solicitud nueva reemplaza y cancela
+
+Cada solicitud recibe un número de generación que acompaña a su resultado; la vista descarta
+los resultados de generaciones anteriores. Una solicitud idéntica a la que está en curso se une
+a ella en lugar de repetir la consulta, y la consulta de una solicitud reemplazada se interrumpe
+en el servidor (KILL QUERY) para que deje de consumir recursos.
+"""
+import logging
+import threading
+
+logger = logging.getLogger('carga_cancelable')
+
+# Máximo de conexiones de un pool de MySQL Connector
+MAX_CONEXIONES = 32
+
+class CargaCancelable:
+    """Ejecuta una carga a la vez en un hilo aparte, con una conexión propia que puede cancelarse
+
+    Cada instancia usa a lo sumo una conexión a la vez, de modo que el pool de cargas cancelables
+    se dimensiona con la cantidad de instancias creadas (tres por estación). Si las estaciones se
+    crean mientras ya hay cargas en curso, las anteriores siguen en el pool más chico que eligieron.
+    """
+
+    # Instancias creadas en el proceso
+    _instancias = 0
+    _lock_instancias = threading.Lock()
+
+    def __init__(self, db, nombre, al_fallar=None):
+        self.db = db
+        self.nombre = nombre
+        # Se llama con el error si la carga no pudo ejecutarse (p. ej. sin conexión disponible)
+        self.al_fallar = al_fallar
+        with CargaCancelable._lock_instancias:
+            CargaCancelable._instancias += 1
+        self._generacion = 0
+        self._clave = None
+        self._hilo = None
+        # (generación, (destino, ID de conexión)) de la carga que está consultando la base
+        self._en_curso = None
+        # Hilo que ejecuta el KILL QUERY de la carga en curso, si se pidió cancelarla
+        self._cancelacion = None
+        self._lock = threading.Lock()
+
+    def vigente(self, generacion):
+        """Indica si el resultado de la generación debe entregarse (0 identifica una carga sincrónica)"""
+        return generacion == 0 or generacion == self._generacion
+
+    def solicitar(self, clave, funcion, *args):
+        """Inicia la carga y retorna su generación; funcion recibe además generacion=... como argumento
+
+        Si la carga en curso tiene la misma clave se retorna su generación sin iniciar otra.
+        """
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive() and clave == self._clave:
+                return self._generacion
+            self._generacion += 1
+            generacion = self._generacion
+            self._clave = clave
+            anterior = self._hilo
+            self._cancelar_en_curso()
+            self._hilo = threading.Thread(
+                target=self._ejecutar, args=(anterior, generacion, funcion, args),
+                name=f'carga-{self.nombre}', daemon=True
+            )
+            self._hilo.start()
+        return generacion
+
+    def cancelar(self):
+        """Descarta la carga en curso (p. ej. al cerrar la ventana) e interrumpe su consulta"""
+        with self._lock:
+            self._generacion += 1
+            self._clave = None
+            self._cancelar_en_curso()
+
+    def _cancelar_en_curso(self):
+        """Interrumpe en otro hilo la consulta de la carga en curso (se llama con el lock tomado)
+
+        El KILL QUERY puede tener que abrir una conexión al servidor, así que no se ejecuta en el
+        hilo que solicita (la interfaz). La carga espera a que termine antes de devolver su
+        conexión al pool, de modo que no alcanza a otra consulta que reutilice la misma conexión.
+        """
+        if self._en_curso is not None and self._cancelacion is None:
+            logger.debug("Carga de %s reemplazada; se cancela la consulta de la conexión %s",
+                         self.nombre, self._en_curso[1][1])
+            self._cancelacion = threading.Thread(
+                target=self.db.cancelar_consulta, args=(self._en_curso[1],),
+                name=f'cancelar-{self.nombre}', daemon=True
+            )
+            self._cancelacion.start()
+
+    def _ejecutar(self, anterior, generacion, funcion, args):
+        """Espera a que termine la carga anterior y ejecuta la nueva si sigue vigente"""
+        if anterior is not None:
+            anterior.join()
+        if not self.vigente(generacion):
+            return
+
+        # Las cargas que comparten un pool lo eligieron con a lo sumo tantas instancias como conexiones
+        tamano = min(max(self.db.TAMANO_POOL_CANCELABLE, CargaCancelable._instancias), MAX_CONEXIONES)
+        try:
+            with self.db.conexion_cancelable(tamano) as conexion:
+                with self._lock:
+                    self._en_curso = (generacion, conexion)
+                try:
+                    funcion(*args, generacion=generacion)
+                finally:
+                    with self._lock:
+                        self._en_curso = None
+                        cancelacion = self._cancelacion
+                        self._cancelacion = None
+                    if cancelacion is not None:
+                        cancelacion.join()
+        except Exception as e:
+            if self.vigente(generacion):
+                logger.error("Error en la carga de %s: %s", self.nombre, e)
+                if self.al_fallar is not None:
+                    self.al_fallar(e)
@@ -0,0 +1,362 @@
+"""
+Cierre diario: congela los pesajes de un día y genera los reportes de cierre
+
+Los pesajes del día se leen una sola vez (hasta el último ID existente al iniciar, para que
+los registros posteriores no alteren el cierre), se resumen por vendedor y por producto y se
+detectan anomalías. Los reportes de cada vendedor se generan en paralelo en un pool de
+procesos, un fragmento de vendedores por proceso. Un manifiesto con el digest de los datos
+de cada vendedor permite que al volver a ejecutar el cierre solo se regeneren los reportes
+cuyos datos cambiaron.
+
+Estructura generada en <directorio_base>/<AAAA-MM-DD>/:
+    resumen.txt             Totales del día, curva horaria, productos y anomalías
+    productos.csv           Resumen por producto
+    vendedor_<codigo>.txt   Resumen, curva horaria, productos y anomalías del vendedor
+    vendedor_<codigo>.csv   Pesajes del vendedor
+    manifiesto.json         Digests y resúmenes usados para los cierres incrementales
+"""
+import csv
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from controllers.exportadores import ExportadorCSV
+
+logger = logging.getLogger('cierre_diario')
+
+# Versión del formato de los reportes; al cambiarla se regeneran todos los cierres
+VERSION_REPORTE = 1
+
+# Umbral de puntaje z del peso (respecto del producto en el día) para marcar un pesaje como atípico
+UMBRAL_PESO_ATIPICO = 3.0
+# Pesajes mínimos de un producto para evaluar pesos atípicos
+MINIMO_PESAJES_ATIPICO = 10
+# Pesajes iguales (vendedor, producto y peso) dentro de esta ventana se marcan como posibles repetidos
+SEGUNDOS_REPETIDO = 10
+
+# Ancho máximo de las barras de las curvas horarias
+ANCHO_BARRA = 40
+
+def _a_float(valor):
+    """Convierte valores DECIMAL (o None) a float redondeado"""
+    return round(float(valor), 2) if valor is not None else 0.0
+
+def _a_datetime(valor):
+    """Normaliza la fecha y hora de un pesaje a datetime"""
+    return valor if isinstance(valor, datetime) else datetime.fromisoformat(str(valor))
+
+def digest_filas(filas):
+    """Digest de los datos de un conjunto de pesajes (independiente del orden de lectura)"""
+    sha = hashlib.sha256()
+    for fila in sorted(filas, key=lambda f: f['id']):
+        sha.update(repr((
+            fila['id'], fila['codigo_producto'], str(fila['peso']), fila['codigo_vendedor'],
+            str(fila['fecha_hora']), str(fila['precio_kg']), fila['observaciones']
+        )).encode('utf-8'))
+    return sha.hexdigest()
+
+def estadisticas_productos(filas):
+    """Media y desvío del peso por producto en el día: {codigo: (cantidad, media, desvio)}"""
+    acumulados = defaultdict(lambda: [0, 0.0, 0.0])
+    for fila in filas:
+        peso = float(fila['peso'])
+        acumulado = acumulados[fila['codigo_producto']]
+        acumulado[0] += 1
+        acumulado[1] += peso
+        acumulado[2] += peso * peso
+
+    resultado = {}
+    for codigo, (cantidad, suma, suma_cuadrados) in acumulados.items():
+        media = suma / cantidad
+        varianza = max(0.0, suma_cuadrados / cantidad - media * media)
+        resultado[codigo] = (cantidad, media, math.sqrt(varianza))
+    return resultado
+
+def detectar_anomalias(filas, estadisticas):
+    """Anomalías de un conjunto de pesajes ordenado por fecha: pesos atípicos, sin precio y repetidos"""
+    anomalias = []
+    ultimo = {}
+    for fila in filas:
+        fecha_hora = _a_datetime(fila['fecha_hora'])
+        peso = float(fila['peso'])
+
+        cantidad, media, desvio = estadisticas.get(fila['codigo_producto'], (0, 0.0, 0.0))
+        if cantidad >= MINIMO_PESAJES_ATIPICO and desvio > 0:
+            z = (peso - media) / desvio
+            if abs(z) >= UMBRAL_PESO_ATIPICO:
+                anomalias.append({
+                    'tipo': 'peso_atipico', 'id': fila['id'], 'fecha_hora': fecha_hora.isoformat(),
+                    'detalle': f"{fila['codigo_producto']} {peso:.2f} kg (media {media:.2f}, z={z:.1f})"
+                })
+
+        if fila['precio_kg'] is None:
+            anomalias.append({
+                'tipo': 'sin_precio', 'id': fila['id'], 'fecha_hora': fecha_hora.isoformat(),
+                'detalle': f"{fila['codigo_producto']} sin precio por kg"
+            })
+
+        clave = (fila['codigo_vendedor'], fila['codigo_producto'], str(fila['peso']))
+        anterior = ultimo.get(clave)
+        if anterior is not None and (fecha_hora - anterior).total_seconds() <= SEGUNDOS_REPETIDO:
+            anomalias.append({
+                'tipo': 'repetido', 'id': fila['id'], 'fecha_hora': fecha_hora.isoformat(),
+                'detalle': f"{fila['codigo_producto']} {peso:.2f} kg repetido a los "
+                           f"{(fecha_hora - anterior).total_seconds():.0f} s"
+            })
+        ultimo[clave] = fecha_hora
+    return anomalias
+
+def resumir(filas, estadisticas):
+    """Totales, curva horaria, resumen por producto y anomalías de un conjunto de pesajes"""
+    curva = [[0, 0.0] for _ in range(24)]
+    productos = {}
+    kilos = 0.0
+    monto = 0.0
+    for fila in filas:
+        peso = _a_float(fila['peso'])
+        total = _a_float(fila['total'])
+        kilos += peso
+        monto += total
+        hora = _a_datetime(fila['fecha_hora']).hour
+        curva[hora][0] += 1
+        curva[hora][1] += peso
+
+        producto = productos.setdefault(fila['codigo_producto'], {
+            'codigo': fila['codigo_producto'], 'nombre': fila['nombre_producto'],
+            'pesajes': 0, 'kilos': 0.0, 'monto': 0.0
+        })
+        producto['pesajes'] += 1
+        producto['kilos'] += peso
+        producto['monto'] += total
+
+    for producto in productos.values():
+        producto['kilos'] = round(producto['kilos'], 2)
+        producto['monto'] = round(producto['monto'], 2)
+
+    return {
+        'pesajes': len(filas),
+        'kilos': round(kilos, 2),
+        'monto': round(monto, 2),
+        'ticket_promedio': round(monto / len(filas), 2) if filas else 0.0,
+        'curva_horaria': [(c, round(k, 2)) for c, k in curva],
+        'productos': sorted(productos.values(), key=lambda p: -p['kilos']),
+        'anomalias': detectar_anomalias(filas, estadisticas),
+    }
+
+def _texto_curva(curva):
+    """Curva horaria como barras de texto (kilos por hora)"""
+    maximo = max((k for _, k in curva), default=0) or 1
+    lineas = []
+    for hora, (cantidad, kilos) in enumerate(curva):
+        if cantidad:
+            barra = '#' * max(1, round(kilos / maximo * ANCHO_BARRA))
+            lineas.append(f"  {hora:02d}h {cantidad:>6} pesajes {kilos:>10.2f} kg  {barra}")
+    return lineas
+
+def _texto_resumen(titulo, fecha, resumen):
+    """Reporte de texto de un resumen (del día o de un vendedor)"""
+    lineas = [
+        titulo,
+        f"Fecha: {fecha}",
+        "",
+        f"Pesajes: {resumen['pesajes']}",
+        f"Kilos: {resumen['kilos']:.2f}",
+        f"Monto: {resumen['monto']:.2f}",
+        f"Ticket promedio: {resumen['ticket_promedio']:.2f}",
+        "",
+        "Curva horaria",
+        *_texto_curva(resumen['curva_horaria']),
+        "",
+        "Productos",
+    ]
+    for producto in resumen['productos']:
+        lineas.append(
+            f"  {producto['codigo']:<10} {producto['nombre'][:35]:<35} "
+            f"{producto['pesajes']:>6} {producto['kilos']:>10.2f} kg {producto['monto']:>12.2f}"
+        )
+    lineas += ["", f"Anomalías ({len(resumen['anomalias'])})"]
+    for anomalia in resumen['anomalias']:
+        lineas.append(f"  [{anomalia['tipo']}] #{anomalia['id']} {anomalia['fecha_hora']}: {anomalia['detalle']}")
+    return '\n'.join(lineas) + '\n'
+
+def renderizar_fragmento(directorio, fecha, fragmento, estadisticas):
+    """Genera los reportes de un fragmento de vendedores (se ejecuta en un proceso del pool)
+
+    fragmento es una lista de (codigo_vendedor, nombre_vendedor, filas); retorna
+    {codigo_vendedor: resumen}.
+    """
+    resumenes = {}
+    for codigo_vendedor, nombre_vendedor, filas in fragmento:
+        resumen = resumir(filas, estadisticas)
+        resumen['nombre'] = nombre_vendedor
+
+        ruta_texto = os.path.join(directorio, f"vendedor_{codigo_vendedor}.txt")
+        with open(ruta_texto, 'w', encoding='utf-8') as archivo:
+            archivo.write(_texto_resumen(f"Cierre de {nombre_vendedor} ({codigo_vendedor})", fecha, resumen))
+
+        with ExportadorCSV(os.path.join(directorio, f"vendedor_{codigo_vendedor}.csv")) as exportador:
+            exportador.escribir_lote(filas)
+
+        resumenes[codigo_vendedor] = resumen
+    return resumenes
+
+def repartir(grupos, cantidad_fragmentos):
+    """Reparte los grupos de vendedores en fragmentos de carga similar (más pesajes primero)"""
+    fragmentos = [[] for _ in range(cantidad_fragmentos)]
+    cargas = [0] * cantidad_fragmentos
+    for grupo in sorted(grupos, key=lambda g: -len(g[2])):
+        indice = cargas.index(min(cargas))
+        fragmentos[indice].append(grupo)
+        cargas[indice] += len(grupo[2])
+    return [f for f in fragmentos if f]
+
+class CierreDiario:
+    """Genera el cierre de un día de forma incremental y en paralelo"""
+
+    def __init__(self, pesaje_repo, directorio_base='cierres', procesos=None):
+        self.pesaje_repo = pesaje_repo
+        self.directorio_base = directorio_base
+        self.procesos = procesos or os.cpu_count() or 1
+
+    def congelar(self, fecha):
+        """Lee los pesajes del día hasta el último ID existente al comenzar, ordenados por fecha
+
+        Las lecturas usan una conexión propia del hilo (el cierre corre fuera del hilo de la
+        interfaz, que escribe en la conexión principal) y comparten su instantánea.
+        """
+        inicio = datetime(fecha.year, fecha.month, fecha.day)
+        fin = inicio + timedelta(days=1) - timedelta(seconds=1)
+
+        filas = []
+        with self.pesaje_repo.db.conexion_cancelable(tamano=1, nombre='cierre'):
+            id_limite = self.pesaje_repo.get_ultimo_id()
+            for lote in self.pesaje_repo.iter_lotes(inicio, fin):
+                filas.extend(f for f in lote if f['id'] <= id_limite)
+        filas.sort(key=lambda f: (_a_datetime(f['fecha_hora']), f['id']))
+        return filas
+
+    def _leer_manifiesto(self, directorio):
+        """Manifiesto del cierre anterior, o uno vacío si no existe o es de otra versión"""
+        ruta = os.path.join(directorio, 'manifiesto.json')
+        try:
+            with open(ruta, 'r', encoding='utf-8') as archivo:
+                manifiesto = json.load(archivo)
+            if manifiesto.get('version') == VERSION_REPORTE:
+                return manifiesto
+        except (OSError, ValueError):
+            pass
+        return {'version': VERSION_REPORTE, 'vendedores': {}, 'digest': None}
+
+    def _escribir_manifiesto(self, directorio, manifiesto):
+        """Escribe el manifiesto de forma atómica (archivo temporal y reemplazo)"""
+        ruta = os.path.join(directorio, 'manifiesto.json')
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(manifiesto, archivo, ensure_ascii=False, indent=1)
+        os.replace(temporal, ruta)
+
+    def generar(self, fecha, forzar=False):
+        """Genera (o actualiza) el cierre del día y retorna un resumen de la ejecución"""
+        if isinstance(fecha, str):
+            fecha = date.fromisoformat(fecha)
+        directorio = os.path.join(self.directorio_base, fecha.isoformat())
+        os.makedirs(directorio, exist_ok=True)
+
+        filas = self.congelar(fecha)
+        estadisticas = estadisticas_productos(filas)
+        manifiesto = {'version': VERSION_REPORTE, 'vendedores': {}, 'digest': None} if forzar \
+            else self._leer_manifiesto(directorio)
+
+        por_vendedor = defaultdict(list)
+        for fila in filas:
+            por_vendedor[fila['codigo_vendedor']].append(fila)
+
+        # El digest de los productos se incluye porque los pesos atípicos dependen de todo el día
+        digest_estadisticas = hashlib.sha256(repr(sorted(estadisticas.items())).encode()).hexdigest()
+
+        pendientes = []
+        vendedores = {}
+        for codigo_vendedor, filas_vendedor in por_vendedor.items():
+            digest = hashlib.sha256((digest_filas(filas_vendedor) + digest_estadisticas).encode()).hexdigest()
+            anterior = manifiesto['vendedores'].get(codigo_vendedor)
+            archivos_presentes = all(
+                os.path.exists(os.path.join(directorio, f"vendedor_{codigo_vendedor}{extension}"))
+                for extension in ('.txt', '.csv')
+            )
+            if anterior and anterior['digest'] == digest and archivos_presentes:
+                vendedores[codigo_vendedor] = anterior
+            else:
+                pendientes.append((codigo_vendedor, filas_vendedor[0]['nombre_vendedor'], filas_vendedor))
+                vendedores[codigo_vendedor] = {'digest': digest}
+
+        # Quitar los reportes de vendedores que ya no tienen pesajes en el día
+        for codigo_vendedor in set(manifiesto['vendedores']) - set(por_vendedor):
+            for extension in ('.txt', '.csv'):
+                ruta = os.path.join(directorio, f"vendedor_{codigo_vendedor}{extension}")
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+        if pendientes:
+            fragmentos = repartir(pendientes, min(self.procesos, len(pendientes)))
+            for resumenes in self._renderizar(directorio, fecha.isoformat(), fragmentos, estadisticas):
+                for codigo_vendedor, resumen in resumenes.items():
+                    vendedores[codigo_vendedor]['resumen'] = resumen
+
+        digest_dia = hashlib.sha256(
+            ''.join(vendedores[c]['digest'] for c in sorted(vendedores)).encode()
+        ).hexdigest()
+        if digest_dia != manifiesto.get('digest') or not os.path.exists(os.path.join(directorio, 'resumen.txt')):
+            self._renderizar_dia(directorio, fecha.isoformat(), filas, estadisticas)
+
+        self._escribir_manifiesto(directorio, {
+            'version': VERSION_REPORTE,
+            'fecha': fecha.isoformat(),
+            'generado': datetime.now().isoformat(timespec='seconds'),
+            'pesajes': len(filas),
+            'digest': digest_dia,
+            'vendedores': vendedores,
+        })
+
+        resultado = {
+            'directorio': directorio,
+            'pesajes': len(filas),
+            'vendedores': len(vendedores),
+            'regenerados': len(pendientes),
+            'reutilizados': len(vendedores) - len(pendientes),
+        }
+        logger.info("Cierre del %s generado: %s", fecha, resultado)
+        return resultado
+
+    def _renderizar(self, directorio, fecha, fragmentos, estadisticas):
+        """Renderiza los fragmentos en paralelo; con un solo fragmento se evita crear procesos"""
+        if len(fragmentos) == 1:
+            return [renderizar_fragmento(directorio, fecha, fragmentos[0], estadisticas)]
+
+        # 'spawn' evita bifurcar un proceso con hilos activos (interfaz, lector del escáner)
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(fragmentos), mp_context=contexto) as pool:
+            futuros = [
+                pool.submit(renderizar_fragmento, directorio, fecha, fragmento, estadisticas)
+                for fragmento in fragmentos
+            ]
+            return [futuro.result() for futuro in futuros]
+
+    def _renderizar_dia(self, directorio, fecha, filas, estadisticas):
+        """Genera el resumen general del día y el resumen por producto"""
+        resumen = resumir(filas, estadisticas)
+        with open(os.path.join(directorio, 'resumen.txt'), 'w', encoding='utf-8') as archivo:
+            archivo.write(_texto_resumen("Cierre del día", fecha, resumen))
+
+        with open(os.path.join(directorio, 'productos.csv'), 'w', newline='', encoding='utf-8') as archivo:
+            writer = csv.writer(archivo)
+            writer.writerow(['Código Producto', 'Producto', 'Pesajes', 'Kilos', 'Monto'])
+            for producto in resumen['productos']:
+                writer.writerow([
+                    producto['codigo'], producto['nombre'], producto['pesajes'],
+                    f"{producto['kilos']:.2f}", f"{producto['monto']:.2f}"
+                ])
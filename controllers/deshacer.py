@@ -0,0 +1,43 @@
+"""
+Cola de registros recientes que todavía pueden deshacerse
+"""
+import threading
+import time
+from collections import deque
+
+class ColaDeshacer:
+    """Guarda los últimos N registros y permite revertirlos dentro de una ventana de tiempo"""
+    
+    def __init__(self, capacidad=5, ventana_segundos=60):
+        self.ventana_segundos = ventana_segundos
+        self._registros = deque(maxlen=capacidad)
+        self._lock = threading.Lock()
+    
+    def _descartar_vencidos(self, ahora):
+        """Elimina los registros cuya ventana para deshacer ya expiró"""
+        while self._registros and ahora - self._registros[0][1] > self.ventana_segundos:
+            self._registros.popleft()
+    
+    @property
+    def capacidad(self):
+        """Cantidad máxima de registros que se pueden deshacer"""
+        return self._registros.maxlen
+    
+    def agregar(self, registro_id):
+        """Agrega un registro recién creado a la cola"""
+        with self._lock:
+            self._registros.append((registro_id, time.monotonic()))
+    
+    def extraer(self):
+        """Retira y retorna el registro más reciente que aún puede deshacerse, o None"""
+        with self._lock:
+            self._descartar_vencidos(time.monotonic())
+            if not self._registros:
+                return None
+            return self._registros.pop()[0]
+    
+    def disponibles(self):
+        """Cantidad de registros que todavía pueden deshacerse"""
+        with self._lock:
+            self._descartar_vencidos(time.monotonic())
+            return len(self._registros)
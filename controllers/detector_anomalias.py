@@ -0,0 +1,282 @@
+"""
+Detección en línea de pesajes anómalos
+
+Cada pesaje se puntúa antes de registrarse contra estadísticas acumuladas en memoria constante:
+por producto, media y varianza del logaritmo del peso (algoritmo de Welford); por vendedor,
+el promedio móvil exponencial (EWMA) de sus puntajes, que revela a quien pesa
+sistemáticamente de más o de menos, y del intervalo entre sus pesajes, que revela ráfagas.
+Las estadísticas se actualizan recién cuando el pesaje quedó registrado y se revierten si se
+deshace. El estado se guarda periódicamente en un archivo JSON para no recalcularlo desde el
+historial al reiniciar.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger('detector_anomalias')
+
+# Anomalía detectada: tipo (peso_atipico, vendedor_sesgado, rafaga), puntaje y descripción legible
+Anomalia = namedtuple('Anomalia', ['tipo', 'puntaje', 'detalle'])
+
+# Puntuación de un pesaje pendiente de incorporarse a las estadísticas: valor es el logaritmo del
+# peso (None si el peso no es positivo) y z su puntaje respecto del producto
+Evaluacion = namedtuple('Evaluacion', ['codigo_producto', 'codigo_vendedor', 'valor', 'z', 'marca_tiempo', 'anomalias'])
+
+# Cambio aplicado por incorporar(), para revertirlo: valor agregado al producto (o None) y los
+# campos (n, sesgo, intervalo, ultimo) del vendedor antes y después
+Incorporacion = namedtuple('Incorporacion', ['codigo_producto', 'codigo_vendedor', 'valor', 'anterior', 'posterior'])
+
+# Versión del formato del archivo de estado; otra versión se descarta y el detector empieza de cero
+VERSION_ESTADO = 1
+
+# Archivo de estado por defecto
+RUTA_ESTADO = 'anomalias.json'
+
+class EstadisticaWelford:
+    """Media y varianza acumuladas de una serie, actualizadas en O(1) por valor"""
+
+    __slots__ = ('n', 'media', 'm2')
+
+    def __init__(self, n=0, media=0.0, m2=0.0):
+        self.n = n
+        self.media = media
+        self.m2 = m2
+
+    def agregar(self, valor):
+        """Incorpora un valor a la estadística"""
+        self.n += 1
+        delta = valor - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (valor - self.media)
+
+    def quitar(self, valor):
+        """Retira un valor incorporado antes (la inversa exacta de agregar)"""
+        if self.n <= 1:
+            self.n, self.media, self.m2 = 0, 0.0, 0.0
+            return
+        media = (self.n * self.media - valor) / (self.n - 1)
+        self.m2 = max(self.m2 - (valor - media) * (valor - self.media), 0.0)
+        self.media = media
+        self.n -= 1
+
+    def desvio(self):
+        """Desvío estándar muestral (0 con menos de dos valores)"""
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def puntaje(self, valor, desvio_minimo):
+        """Puntaje z del valor respecto de la estadística"""
+        return (valor - self.media) / max(self.desvio(), desvio_minimo)
+
+class EstadisticaVendedor:
+    """Promedios móviles exponenciales del puntaje y del intervalo entre pesajes de un vendedor"""
+
+    __slots__ = ('n', 'sesgo', 'intervalo', 'ultimo')
+
+    def __init__(self, n=0, sesgo=0.0, intervalo=None, ultimo=None):
+        self.n = n
+        self.sesgo = sesgo
+        self.intervalo = intervalo
+        self.ultimo = ultimo
+
+    def campos(self):
+        """Retorna (n, sesgo, intervalo, ultimo)"""
+        return (self.n, self.sesgo, self.intervalo, self.ultimo)
+
+class DetectorAnomalias:
+    """Puntúa cada pesaje y mantiene las estadísticas por producto y por vendedor"""
+
+    def __init__(self, ruta_estado=RUTA_ESTADO, umbral_z=4.0, umbral_sesgo=1.5, factor_rafaga=10.0,
+                 muestras_minimas=30, alfa=0.05, desvio_minimo=0.05, intervalo_guardado_s=60):
+        self.ruta_estado = ruta_estado
+        self.umbral_z = umbral_z
+        self.umbral_sesgo = umbral_sesgo
+        self.factor_rafaga = factor_rafaga
+        self.muestras_minimas = muestras_minimas
+        self.alfa = alfa
+        # Piso del desvío (en escala logarítmica, ~5 %) para productos de peso casi fijo
+        self.desvio_minimo = desvio_minimo
+        self.intervalo_guardado = intervalo_guardado_s
+
+        self._productos = {}
+        self._vendedores = {}
+        self._lock = threading.Lock()
+        self._cambios = 0
+        self._proximo_guardado = time.monotonic() + intervalo_guardado_s
+        if ruta_estado:
+            self.cargar()
+
+    def puntuar(self, codigo_producto, codigo_vendedor, peso, marca_tiempo=None):
+        """Puntúa un pesaje sin modificar las estadísticas; retorna su Evaluacion con las anomalías detectadas
+
+        Las estadísticas se actualizan con incorporar() una vez que el pesaje quedó registrado,
+        para que un registro fallido no las altere.
+        """
+        marca_tiempo = time.time() if marca_tiempo is None else marca_tiempo
+        if peso <= 0:
+            anomalia = Anomalia('peso_atipico', math.inf, f"peso no positivo ({peso} kg)")
+            return Evaluacion(codigo_producto, codigo_vendedor, None, 0.0, marca_tiempo, [anomalia])
+
+        valor = math.log(peso)
+        anomalias = []
+        with self._lock:
+            producto = self._productos.get(codigo_producto) or EstadisticaWelford()
+            vendedor = self._vendedores.get(codigo_vendedor) or EstadisticaVendedor()
+
+            z = 0.0
+            if producto.n >= self.muestras_minimas:
+                z = producto.puntaje(valor, self.desvio_minimo)
+                if abs(z) >= self.umbral_z:
+                    esperado = math.exp(producto.media)
+                    anomalias.append(Anomalia(
+                        'peso_atipico', z, f"peso {peso:.3f} kg, habitual {esperado:.3f} kg (z={z:+.1f})"
+                    ))
+
+            # Sesgo del vendedor tal como quedaría al incorporar el pesaje
+            n_vendedor = vendedor.n
+            if producto.n + (0 if anomalias else 1) >= self.muestras_minimas:
+                sesgo = vendedor.sesgo + self.alfa * (self._acotar(z) - vendedor.sesgo)
+                n_vendedor += 1
+                if n_vendedor >= self.muestras_minimas and abs(sesgo) >= self.umbral_sesgo:
+                    anomalias.append(Anomalia(
+                        'vendedor_sesgado', sesgo,
+                        f"el vendedor pesa en promedio {sesgo:+.1f} desvíos respecto de lo habitual"
+                    ))
+
+            # Ráfaga: intervalo muy por debajo del habitual del vendedor
+            if vendedor.ultimo is not None and vendedor.intervalo is not None:
+                intervalo = max(marca_tiempo - vendedor.ultimo, 0.0)
+                if n_vendedor >= self.muestras_minimas and intervalo * self.factor_rafaga < vendedor.intervalo:
+                    anomalias.append(Anomalia(
+                        'rafaga', vendedor.intervalo / max(intervalo, 1e-3),
+                        f"{intervalo:.1f} s desde el pesaje anterior, habitual {vendedor.intervalo:.1f} s"
+                    ))
+
+        return Evaluacion(codigo_producto, codigo_vendedor, valor, z, marca_tiempo, anomalias)
+
+    def _acotar(self, z):
+        """Acota el puntaje para que un error aislado no domine el sesgo del vendedor"""
+        return max(-self.umbral_z, min(self.umbral_z, z))
+
+    def incorporar(self, evaluacion):
+        """Actualiza las estadísticas con un pesaje ya registrado; retorna la Incorporacion para revertirla
+
+        Los pesos atípicos no se incorporan a la estadística del producto, para que un error
+        de carga (p. ej. gramos en lugar de kilos) no ensanche la distribución aprendida.
+        """
+        if evaluacion.valor is None:
+            return None
+
+        with self._lock:
+            producto = self._productos.get(evaluacion.codigo_producto)
+            if producto is None:
+                producto = self._productos[evaluacion.codigo_producto] = EstadisticaWelford()
+            vendedor = self._vendedores.get(evaluacion.codigo_vendedor)
+            if vendedor is None:
+                vendedor = self._vendedores[evaluacion.codigo_vendedor] = EstadisticaVendedor()
+            anterior = vendedor.campos()
+
+            agregado = not any(a.tipo == 'peso_atipico' for a in evaluacion.anomalias)
+            if agregado:
+                producto.agregar(evaluacion.valor)
+
+            if producto.n >= self.muestras_minimas:
+                vendedor.sesgo += self.alfa * (self._acotar(evaluacion.z) - vendedor.sesgo)
+                vendedor.n += 1
+
+            if vendedor.ultimo is not None:
+                intervalo = max(evaluacion.marca_tiempo - vendedor.ultimo, 0.0)
+                if vendedor.intervalo is None:
+                    vendedor.intervalo = intervalo
+                else:
+                    vendedor.intervalo += self.alfa * (intervalo - vendedor.intervalo)
+            vendedor.ultimo = evaluacion.marca_tiempo
+
+            self._cambios += 1
+            guardar = self.ruta_estado and time.monotonic() >= self._proximo_guardado
+            incorporacion = Incorporacion(
+                evaluacion.codigo_producto, evaluacion.codigo_vendedor,
+                evaluacion.valor if agregado else None, anterior, vendedor.campos()
+            )
+
+        if guardar:
+            self.guardar()
+        return incorporacion
+
+    def revertir(self, incorporacion):
+        """Deshace lo que incorporar() aplicó por un pesaje que luego se eliminó
+
+        La estadística del producto se revierte de forma exacta. La del vendedor vuelve al estado
+        anterior si no registró otros pesajes desde entonces; si los hubo, se descuenta el aporte
+        de este pesaje a sus promedios móviles.
+        """
+        with self._lock:
+            producto = self._productos.get(incorporacion.codigo_producto)
+            if producto is not None and incorporacion.valor is not None:
+                producto.quitar(incorporacion.valor)
+
+            vendedor = self._vendedores.get(incorporacion.codigo_vendedor)
+            if vendedor is not None:
+                n, sesgo, intervalo, ultimo = incorporacion.anterior
+                if vendedor.campos() == incorporacion.posterior:
+                    vendedor.n, vendedor.sesgo, vendedor.intervalo, vendedor.ultimo = n, sesgo, intervalo, ultimo
+                else:
+                    n_posterior, sesgo_posterior, intervalo_posterior, _ = incorporacion.posterior
+                    vendedor.n -= n_posterior - n
+                    vendedor.sesgo -= sesgo_posterior - sesgo
+                    if intervalo is not None and vendedor.intervalo is not None:
+                        vendedor.intervalo -= intervalo_posterior - intervalo
+            self._cambios += 1
+
+    def estado(self):
+        """Retorna el estado serializable del detector"""
+        with self._lock:
+            return {
+                'version': VERSION_ESTADO,
+                'productos': {c: [e.n, e.media, e.m2] for c, e in self._productos.items()},
+                'vendedores': {c: [e.n, e.sesgo, e.intervalo, e.ultimo] for c, e in self._vendedores.items()},
+            }
+
+    def guardar(self):
+        """Guarda el estado de forma atómica (archivo temporal y reemplazo) si cambió desde el último guardado"""
+        with self._lock:
+            self._proximo_guardado = time.monotonic() + self.intervalo_guardado
+            if not self._cambios:
+                return
+            self._cambios = 0
+        try:
+            temporal = self.ruta_estado + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                json.dump(self.estado(), archivo, ensure_ascii=False)
+            os.replace(temporal, self.ruta_estado)
+        except OSError as e:
+            logger.error("Error al guardar el estado del detector de anomalías: %s", e)
+
+    def cargar(self):
+        """Recupera el estado guardado; si no existe o no es válido, el detector empieza de cero"""
+        try:
+            with open(self.ruta_estado, 'r', encoding='utf-8') as archivo:
+                estado = json.load(archivo)
+            if estado.get('version') != VERSION_ESTADO:
+                return
+            productos = {c: EstadisticaWelford(*v) for c, v in estado['productos'].items()}
+            vendedores = {c: EstadisticaVendedor(*v) for c, v in estado['vendedores'].items()}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Estado del detector de anomalías no válido, se descarta: %s", e)
+            return
+
+        with self._lock:
+            self._productos = productos
+            self._vendedores = vendedores
+        logger.info("Estado del detector de anomalías recuperado: %s productos, %s vendedores",
+                    len(productos), len(vendedores))
+
+def marcar_observaciones(observaciones, anomalias):
+    """Agrega a las observaciones una marca con las anomalías detectadas"""
+    marca = "[anomalía: " + ", ".join(a.tipo for a in anomalias) + "]"
+    return f"{observaciones} {marca}" if observaciones else marca
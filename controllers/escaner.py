@@ -0,0 +1,93 @@
+"""
+Canal de entrada del escáner: encola las lecturas con su marca de tiempo sin perder ninguna
+"""
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from controllers.puerto_serie import LectorTramas
+from herramientas.metricas import RegistroMetricas
+
+logger = logging.getLogger('escaner')
+
+# Métricas del escáner
+_escaneos = RegistroMetricas().contador('carni_escaneos_total', "Lecturas del escáner aceptadas")
+_rebotes = RegistroMetricas().contador('carni_escaneos_duplicados_total', "Lecturas del escáner descartadas por antirrebote")
+_pendientes = RegistroMetricas().medidor('carni_escaner_pendientes', "Lecturas del escáner a la espera de procesarse")
+
+# Lectura del escáner: texto leído, instante de lectura (time.monotonic), origen y el peso
+# aportado por la balanza cuando el escaneo de un producto se emparejó con una pesada
+EventoEscaneo = namedtuple('EventoEscaneo', ['etiqueta', 'marca_tiempo', 'origen', 'peso'], defaults=(None,))
+
+class PipelineEscaner:
+    """Cola ordenada de lecturas del escáner con antirrebote de lecturas duplicadas"""
+    
+    def __init__(self, antirrebote_ms=50, emparejador=None):
+        # Cola sin límite: una ráfaga de lecturas nunca se descarta
+        self._cola = queue.Queue()
+        self._antirrebote = antirrebote_ms / 1000
+        self._ultima = (None, 0.0)
+        self._lock = threading.Lock()
+        # Emparejador con la balanza (opcional): agrega el peso estable a los escaneos de productos
+        self.emparejador = emparejador
+        if emparejador is not None:
+            emparejador.pipeline = self
+        _pendientes.observar(self.pendientes)
+    
+    def enviar(self, etiqueta, origen='teclado', marca_tiempo=None):
+        """Encola una lectura; retorna False si se descartó por ser un rebote de la anterior"""
+        etiqueta = etiqueta.strip()
+        if not etiqueta:
+            return False
+        if marca_tiempo is None:
+            marca_tiempo = time.monotonic()
+        
+        with self._lock:
+            ultima_etiqueta, ultima_marca = self._ultima
+            if etiqueta == ultima_etiqueta and marca_tiempo - ultima_marca < self._antirrebote:
+                logger.info("Lectura duplicada descartada: %s", etiqueta)
+                _rebotes.incrementar()
+                return False
+            self._ultima = (etiqueta, marca_tiempo)
+            evento = EventoEscaneo(etiqueta, marca_tiempo, origen)
+            if self.emparejador is not None:
+                evento = self.emparejador.emparejar(evento)
+            self._cola.put(evento)
+        _escaneos.incrementar()
+        return True
+    
+    def encolar(self, evento):
+        """Encola un evento ya construido (p. ej. un escaneo emparejado tarde con la balanza)"""
+        self._cola.put(evento)
+    
+    def obtener(self, timeout=None):
+        """Obtiene la siguiente lectura, esperando como máximo timeout segundos (None si no hay)"""
+        try:
+            return self._cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def vaciar(self):
+        """Retorna todas las lecturas pendientes en orden de llegada, sin bloquear"""
+        eventos = []
+        while True:
+            try:
+                eventos.append(self._cola.get_nowait())
+            except queue.Empty:
+                return eventos
+    
+    def pendientes(self):
+        """Cantidad de lecturas a la espera de ser procesadas"""
+        return self._cola.qsize()
+
+class LectorEscanerSerie(LectorTramas):
+    """Hilo que lee un escáner conectado por puerto serie y encola cada etiqueta en el pipeline"""
+    
+    def __init__(self, ruta, pipeline):
+        super().__init__(ruta, nombre='lector-escaner')
+        self.pipeline = pipeline
+    
+    def procesar_trama(self, trama):
+        """Encola la etiqueta leída con la marca de tiempo de su recepción"""
+        self.pipeline.enviar(trama, origen='serie')
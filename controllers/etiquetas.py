@@ -0,0 +1,35 @@
+"""
+Decodificación de las etiquetas impresas por la balanza
+"""
+
+# Formato de etiqueta: 7 dígitos de código de producto + 2 dígitos de kg + 4 dígitos de fracción
+LONGITUD_ETIQUETA = 13
+LONGITUD_CODIGO_PRODUCTO = 7
+
+def es_etiqueta_valida(codigo_completo):
+    """Indica si el texto leído tiene el formato de etiqueta de balanza"""
+    return len(codigo_completo) == LONGITUD_ETIQUETA and codigo_completo.isdigit()
+
+def decodificar_etiqueta(codigo_completo):
+    """Retorna (codigo_producto, peso) a partir de la etiqueta, o None si no es válida"""
+    codigo_completo = codigo_completo.strip()
+    if not es_etiqueta_valida(codigo_completo):
+        return None
+    
+    # Extraer código de producto (primeros 7 dígitos)
+    codigo_producto = codigo_completo[:LONGITUD_CODIGO_PRODUCTO]
+    # Extraer información de peso (últimos 6 dígitos)
+    info_peso = codigo_completo[LONGITUD_CODIGO_PRODUCTO:]
+    # Los primeros 2 dígitos son kg (parte entera), los últimos 4 la parte decimal
+    kg = int(info_peso[:2])
+    g = int(info_peso[2:])
+    peso = kg + (g / 10000)
+    
+    return codigo_producto, peso
+
+def codigo_producto_de(codigo_completo):
+    """Retorna el código de producto contenido en el texto leído (etiqueta o código directo)"""
+    codigo_completo = codigo_completo.strip()
+    if es_etiqueta_valida(codigo_completo):
+        return codigo_completo[:LONGITUD_CODIGO_PRODUCTO]
+    return codigo_completo
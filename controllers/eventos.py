@@ -0,0 +1,31 @@
+"""
+Señales sencillas sin dependencia de Qt para el núcleo de la aplicación
+"""
+import logging
+
+logger = logging.getLogger('eventos')
+
+class Senal:
+    """Señal con la misma interfaz básica que Signal de Qt (connect/disconnect/emit)"""
+    
+    def __init__(self):
+        self._receptores = []
+    
+    def connect(self, receptor):
+        """Conecta una función que se invocará en cada emisión"""
+        self._receptores.append(receptor)
+    
+    def disconnect(self, receptor=None):
+        """Desconecta un receptor, o todos si no se indica ninguno"""
+        if receptor is None:
+            self._receptores.clear()
+        elif receptor in self._receptores:
+            self._receptores.remove(receptor)
+    
+    def emit(self, *args):
+        """Invoca a todos los receptores conectados con los argumentos dados"""
+        for receptor in list(self._receptores):
+            try:
+                receptor(*args)
+            except Exception as e:
+                logger.error("Error en receptor de señal %r: %s", receptor, e)
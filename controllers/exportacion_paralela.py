@@ -0,0 +1,190 @@
+"""
+Exportación en paralelo de rangos de fechas grandes
+
+El rango se divide en tramos de tiempo que se leen a la vez, cada uno con su conexión de un
+pool. Cada lote leído se serializa en un proceso del pool de procesos como un archivo parcial;
+al terminar, las partes se concatenan en orden en el archivo final (CSV y JSON Lines, también
+comprimidos: gzip y zstd admiten concatenar miembros/frames) o, para Parquet y Arrow, quedan
+como un conjunto de datos de varias partes en un directorio nuevo junto al archivo elegido
+(ver ruta_partes); nunca se borra ni se reemplaza un directorio existente.
+"""
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from controllers.exportadores import COLUMNAS, ExportadorCSV, FORMATOS, crear_exportador, formato_desde_ruta
+
+logger = logging.getLogger('exportacion_paralela')
+
+# Formatos que no admiten concatenar partes y se escriben siempre como conjunto de varias partes
+FORMATOS_MULTIPARTE = ('parquet', 'arrow')
+
+# Máximo de conexiones de un pool de MySQL Connector
+MAX_CONEXIONES = 32
+
+# Tramos por conexión: más tramos que conexiones reparten mejor los días con más pesajes
+TRAMOS_POR_CONEXION = 4
+
+# Nombre de los pools de conexiones de las exportaciones (separados de los de las cargas cancelables)
+NOMBRE_POOL = 'exportacion'
+
+def ruta_partes(ruta_archivo):
+    """Directorio en el que se publica una exportación de varias partes pedida como ruta_archivo"""
+    return ruta_archivo + '.partes'
+
+def dividir_rango(fecha_desde, fecha_hasta, cantidad):
+    """Divide [fecha_desde, fecha_hasta) en 'cantidad' tramos consecutivos de igual duración"""
+    duracion = (fecha_hasta - fecha_desde) / cantidad
+    limites = [fecha_desde + duracion * i for i in range(cantidad)] + [fecha_hasta]
+    # Redondear a segundos (resolución de fecha_hora) sin dejar tramos vacíos ni huecos
+    limites = sorted({l.replace(microsecond=0) for l in limites[:-1]} | {fecha_hasta})
+    return list(zip(limites[:-1], limites[1:]))
+
+def serializar_parte(ruta_parte, formato, filas):
+    """Escribe un lote de filas (tuplas en el orden de COLUMNAS) en un archivo parcial
+
+    Se ejecuta en un proceso del pool; retorna la cantidad de filas escritas.
+    """
+    pesajes = [dict(zip(COLUMNAS, fila)) for fila in filas]
+    if formato == 'csv':
+        exportador = ExportadorCSV(ruta_parte, encabezado=False)
+    else:
+        exportador = crear_exportador(ruta_parte, formato)
+    with exportador:
+        exportador.escribir_lote(pesajes)
+    return len(pesajes)
+
+class ExportacionParalela:
+    """Exporta un rango de fechas leyendo tramos en paralelo y serializando en varios procesos"""
+
+    def __init__(self, pesaje_repo, db, conexiones=4, procesos=None, tamano_lote=20000, tramos=None):
+        self.pesaje_repo = pesaje_repo
+        self.db = db
+        self.conexiones = max(1, min(conexiones, MAX_CONEXIONES))
+        self.procesos = procesos or os.cpu_count() or 1
+        self.tamano_lote = tamano_lote
+        self.tramos = tramos or self.conexiones * TRAMOS_POR_CONEXION
+        # Ruta del archivo o directorio escrito por la última exportación
+        self.ruta_resultado = None
+
+    def exportar(self, ruta_archivo, fecha_desde, fecha_hasta, formato=None, multiparte=None, progreso=None,
+                 codigo_vendedor=None, producto=None):
+        """Exporta los pesajes del rango [fecha_desde, fecha_hasta) y retorna la cantidad exportada
+
+        En varias partes el resultado queda en ruta_partes(ruta_archivo), que no debe existir.
+        codigo_vendedor y producto aplican los mismos filtros que el historial. progreso, si se
+        indica, se llama con (filas_escritas, filas_totales) a medida que se completan las
+        partes (desde un hilo de trabajo).
+        """
+        formato = formato or formato_desde_ruta(ruta_archivo)
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de exportación no soportado: {formato}")
+        if multiparte is None:
+            multiparte = formato in FORMATOS_MULTIPARTE
+        elif not multiparte and formato in FORMATOS_MULTIPARTE:
+            raise ValueError(f"El formato {formato} solo puede exportarse en varias partes")
+        if multiparte and os.path.lexists(ruta_partes(ruta_archivo)):
+            raise FileExistsError(f"Ya existe {ruta_partes(ruta_archivo)}; elija otro nombre o elimínelo")
+
+        filtros = {'codigo_vendedor': codigo_vendedor, 'producto': producto}
+        # El conteo usa el mismo pool (y servidor) que los tramos, nunca la conexión principal
+        with self.db.conexion_cancelable(self.conexiones, NOMBRE_POOL) as (destino, _):
+            total = self.pesaje_repo.contar(fecha_desde, fecha_hasta, **filtros)
+        if not total:
+            return 0
+
+        extension = FORMATOS[formato][0]
+        directorio_destino = os.path.dirname(os.path.abspath(ruta_archivo))
+        directorio_partes = tempfile.mkdtemp(prefix='.exportacion_', dir=directorio_destino)
+        try:
+            partes = self._escribir_partes(
+                directorio_partes, extension, formato, fecha_desde, fecha_hasta, total, progreso, destino, filtros
+            )
+            if multiparte:
+                self.ruta_resultado = ruta_partes(ruta_archivo)
+                self._publicar_partes(partes, directorio_partes, self.ruta_resultado, extension)
+            else:
+                self.ruta_resultado = ruta_archivo
+                self._unir_partes(partes, ruta_archivo, formato)
+        finally:
+            shutil.rmtree(directorio_partes, ignore_errors=True)
+
+        logger.info("Exportación en paralelo de %s pesajes a %s (%s tramos)", total, self.ruta_resultado, self.tramos)
+        return total
+
+    def _escribir_partes(self, directorio_partes, extension, formato, fecha_desde, fecha_hasta, total, progreso,
+                         destino, filtros):
+        """Lee los tramos en paralelo y serializa cada lote en una parte; retorna las rutas en orden"""
+        tramos = dividir_rango(fecha_desde, fecha_hasta, self.tramos)
+        pool_conexiones = self.db.pool_lectura(self.conexiones, destino, NOMBRE_POOL)
+
+        # Lotes leídos pendientes de serializar; limita la memoria si la lectura es más rápida
+        en_vuelo = threading.BoundedSemaphore(self.procesos * 2)
+        lock = threading.Lock()
+        partes = {}
+        futuros = []
+        escritas = [0]
+
+        def parte_completada(futuro):
+            en_vuelo.release()
+            if futuro.exception() is not None:
+                return
+            with lock:
+                escritas[0] += futuro.result()
+                filas = escritas[0]
+            if progreso is not None:
+                progreso(filas, total)
+
+        def leer_tramo(indice, inicio, fin):
+            connection = pool_conexiones.get_connection()
+            try:
+                for numero, lote in enumerate(self.pesaje_repo.iter_tramo(connection, inicio, fin, self.tamano_lote, **filtros)):
+                    ruta_parte = os.path.join(directorio_partes, f"parte-{indice:05d}-{numero:05d}{extension}")
+                    en_vuelo.acquire()
+                    futuro = procesos.submit(serializar_parte, ruta_parte, formato, lote)
+                    futuro.add_done_callback(parte_completada)
+                    with lock:
+                        partes[(indice, numero)] = ruta_parte
+                        futuros.append(futuro)
+            finally:
+                connection.close()  # devuelve la conexión al pool
+
+        # 'spawn' evita bifurcar un proceso con hilos activos (interfaz, lectores)
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.procesos, mp_context=contexto) as procesos, \
+                ThreadPoolExecutor(max_workers=self.conexiones, thread_name_prefix='lector-tramo') as lectores:
+            lecturas = [lectores.submit(leer_tramo, i, inicio, fin) for i, (inicio, fin) in enumerate(tramos)]
+            for lectura in lecturas:
+                lectura.result()
+            for futuro in list(futuros):
+                futuro.result()
+
+        return [partes[clave] for clave in sorted(partes)]
+
+    def _unir_partes(self, partes, ruta_archivo, formato):
+        """Concatena las partes en orden en el archivo final (con el encabezado CSV al comienzo)"""
+        temporal = ruta_archivo + '.tmp'
+        with open(temporal, 'wb') as destino:
+            if formato == 'csv':
+                encabezado = io.StringIO()
+                csv.writer(encabezado).writerow(ExportadorCSV.CAMPOS)
+                destino.write(encabezado.getvalue().encode('utf-8'))
+            for ruta_parte in partes:
+                with open(ruta_parte, 'rb') as origen:
+                    shutil.copyfileobj(origen, destino, 1024 * 1024)
+        os.replace(temporal, ruta_archivo)
+
+    def _publicar_partes(self, partes, directorio_partes, ruta_directorio, extension):
+        """Numera las partes en orden y publica el directorio temporal como el del conjunto de datos"""
+        for numero, ruta_parte in enumerate(partes):
+            os.rename(ruta_parte, os.path.join(directorio_partes, f"parte-{numero:05d}{extension}"))
+        if os.path.lexists(ruta_directorio):
+            raise FileExistsError(f"Ya existe {ruta_directorio}; elija otro nombre o elimínelo")
+        # mkdtemp crea el directorio solo para el usuario; el conjunto publicado usa permisos habituales
+        os.chmod(directorio_partes, 0o755)
+        os.rename(directorio_partes, ruta_directorio)
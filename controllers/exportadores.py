@@ -0,0 +1,230 @@
+"""
+Escritores de exportación de pesajes (CSV, JSONL comprimido, Parquet y Arrow)
+
+Todos los escritores reciben los pesajes por lotes, de modo que la exportación
+avanza con memoria acotada sin importar la cantidad de registros.
+"""
+import csv
+import gzip
+import io
+import json
+import logging
+from datetime import datetime
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dependencia opcional, solo necesaria para Parquet/Arrow
+    pa = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:  # Dependencia opcional, solo necesaria para JSONL con zstd
+    zstandard = None
+
+logger = logging.getLogger('exportadores')
+
+# Columnas exportadas en los formatos de datos (nombres de la base de datos)
+COLUMNAS = [
+    'id', 'fecha_hora', 'codigo_producto', 'nombre_producto', 'peso',
+    'codigo_vendedor', 'nombre_vendedor', 'precio_kg', 'total', 'observaciones'
+]
+
+class Exportador:
+    """Clase base para los escritores de exportación"""
+
+    def __init__(self, ruta_archivo):
+        self.ruta_archivo = ruta_archivo
+        self.filas_escritas = 0
+
+    def __enter__(self):
+        self.abrir()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+        return False
+
+    def abrir(self):
+        """Abre el archivo de destino"""
+        raise NotImplementedError
+
+    def escribir_lote(self, pesajes):
+        """Escribe un lote de pesajes"""
+        raise NotImplementedError
+
+    def cerrar(self):
+        """Completa y cierra el archivo de destino"""
+        raise NotImplementedError
+
+class ExportadorCSV(Exportador):
+    """Exporta a CSV con fechas y decimales formateados para lectura humana"""
+
+    CAMPOS = [
+        'ID', 'Fecha', 'Código Producto', 'Producto',
+        'Peso (kg)', 'Código Vendedor', 'Vendedor',
+        'Precio/kg', 'Total', 'Observaciones'
+    ]
+
+    def __init__(self, ruta_archivo, encabezado=True):
+        super().__init__(ruta_archivo)
+        # Sin encabezado para las partes de una exportación que luego se concatenan
+        self.encabezado = encabezado
+
+    def abrir(self):
+        self._archivo = open(self.ruta_archivo, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._archivo, fieldnames=self.CAMPOS)
+        if self.encabezado:
+            self._writer.writeheader()
+
+    def escribir_lote(self, pesajes):
+        for pesaje in pesajes:
+            # Formatear fecha
+            fecha_hora = datetime.fromisoformat(str(pesaje['fecha_hora']))
+            fecha_formateada = fecha_hora.strftime("%d/%m/%Y %H:%M")
+
+            # Escribir fila
+            self._writer.writerow({
+                'ID': pesaje['id'],
+                'Fecha': fecha_formateada,
+                'Código Producto': pesaje['codigo_producto'],
+                'Producto': pesaje['nombre_producto'],
+                'Peso (kg)': f"{pesaje['peso']:.2f}",
+                'Código Vendedor': pesaje['codigo_vendedor'],
+                'Vendedor': pesaje['nombre_vendedor'],
+                'Precio/kg': f"{pesaje['precio_kg']:.2f}" if pesaje['precio_kg'] else '',
+                'Total': f"{pesaje['total']:.2f}" if pesaje['total'] else '',
+                'Observaciones': pesaje['observaciones'] or ''
+            })
+        self.filas_escritas += len(pesajes)
+
+    def cerrar(self):
+        self._archivo.close()
+
+def _valor_json(valor):
+    """Convierte los tipos de MySQL a tipos nativos de JSON"""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+class ExportadorJSONL(Exportador):
+    """Exporta a JSON Lines con tipos nativos, opcionalmente comprimido con gzip o zstd"""
+
+    def __init__(self, ruta_archivo, compresion=None):
+        super().__init__(ruta_archivo)
+        self.compresion = compresion
+
+    def abrir(self):
+        if self.compresion == 'gzip':
+            self._archivo = gzip.open(self.ruta_archivo, 'wt', encoding='utf-8', compresslevel=6)
+        elif self.compresion == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("La exportación con zstd requiere el paquete 'zstandard'")
+            self._crudo = open(self.ruta_archivo, 'wb')
+            self._comprimido = zstandard.ZstdCompressor(level=3).stream_writer(self._crudo, closefd=False)
+            self._archivo = io.TextIOWrapper(self._comprimido, encoding='utf-8')
+        else:
+            self._archivo = open(self.ruta_archivo, 'w', encoding='utf-8')
+
+    def escribir_lote(self, pesajes):
+        lineas = [
+            json.dumps({c: _valor_json(p.get(c)) for c in COLUMNAS}, ensure_ascii=False)
+            for p in pesajes
+        ]
+        if lineas:
+            self._archivo.write('\n'.join(lineas) + '\n')
+        self.filas_escritas += len(pesajes)
+
+    def cerrar(self):
+        self._archivo.close()
+        if self.compresion == 'zstd':
+            self._crudo.close()
+
+def esquema_arrow():
+    """Esquema Arrow con los tipos nativos de cada columna"""
+    return pa.schema([
+        ('id', pa.int64()),
+        ('fecha_hora', pa.timestamp('s')),
+        ('codigo_producto', pa.string()),
+        ('nombre_producto', pa.string()),
+        ('peso', pa.decimal128(10, 2)),
+        ('codigo_vendedor', pa.string()),
+        ('nombre_vendedor', pa.string()),
+        ('precio_kg', pa.decimal128(10, 2)),
+        ('total', pa.decimal128(10, 2)),
+        ('observaciones', pa.string()),
+    ])
+
+def tabla_arrow(pesajes, esquema):
+    """Convierte un lote de pesajes en una tabla Arrow por columnas"""
+    columnas = {c: [p.get(c) for p in pesajes] for c in COLUMNAS}
+    return pa.Table.from_pydict(columnas, schema=esquema)
+
+class ExportadorParquet(Exportador):
+    """Exporta a Parquet columnar con tipos nativos (un grupo de filas por lote)"""
+
+    def abrir(self):
+        if pa is None:
+            raise RuntimeError("La exportación a Parquet requiere el paquete 'pyarrow'")
+        self._esquema = esquema_arrow()
+        self._writer = pq.ParquetWriter(self.ruta_archivo, self._esquema, compression='zstd')
+
+    def escribir_lote(self, pesajes):
+        if pesajes:
+            self._writer.write_table(tabla_arrow(pesajes, self._esquema))
+        self.filas_escritas += len(pesajes)
+
+    def cerrar(self):
+        self._writer.close()
+
+class ExportadorArrow(Exportador):
+    """Exporta a archivo Arrow IPC (Feather v2) con tipos nativos"""
+
+    def abrir(self):
+        if pa is None:
+            raise RuntimeError("La exportación a Arrow requiere el paquete 'pyarrow'")
+        self._esquema = esquema_arrow()
+        self._sink = pa.OSFile(self.ruta_archivo, 'wb')
+        self._writer = pa.ipc.new_file(
+            self._sink, self._esquema,
+            options=pa.ipc.IpcWriteOptions(compression='zstd')
+        )
+
+    def escribir_lote(self, pesajes):
+        if pesajes:
+            self._writer.write_table(tabla_arrow(pesajes, self._esquema))
+        self.filas_escritas += len(pesajes)
+
+    def cerrar(self):
+        self._writer.close()
+        self._sink.close()
+
+# Formatos disponibles: nombre -> (extensión, fábrica del escritor)
+FORMATOS = {
+    'csv': ('.csv', ExportadorCSV),
+    'jsonl': ('.jsonl', ExportadorJSONL),
+    'jsonl.gz': ('.jsonl.gz', lambda ruta: ExportadorJSONL(ruta, compresion='gzip')),
+    'jsonl.zst': ('.jsonl.zst', lambda ruta: ExportadorJSONL(ruta, compresion='zstd')),
+    'parquet': ('.parquet', ExportadorParquet),
+    'arrow': ('.arrow', ExportadorArrow),
+}
+
+def formato_desde_ruta(ruta_archivo):
+    """Deduce el formato de exportación a partir de la extensión del archivo (CSV por defecto)"""
+    ruta = ruta_archivo.lower()
+    # Comparar primero las extensiones más largas (.jsonl.gz antes que .gz)
+    for formato, (extension, _) in sorted(FORMATOS.items(), key=lambda f: -len(f[1][0])):
+        if ruta.endswith(extension):
+            return formato
+    return 'csv'
+
+def crear_exportador(ruta_archivo, formato=None):
+    """Crea el escritor correspondiente al formato indicado o deducido de la ruta"""
+    formato = formato or formato_desde_ruta(ruta_archivo)
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    return FORMATOS[formato][1](ruta_archivo)
@@ -0,0 +1,538 @@
+"""
+Núcleo de la lógica de negocio de pesajes, sin dependencia de Qt
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from controllers.carga_cancelable import CargaCancelable
+from controllers.cierre_diario import CierreDiario
+from controllers.deshacer import ColaDeshacer
+from controllers.detector_anomalias import DetectorAnomalias, marcar_observaciones
+from controllers.eventos import Senal
+from controllers.exportacion_paralela import ExportacionParalela
+from controllers.exportadores import crear_exportador
+from herramientas.metricas import RegistroMetricas
+from models.repository import ProductoRepository, VendedorRepository, PesajeRepository
+from models.precios_snapshot import PreciosSnapshot
+from models.historial_cache import HistorialCache
+from models.indice_busqueda import IndiceCatalogo
+from models.series_kilos import SeriesKilos
+
+logger = logging.getLogger('pesaje_core')
+
+# Nombres de las señales que emite el núcleo
+SENALES = (
+    'pesaje_guardado',  # Emite el ID del pesaje guardado
+    'pesajes_actualizados',  # Emite lista de pesajes
+    'estadisticas_actualizadas',  # Emite lista de estadísticas y la generación de la carga
+    'exportacion_completada',  # Emite la ruta del archivo exportado
+    'producto_encontrado',  # Emite datos del producto encontrado
+    'vendedor_encontrado',  # Emite datos del vendedor encontrado
+    'error_ocurrido',  # Emite mensaje de error
+    'pesaje_deshecho',  # Emite el ID del pesaje revertido
+    'historial_actualizado',  # Emite pesajes del historial, si es un agregado incremental y la generación de la carga
+    'cierre_completado',  # Emite el resumen del cierre diario generado
+    'exportacion_progreso',  # Emite filas exportadas y filas totales de una exportación en paralelo
+    'anomalia_detectada',  # Emite el ID del pesaje y la lista de anomalías detectadas
+    'series_actualizadas',  # Emite las series de kilos por vendedor y la generación de la carga
+)
+
+# Ventana usada para medir el ritmo de registro
+VENTANA_RITMO_SEGUNDOS = 60
+
+# Pesajes propios que recuerda cada estación para su lista de recientes
+RECIENTES_POR_ESTACION = 50
+
+# Métricas del registro de pesajes
+_pesajes_registrados = RegistroMetricas().contador('carni_pesajes_registrados_total', "Pesajes registrados")
+_anomalias = RegistroMetricas().contador('carni_pesajes_anomalos_total', "Pesajes marcados como anómalos al registrarse")
+_duracion_registro = RegistroMetricas().histograma(
+    'carni_registrar_pesaje_segundos', "Duración de registrar_pesaje (validación, escritura y recarga de recientes)"
+)
+_ritmo = RegistroMetricas().medidor('carni_pesajes_por_minuto', "Pesajes registrados durante el último minuto")
+
+class RecursosCompartidos:
+    """Repositorios, índices del catálogo, caché del historial y detector de anomalías de un proceso
+
+    En modo multiestación todas las estaciones usan la misma instancia; la conexión, el pool de
+    lecturas, la instantánea de precios y el coalescedor de inserciones ya son únicos por proceso.
+    """
+    
+    def __init__(self):
+        self.producto_repo = ProductoRepository()
+        self.vendedor_repo = VendedorRepository()
+        self.pesaje_repo = PesajeRepository()
+        self.historial_cache = HistorialCache()
+        self.detector = DetectorAnomalias()
+        self.series = SeriesKilos()
+        
+        # Índices de búsqueda para autocompletar; se reconstruyen al cambiar el catálogo
+        self.indice_productos = IndiceCatalogo(
+            self.producto_repo.get_all_con_version,
+            lambda p: (p['codigo'], (p['nombre'], p.get('descripcion'))),
+            lambda: ProductoRepository.version_catalogo,
+            self.producto_repo.get_version
+        )
+        self.indice_vendedores = IndiceCatalogo(
+            self.vendedor_repo.get_all_con_version,
+            lambda v: (v['codigo'], (v['nombre'], v['apellido'])),
+            lambda: VendedorRepository.version_catalogo,
+            self.vendedor_repo.get_version
+        )
+
+class PesajeControllerCore:
+    """Lógica de gestión de pesajes reutilizable desde la interfaz gráfica o en modo servicio
+    
+    Con estacion (un nombre) el controlador atiende un puesto dentro de un proceso multiestación:
+    comparte los recursos indicados con los demás puestos y su lista de recientes muestra solo
+    sus propios pesajes.
+    """
+    
+    def __init__(self, compartidos=None, estacion=None):
+        # Crear señales propias salvo que la subclase ya las defina (p. ej. señales de Qt)
+        for nombre in SENALES:
+            if not hasattr(type(self), nombre):
+                setattr(self, nombre, Senal())
+        
+        self.compartidos = compartidos or RecursosCompartidos()
+        self.estacion = estacion
+        self.producto_repo = self.compartidos.producto_repo
+        self.vendedor_repo = self.compartidos.vendedor_repo
+        self.pesaje_repo = self.compartidos.pesaje_repo
+        self.precios = PreciosSnapshot()
+        self.deshacer = ColaDeshacer()
+        # Cambios que cada pesaje que todavía puede deshacerse aplicó al detector de anomalías
+        self._incorporaciones = OrderedDict()
+        self.historial_cache = self.compartidos.historial_cache
+        self.detector = self.compartidos.detector
+        self.series = self.compartidos.series
+        self.indice_productos = self.compartidos.indice_productos
+        self.indice_vendedores = self.compartidos.indice_vendedores
+        # Pesajes propios de la estación, y último pesaje y versión de la caché del historial que recibió la vista
+        self._recientes = deque(maxlen=RECIENTES_POR_ESTACION)
+        self._ultimo_id_historial = 0
+        self._version_historial = 0
+        # Cargas en segundo plano del historial, las estadísticas y las series, cancelables al reemplazarse
+        self.carga_historial = CargaCancelable(
+            self.pesaje_repo.db, 'historial', lambda e: self.error_ocurrido.emit(f"Error al cargar historial: {str(e)}")
+        )
+        self.carga_estadisticas = CargaCancelable(
+            self.pesaje_repo.db, 'estadisticas', lambda e: self.error_ocurrido.emit(f"Error al cargar estadísticas: {str(e)}")
+        )
+        self.carga_series = CargaCancelable(
+            self.pesaje_repo.db, 'series', lambda e: self.error_ocurrido.emit(f"Error al cargar las series de kilos: {str(e)}")
+        )
+        
+        self._marcas_registro = deque()
+        _ritmo.observar(self.pesajes_por_minuto)
+        # Hilos del cierre diario y de la exportación en paralelo en curso (si los hay)
+        self._hilo_cierre = None
+        self._hilo_exportacion = None
+    
+    def buscar_producto_por_codigo(self, codigo):
+        """Busca un producto por su código de barra"""
+        try:
+            producto = self.producto_repo.get_by_codigo(codigo)
+            if producto:
+                self.producto_encontrado.emit(producto)
+            else:
+                self.error_ocurrido.emit(f"No se encontró un producto con el código: {codigo}")
+        except Exception as e:
+            logger.error("Error al buscar producto: %s", e)
+            self.error_ocurrido.emit(f"Error al buscar producto: {str(e)}")
+    
+    def buscar_vendedor_por_codigo(self, codigo):
+        """Busca un vendedor por su código"""
+        try:
+            vendedor = self.vendedor_repo.get_by_codigo(codigo)
+            if vendedor:
+                self.vendedor_encontrado.emit(vendedor)
+            else:
+                self.error_ocurrido.emit(f"No se encontró un vendedor con el código: {codigo}")
+        except Exception as e:
+            logger.error("Error al buscar vendedor: %s", e)
+            self.error_ocurrido.emit(f"Error al buscar vendedor: {str(e)}")
+    
+    def buscar_productos(self, texto, k=10):
+        """Retorna hasta k productos cuyo código, nombre o descripción coinciden con el texto"""
+        try:
+            return self.indice_productos.buscar(texto, k)
+        except Exception as e:
+            logger.error("Error al buscar productos: %s", e)
+            return []
+    
+    def buscar_vendedores(self, texto, k=10):
+        """Retorna hasta k vendedores cuyo código, nombre o apellido coinciden con el texto"""
+        try:
+            return self.indice_vendedores.buscar(texto, k)
+        except Exception as e:
+            logger.error("Error al buscar vendedores: %s", e)
+            return []
+    
+    def registrar_pesaje(self, codigo_producto, peso, codigo_vendedor, observaciones=None):
+        """Registra un nuevo pesaje"""
+        inicio = time.perf_counter()
+        try:
+            # Verificar que el producto exista (primero en la instantánea, sin consultar la base)
+            producto = self.precios.get_producto(codigo_producto)
+            if not producto:
+                producto = self.producto_repo.get_by_codigo(codigo_producto)
+                if producto:
+                    # Producto creado desde otra instancia: refrescar la instantánea
+                    self.precios.invalidar()
+            if not producto:
+                self.error_ocurrido.emit(f"No se encontró un producto con el código: {codigo_producto}")
+                return
+            
+            # Verificar que el vendedor exista
+            vendedor = self.vendedor_repo.get_by_codigo(codigo_vendedor)
+            if not vendedor:
+                self.error_ocurrido.emit(f"No se encontró un vendedor con el código: {codigo_vendedor}")
+                return
+            
+            # Puntuar el pesaje y dejar constancia de las anomalías en las observaciones; las
+            # estadísticas del detector se actualizan recién cuando el pesaje quedó registrado
+            evaluacion = self.detector.puntuar(codigo_producto, codigo_vendedor, peso)
+            anomalias = evaluacion.anomalias
+            if anomalias:
+                observaciones = marcar_observaciones(observaciones, anomalias)
+            
+            # Registrar el pesaje
+            pesaje_id = self.pesaje_repo.create(
+                codigo_producto, 
+                peso, 
+                codigo_vendedor, 
+                precio_kg=producto.get('precio_kg'),
+                observaciones=observaciones
+            )
+            
+            self._incorporar(pesaje_id, evaluacion)
+            self.deshacer.agregar(pesaje_id)
+            self._recientes.append(pesaje_id)
+            self._marcar_registro()
+            
+            # Emitir señal de éxito
+            self.pesaje_guardado.emit(pesaje_id)
+            if anomalias:
+                _anomalias.incrementar()
+                logger.warning("Pesaje %s anómalo: %s", pesaje_id, "; ".join(a.detalle for a in anomalias))
+                self.anomalia_detectada.emit(pesaje_id, anomalias)
+            
+            # Actualizar la lista de pesajes recientes
+            self.cargar_pesajes_recientes()
+            
+        except Exception as e:
+            logger.error("Error al registrar pesaje: %s", e)
+            self.error_ocurrido.emit(f"Error al registrar pesaje: {str(e)}")
+        finally:
+            _duracion_registro.observar(time.perf_counter() - inicio)
+    
+    def deshacer_ultimo_pesaje(self):
+        """Revierte el último pesaje registrado si todavía está dentro de la ventana para deshacer"""
+        pesaje_id = self.deshacer.extraer()
+        if pesaje_id is None:
+            self.error_ocurrido.emit("No hay registros recientes para deshacer")
+            return
+        
+        try:
+            self.pesaje_repo.delete(pesaje_id)
+            self.historial_cache.eliminar(pesaje_id)
+            incorporacion = self._incorporaciones.pop(pesaje_id, None)
+            if incorporacion is not None:
+                self.detector.revertir(incorporacion)
+            if pesaje_id in self._recientes:
+                self._recientes.remove(pesaje_id)
+            self.pesaje_deshecho.emit(pesaje_id)
+            self.cargar_pesajes_recientes()
+        except Exception as e:
+            logger.error("Error al deshacer pesaje: %s", e)
+            self.error_ocurrido.emit(f"Error al deshacer pesaje: {str(e)}")
+    
+    def _incorporar(self, pesaje_id, evaluacion):
+        """Incorpora un pesaje registrado al detector y guarda el cambio por si se deshace"""
+        incorporacion = self.detector.incorporar(evaluacion)
+        if incorporacion is None:
+            return
+        self._incorporaciones[pesaje_id] = incorporacion
+        while len(self._incorporaciones) > self.deshacer.capacidad:
+            self._incorporaciones.popitem(last=False)
+    
+    def _marcar_registro(self, cantidad=1):
+        """Anota el instante de cada registro para calcular el ritmo de trabajo"""
+        ahora = time.monotonic()
+        self._marcas_registro.extend([ahora] * cantidad)
+        while self._marcas_registro and ahora - self._marcas_registro[0] > VENTANA_RITMO_SEGUNDOS:
+            self._marcas_registro.popleft()
+        _pesajes_registrados.incrementar(cantidad)
+    
+    def pesajes_por_minuto(self):
+        """Cantidad de pesajes registrados durante el último minuto (se puede consultar desde otro hilo)"""
+        ahora = time.monotonic()
+        # Copia sin modificar la cola, que solo altera el hilo que registra
+        recientes = sum(1 for marca in self._marcas_registro.copy() if ahora - marca <= VENTANA_RITMO_SEGUNDOS)
+        return recientes * 60 / VENTANA_RITMO_SEGUNDOS
+    
+    def registrar_pesajes_lote(self, pesajes):
+        """Registra un lote de pesajes (codigo_producto, peso, codigo_vendedor, observaciones) en una sola escritura
+        
+        Retorna la cantidad de pesajes registrados y la lista de rechazados con su motivo.
+        """
+        filas = []
+        evaluaciones = []
+        rechazados = []
+        vendedores_validos = {}
+        
+        for codigo_producto, peso, codigo_vendedor, observaciones in pesajes:
+            producto = self.precios.get_producto(codigo_producto)
+            if not producto:
+                rechazados.append((codigo_producto, codigo_vendedor, "Producto inexistente"))
+                continue
+            
+            if codigo_vendedor not in vendedores_validos:
+                vendedores_validos[codigo_vendedor] = self.vendedor_repo.get_by_codigo(codigo_vendedor) is not None
+            if not vendedores_validos[codigo_vendedor]:
+                rechazados.append((codigo_producto, codigo_vendedor, "Vendedor inexistente"))
+                continue
+            
+            evaluacion = self.detector.puntuar(codigo_producto, codigo_vendedor, peso)
+            if evaluacion.anomalias:
+                _anomalias.incrementar()
+                observaciones = marcar_observaciones(observaciones, evaluacion.anomalias)
+            evaluaciones.append(evaluacion)
+            filas.append((codigo_producto, peso, codigo_vendedor, producto.get('precio_kg'), observaciones))
+        
+        if filas:
+            try:
+                self.pesaje_repo.create_many(filas)
+            except Exception as e:
+                logger.error("Error al registrar lote de pesajes: %s", e)
+                self.error_ocurrido.emit(f"Error al registrar lote de pesajes: {str(e)}")
+                rechazados.extend((f[0], f[2], str(e)) for f in filas)
+                return 0, rechazados
+            # Los pesajes del lote no se pueden deshacer: se incorporan al detector sin guardar el cambio
+            for evaluacion in evaluaciones:
+                self.detector.incorporar(evaluacion)
+            self._marcar_registro(len(filas))
+        
+        return len(filas), rechazados
+    
+    def cargar_pesajes_recientes(self, limit=10):
+        """Carga los pesajes más recientes (en una estación, los registrados por ella)"""
+        try:
+            if self.estacion is None:
+                pesajes = self.pesaje_repo.get_all(limit=limit)
+            else:
+                pesajes = self.pesaje_repo.get_by_ids(list(self._recientes)[-limit:])
+            self.pesajes_actualizados.emit(pesajes)
+        except Exception as e:
+            logger.error("Error al cargar pesajes recientes: %s", e)
+            self.error_ocurrido.emit(f"Error al cargar pesajes recientes: {str(e)}")
+    
+    def cargar_pesajes_por_fecha(self, fecha_desde, fecha_hasta):
+        """Carga pesajes en un rango de fechas"""
+        try:
+            pesajes = self.pesaje_repo.get_by_fechas(fecha_desde, fecha_hasta)
+            self.pesajes_actualizados.emit(pesajes)
+        except Exception as e:
+            logger.error("Error al cargar pesajes por fecha: %s", e)
+            self.error_ocurrido.emit(f"Error al cargar pesajes por fecha: {str(e)}")
+    
+    def cargar_pesajes_por_vendedor(self, codigo_vendedor, limit=100):
+        """Carga pesajes de un vendedor específico"""
+        try:
+            pesajes = self.pesaje_repo.get_by_vendedor(codigo_vendedor, limit=limit)
+            self.pesajes_actualizados.emit(pesajes)
+        except Exception as e:
+            logger.error("Error al cargar pesajes por vendedor: %s", e)
+            self.error_ocurrido.emit(f"Error al cargar pesajes por vendedor: {str(e)}")
+    
+    def cargar_historial(self, fecha_desde, fecha_hasta, solo_nuevos=False, generacion=0):
+        """Carga el historial de un rango de fechas
+        
+        Si el rango está dentro de la ventana en caché se emite la caché completa (o, con
+        solo_nuevos, únicamente los pesajes agregados desde la última carga) y el filtrado
+        queda a cargo de la vista. Fuera de la ventana se consulta la base de datos. El
+        resultado se emite con la generación indicada, salvo que otra carga la haya reemplazado.
+        """
+        try:
+            # La primera vez se carga la ventana completa; luego solo se completan los pesajes nuevos
+            primera_carga = self.historial_cache.inicio_ventana is None
+            if primera_carga:
+                self.historial_cache.actualizar()
+            
+            if self.historial_cache.cubre(fecha_desde):
+                if not primera_carga:
+                    self.historial_cache.actualizar()
+                if not self.carga_historial.vigente(generacion):
+                    return
+                # La caché puede ser compartida: los nuevos se cuentan desde lo que ya recibió esta vista.
+                # Si la caché cambió de otra forma (bajas, altas fuera de orden) se emite completa
+                version = self.historial_cache.version
+                if (primera_carga or not solo_nuevos or not self._ultimo_id_historial
+                        or version != self._version_historial):
+                    filas = self.historial_cache.filas()
+                    self._version_historial = version
+                    self.historial_actualizado.emit(filas, False, generacion)
+                else:
+                    filas = self.historial_cache.filas_desde(self._ultimo_id_historial)
+                    if filas:
+                        self.historial_actualizado.emit(filas, True, generacion)
+                if filas:
+                    self._ultimo_id_historial = filas[-1]['id']
+                return
+            
+            pesajes = self.pesaje_repo.get_by_fechas(fecha_desde, fecha_hasta)
+            if self.carga_historial.vigente(generacion):
+                self.historial_actualizado.emit(pesajes, False, generacion)
+        except Exception as e:
+            # Una consulta cancelada por una carga más reciente no es un error para el usuario
+            if not self.carga_historial.vigente(generacion):
+                return
+            logger.error("Error al cargar historial: %s", e)
+            self.error_ocurrido.emit(f"Error al cargar historial: {str(e)}")
+    
+    def iniciar_carga_historial(self, fecha_desde, fecha_hasta, solo_nuevos=False):
+        """Carga el historial en segundo plano y retorna la generación con la que se emitirá el resultado
+        
+        Una carga en curso con otros parámetros se cancela; con los mismos parámetros se reutiliza.
+        """
+        return self.carga_historial.solicitar(
+            ('historial', fecha_desde, fecha_hasta, solo_nuevos),
+            self.cargar_historial, fecha_desde, fecha_hasta, solo_nuevos
+        )
+    
+    def cargar_estadisticas(self, fecha_desde=None, fecha_hasta=None, generacion=0):
+        """Carga estadísticas de pesajes por vendedor"""
+        try:
+            estadisticas = self.pesaje_repo.get_estadisticas_vendedores(
+                fecha_desde=fecha_desde, 
+                fecha_hasta=fecha_hasta
+            )
+            if self.carga_estadisticas.vigente(generacion):
+                self.estadisticas_actualizadas.emit(estadisticas, generacion)
+        except Exception as e:
+            if not self.carga_estadisticas.vigente(generacion):
+                return
+            logger.error("Error al cargar estadísticas: %s", e)
+            self.error_ocurrido.emit(f"Error al cargar estadísticas: {str(e)}")
+    
+    def iniciar_carga_estadisticas(self, fecha_desde=None, fecha_hasta=None):
+        """Carga las estadísticas en segundo plano y retorna la generación con la que se emitirá el resultado"""
+        return self.carga_estadisticas.solicitar(
+            ('estadisticas', fecha_desde, fecha_hasta),
+            self.cargar_estadisticas, fecha_desde, fecha_hasta
+        )
+    
+    def cargar_series(self, fecha_desde, fecha_hasta, puntos=200, codigo_vendedor=None, generacion=0):
+        """Carga las series de kilos por vendedor del rango, con a lo sumo 'puntos' puntos"""
+        try:
+            series = self.series.consultar(fecha_desde, fecha_hasta, puntos, codigo_vendedor)
+            if self.carga_series.vigente(generacion):
+                self.series_actualizadas.emit(series, generacion)
+        except Exception as e:
+            if not self.carga_series.vigente(generacion):
+                return
+            logger.error("Error al cargar las series de kilos: %s", e)
+            self.error_ocurrido.emit(f"Error al cargar las series de kilos: {str(e)}")
+    
+    def iniciar_carga_series(self, fecha_desde, fecha_hasta, puntos=200, codigo_vendedor=None):
+        """Carga las series en segundo plano y retorna la generación con la que se emitirá el resultado"""
+        return self.carga_series.solicitar(
+            ('series', fecha_desde, fecha_hasta, puntos, codigo_vendedor),
+            self.cargar_series, fecha_desde, fecha_hasta, puntos, codigo_vendedor
+        )
+    
+    def exportar(self, ruta_archivo, formato=None, fecha_desde=None, fecha_hasta=None, tamano_lote=5000):
+        """Exporta los pesajes en el formato indicado (o deducido de la extensión), lote a lote"""
+        try:
+            # Obtener los datos a exportar
+            if fecha_desde and fecha_hasta:
+                lotes = self.pesaje_repo.iter_lotes(fecha_desde, fecha_hasta, tamano_lote=tamano_lote)
+            else:
+                lotes = iter([self.pesaje_repo.get_all(limit=1000)])  # Limitar a 1000 registros por defecto
+            
+            with crear_exportador(ruta_archivo, formato) as exportador:
+                for lote in lotes:
+                    exportador.escribir_lote(lote)
+            
+            if not exportador.filas_escritas:
+                os.remove(ruta_archivo)
+                self.error_ocurrido.emit("No hay datos para exportar")
+                return
+            
+            logger.info("Exportados %s pesajes a %s", exportador.filas_escritas, ruta_archivo)
+            
+            # Emitir señal de éxito
+            self.exportacion_completada.emit(ruta_archivo)
+            
+        except Exception as e:
+            logger.error("Error al exportar: %s", e)
+            self.error_ocurrido.emit(f"Error al exportar: {str(e)}")
+    
+    def exportar_paralelo(self, ruta_archivo, fecha_desde, fecha_hasta, formato=None,
+                          conexiones=4, procesos=None, multiparte=None, codigo_vendedor=None, producto=None):
+        """Exporta un rango de fechas grande leyendo tramos en paralelo y serializando en varios procesos
+        
+        El rango es [fecha_desde, fecha_hasta), filtrado opcionalmente por vendedor y producto como
+        el historial. Parquet y Arrow (o multiparte=True) generan, en lugar de un único archivo, un
+        directorio nuevo con una parte por lote; la ruta emitida es la del resultado.
+        """
+        try:
+            exportacion = ExportacionParalela(
+                self.pesaje_repo, self.pesaje_repo.db, conexiones=conexiones, procesos=procesos
+            )
+            filas = exportacion.exportar(
+                ruta_archivo, fecha_desde, fecha_hasta, formato=formato, multiparte=multiparte,
+                progreso=self.exportacion_progreso.emit, codigo_vendedor=codigo_vendedor, producto=producto
+            )
+            if not filas:
+                self.error_ocurrido.emit("No hay datos para exportar")
+                return 0
+            
+            self.exportacion_completada.emit(exportacion.ruta_resultado)
+            return filas
+        except Exception as e:
+            logger.error("Error al exportar en paralelo: %s", e)
+            self.error_ocurrido.emit(f"Error al exportar: {str(e)}")
+            return None
+    
+    def iniciar_exportacion_paralela(self, ruta_archivo, fecha_desde, fecha_hasta, formato=None,
+                                     codigo_vendedor=None, producto=None):
+        """Ejecuta exportar_paralelo en un hilo aparte para no bloquear la interfaz; retorna False si ya hay una en curso"""
+        if self._hilo_exportacion is not None and self._hilo_exportacion.is_alive():
+            return False
+        self._hilo_exportacion = threading.Thread(
+            target=self.exportar_paralelo, args=(ruta_archivo, fecha_desde, fecha_hasta, formato),
+            kwargs={'codigo_vendedor': codigo_vendedor, 'producto': producto},
+            name='exportacion-paralela', daemon=True
+        )
+        self._hilo_exportacion.start()
+        return True
+    
+    def exportar_a_csv(self, ruta_archivo, fecha_desde=None, fecha_hasta=None):
+        """Exporta los pesajes a un archivo CSV"""
+        self.exportar(ruta_archivo, 'csv', fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+    
+    def generar_cierre(self, fecha, forzar=False, directorio_base='cierres', procesos=None):
+        """Genera el cierre del día indicado (solo regenera los reportes cuyos datos cambiaron)"""
+        try:
+            cierre = CierreDiario(self.pesaje_repo, directorio_base=directorio_base, procesos=procesos)
+            resultado = cierre.generar(fecha, forzar=forzar)
+            self.cierre_completado.emit(resultado)
+            return resultado
+        except Exception as e:
+            logger.error("Error al generar el cierre diario: %s", e)
+            self.error_ocurrido.emit(f"Error al generar el cierre diario: {str(e)}")
+            return None
+    
+    def iniciar_cierre(self, fecha, forzar=False):
+        """Genera el cierre en un hilo aparte para no bloquear la interfaz; retorna False si ya hay uno en curso"""
+        if self._hilo_cierre is not None and self._hilo_cierre.is_alive():
+            return False
+        self._hilo_cierre = threading.Thread(
+            target=self.generar_cierre, args=(fecha, forzar), name='cierre-diario', daemon=True
+        )
+        self._hilo_cierre.start()
+        return True
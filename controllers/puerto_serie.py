@@ -0,0 +1,73 @@
+"""
+Lectura de dispositivos en puerto serie (o un pty que los simule) sin dependencias externas
+"""
+import logging
+import os
+import select
+import termios
+import threading
+import tty
+
+logger = logging.getLogger('puerto_serie')
+
+def abrir_puerto(ruta):
+    """Abre el dispositivo en modo lectura, sin bloqueo y en modo crudo si es una terminal"""
+    fd = os.open(ruta, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    if os.isatty(fd):
+        tty.setraw(fd, termios.TCSANOW)
+    return fd
+
+class LectorTramas(threading.Thread):
+    """Hilo que lee un puerto serie y entrega cada trama delimitada por fin de línea"""
+    
+    # Bytes que delimitan el final de una trama
+    TERMINADORES = (b'\r', b'\n')
+    
+    def __init__(self, ruta, nombre='lector-serie'):
+        super().__init__(name=nombre, daemon=True)
+        self.ruta = ruta
+        self._detener = threading.Event()
+    
+    def procesar_trama(self, trama):
+        """Recibe cada trama completa (texto sin terminador); las subclases la interpretan"""
+        raise NotImplementedError
+    
+    def detener(self):
+        """Solicita la finalización del hilo"""
+        self._detener.set()
+    
+    def run(self):
+        """Lee el puerto hasta que se solicite detener el hilo"""
+        try:
+            fd = abrir_puerto(self.ruta)
+        except OSError as e:
+            logger.error("No se pudo abrir el puerto %s: %s", self.ruta, e)
+            return
+        
+        buffer = b''
+        try:
+            while not self._detener.is_set():
+                listos, _, _ = select.select([fd], [], [], 0.2)
+                if not listos:
+                    continue
+                try:
+                    datos = os.read(fd, 4096)
+                except BlockingIOError:
+                    continue
+                if not datos:
+                    # El otro extremo cerró el dispositivo; esperar a que vuelva
+                    self._detener.wait(0.2)
+                    continue
+                
+                buffer += datos
+                for terminador in self.TERMINADORES[1:]:
+                    buffer = buffer.replace(terminador, self.TERMINADORES[0])
+                *tramas, buffer = buffer.split(self.TERMINADORES[0])
+                for trama in tramas:
+                    texto = trama.decode('ascii', errors='ignore').strip()
+                    if texto:
+                        self.procesar_trama(texto)
+        except OSError as e:
+            logger.error("Error al leer el puerto %s: %s", self.ruta, e)
+        finally:
+            os.close(fd)
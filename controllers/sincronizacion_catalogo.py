@@ -0,0 +1,200 @@
+"""
+Sincronización masiva del catálogo de productos o vendedores a partir de un archivo CSV
+
+El archivo se lee fila a fila y se compara con el catálogo actual, cargado una sola vez en
+memoria. Solo se escriben las diferencias (altas, modificaciones, reactivaciones y bajas lógicas
+mediante 'activo'), con sentencias de múltiples filas dentro de una única transacción: si algo
+falla, el catálogo queda como estaba. Los cambios de precio renuevan su vigencia en el historial.
+"""
+import csv
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+from models.repository import ProductoRepository, VendedorRepository
+
+logger = logging.getLogger('sincronizacion_catalogo')
+
+# Columnas de cada catálogo (además de 'codigo') y las que no pueden faltar en el archivo
+CATALOGOS = {
+    'productos': {
+        'campos': ('nombre', 'descripcion', 'precio_kg'),
+        'obligatorios': ('nombre',),
+        'repositorio': ProductoRepository,
+    },
+    'vendedores': {
+        'campos': ('nombre', 'apellido', 'documento', 'telefono'),
+        'obligatorios': ('nombre', 'apellido'),
+        'repositorio': VendedorRepository,
+    },
+}
+
+# Filas por sentencia de múltiples filas
+TAMANO_LOTE = 1000
+
+# Fracción máxima del catálogo activo que se da de baja sin forzar (protege de archivos truncados)
+FRACCION_MAXIMA_BAJAS = 0.5
+
+def normalizar_texto(valor):
+    """Quita espacios a los costados; el texto vacío se considera ausente (None)"""
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+def normalizar_precio(valor):
+    """Convierte un precio (admite coma decimal) a Decimal con dos decimales, o None si está vacío"""
+    if isinstance(valor, Decimal):
+        return valor.quantize(Decimal('0.01'))
+    valor = normalizar_texto(valor)
+    if valor is None:
+        return None
+    precio = Decimal(valor.replace(',', '.')).quantize(Decimal('0.01'))
+    if precio < 0:
+        raise ValueError("precio negativo")
+    return precio
+
+def normalizar(catalogo, registro):
+    """Retorna la tupla de campos comparables de un registro (del archivo o de la base)"""
+    valores = []
+    for campo in CATALOGOS[catalogo]['campos']:
+        if campo == 'precio_kg':
+            valores.append(normalizar_precio(registro.get(campo)))
+        else:
+            valores.append(normalizar_texto(registro.get(campo)))
+    return tuple(valores)
+
+def leer_catalogo(ruta, catalogo):
+    """Lee el CSV fila a fila y produce (numero_linea, codigo, fila, motivo_rechazo)
+
+    El delimitador (coma, punto y coma o tabulación) se detecta a partir del comienzo del archivo.
+    Las columnas opcionales que el archivo no trae conservan el valor actual del catálogo.
+    """
+    obligatorios = CATALOGOS[catalogo]['obligatorios']
+    with open(ruta, 'r', encoding='utf-8-sig', newline='') as archivo:
+        muestra = archivo.read(4096)
+        archivo.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.DictReader(archivo, dialect=dialecto)
+        lector.fieldnames = [normalizar_texto(c).lower() for c in lector.fieldnames or []]
+
+        faltantes = [c for c in ('codigo',) + obligatorios if c not in lector.fieldnames]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en {ruta}: {', '.join(faltantes)}")
+
+        for fila in lector:
+            linea = lector.line_num
+            codigo = normalizar_texto(fila.get('codigo'))
+            if not codigo:
+                yield linea, None, fila, "sin código"
+                continue
+            vacios = [c for c in obligatorios if not normalizar_texto(fila.get(c))]
+            if vacios:
+                yield linea, codigo, fila, f"{codigo}: falta {', '.join(vacios)}"
+                continue
+            yield linea, codigo, fila, None
+
+class SincronizacionCatalogo:
+    """Compara un archivo con el catálogo actual y aplica solo las diferencias"""
+
+    def __init__(self, catalogo='productos', tamano_lote=TAMANO_LOTE):
+        if catalogo not in CATALOGOS:
+            raise ValueError(f"Catálogo desconocido: {catalogo}")
+        self.catalogo = catalogo
+        self.campos = CATALOGOS[catalogo]['campos']
+        self.repositorio = CATALOGOS[catalogo]['repositorio']()
+        self.tamano_lote = tamano_lote
+
+    def sincronizar(self, ruta, desactivar_ausentes=True, simular=False, forzar=False):
+        """Sincroniza el catálogo con el archivo y retorna un reporte de los cambios
+
+        Con desactivar_ausentes los registros activos que no figuran en el archivo se dan de
+        baja (más de la mitad del catálogo solo con forzar); con simular se calcula el reporte
+        sin escribir en la base.
+        """
+        inicio = time.perf_counter()
+        actuales = {
+            r['codigo']: (normalizar(self.catalogo, r), bool(r['activo']))
+            for r in self.repositorio.get_catalogo_completo()
+        }
+
+        reporte = {
+            'catalogo': self.catalogo, 'archivo': ruta, 'simulado': simular,
+            'leidos': 0, 'sin_cambios': 0,
+            'altas': [], 'modificados': [], 'reactivados': [], 'bajas': [], 'cambios_precio': [],
+            'rechazados': [], 'duplicados': [],
+        }
+        entrantes = {}
+        # Códigos presentes en el archivo, aunque su fila se rechace: no se dan de baja
+        vistos = set()
+        for linea, codigo, fila, motivo in leer_catalogo(ruta, self.catalogo):
+            reporte['leidos'] += 1
+            if codigo is not None:
+                if codigo in vistos:
+                    reporte['duplicados'].append((linea, codigo))
+                vistos.add(codigo)
+            if motivo is None:
+                try:
+                    entrantes[codigo] = self._valores(fila, actuales.get(codigo))
+                    continue
+                except InvalidOperation:
+                    motivo = f"{codigo}: precio_kg no válido"
+                except ValueError as e:
+                    motivo = f"{codigo}: valor no válido ({e})"
+            reporte['rechazados'].append((linea, motivo))
+            entrantes.pop(codigo, None)
+
+        filas = []
+        for codigo, valores in entrantes.items():
+            actual = actuales.get(codigo)
+            if actual is None:
+                reporte['altas'].append(codigo)
+            elif not actual[1]:
+                reporte['reactivados'].append(codigo)
+            elif actual[0] != valores:
+                reporte['modificados'].append(codigo)
+            else:
+                reporte['sin_cambios'] += 1
+                continue
+            filas.append((codigo,) + valores)
+            if 'precio_kg' in self.campos:
+                precio = valores[self.campos.index('precio_kg')]
+                if actual is None or actual[0][self.campos.index('precio_kg')] != precio:
+                    reporte['cambios_precio'].append((codigo, precio))
+
+        if desactivar_ausentes:
+            reporte['bajas'] = [c for c, (_, activo) in actuales.items() if activo and c not in vistos]
+            activos = sum(1 for _, activo in actuales.values() if activo)
+            if not simular and not forzar and len(reporte['bajas']) > activos * FRACCION_MAXIMA_BAJAS:
+                raise ValueError(
+                    f"El archivo daría de baja {len(reporte['bajas'])} de {activos} {self.catalogo} activos; "
+                    "verifique que esté completo o fuerce la sincronización"
+                )
+
+        if not simular and (filas or reporte['bajas']):
+            if 'precio_kg' in self.campos:
+                self.repositorio.sincronizar(filas, reporte['bajas'], reporte['cambios_precio'], self.tamano_lote)
+            else:
+                self.repositorio.sincronizar(filas, reporte['bajas'], self.tamano_lote)
+
+        reporte['segundos'] = round(time.perf_counter() - inicio, 3)
+        logger.info(
+            "Sincronización de %s desde %s%s: %s altas, %s modificados, %s reactivados, %s bajas, "
+            "%s sin cambios, %s rechazados (%.3f s)",
+            self.catalogo, ruta, " (simulada)" if simular else "", len(reporte['altas']),
+            len(reporte['modificados']), len(reporte['reactivados']), len(reporte['bajas']),
+            reporte['sin_cambios'], len(reporte['rechazados']), reporte['segundos']
+        )
+        return reporte
+
+    def _valores(self, fila, actual):
+        """Valores normalizados de una fila; las columnas ausentes del archivo toman el valor actual"""
+        valores = normalizar(self.catalogo, fila)
+        if actual is None:
+            return valores
+        return tuple(
+            valor if campo in fila else previo
+            for campo, valor, previo in zip(self.campos, valores, actual[0])
+        )
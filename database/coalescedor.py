@@ -0,0 +1,186 @@
+"""
+Agrupación de inserciones concurrentes en un solo commit (group commit)
+
+Las filas enviadas por distintos hilos dentro de una ventana breve (o hasta completar un máximo
+de filas) se escriben en una misma transacción con un único commit, en una conexión propia del
+hilo escritor. Cada fila es un INSERT propio, de modo que su ID es el que informa MySQL y no
+depende de que el lote reciba IDs consecutivos (con innodb_autoinc_lock_mode = 2 no se garantiza).
+Cada llamador recibe el ID generado para su fila o su propio error: si el lote falla, las filas
+se reintentan de a una para aislar a la que lo provocó.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import mysql.connector
+from mysql.connector import Error
+from config.db_config import get_db_config
+from herramientas.metricas import RegistroMetricas
+
+logger = logging.getLogger('coalescedor')
+
+# Métricas de la agrupación de inserciones
+_pendientes = RegistroMetricas().medidor('carni_escrituras_pendientes', "Filas en espera de la próxima escritura agrupada")
+_commits = RegistroMetricas().contador('carni_escrituras_agrupadas_commits_total', "Commits de escrituras agrupadas")
+_filas = RegistroMetricas().contador('carni_escrituras_agrupadas_filas_total', "Filas escritas mediante escrituras agrupadas")
+_errores = RegistroMetricas().contador('carni_db_errores_total', "Errores de MySQL (conexión, consultas y transacciones)")
+
+# Marca de fin para el hilo escritor
+_FIN = object()
+
+class CoalescedorEscrituras:
+    """Agrupa inserciones en una tabla y las confirma en lotes desde un hilo escritor"""
+
+    def __init__(self, tabla, columnas, ventana_ms=2, max_filas=200, al_confirmar=None):
+        self.tabla = tabla
+        self.columnas = tuple(columnas)
+        self.ventana = ventana_ms / 1000
+        self.max_filas = max_filas
+        # Se llama tras cada commit (p. ej. para marcar la última escritura del conector)
+        self.al_confirmar = al_confirmar
+
+        marcadores = ", ".join(["%s"] * len(self.columnas))
+        self._query = f"INSERT INTO {tabla} ({', '.join(self.columnas)}) VALUES ({marcadores})"
+        self._pendientes = queue.SimpleQueue()
+        self._connection = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+        # Contadores para comparar commits con filas escritas
+        self.filas_escritas = 0
+        self.commits = 0
+        _pendientes.observar(self._pendientes.qsize)
+
+    def enviar(self, fila):
+        """Encola una fila y retorna un Future con el ID que se le asigne"""
+        futuro = Future()
+        self._iniciar()
+        self._pendientes.put((tuple(fila), futuro))
+        return futuro
+
+    def insertar(self, fila):
+        """Inserta una fila esperando su commit; retorna su ID o lanza el error de esa fila"""
+        return self.enviar(fila).result()
+
+    def detener(self, espera=5):
+        """Escribe las filas pendientes y detiene el hilo escritor"""
+        with self._lock:
+            hilo = self._hilo
+            self._hilo = None
+        if hilo is None:
+            return
+        self._pendientes.put(_FIN)
+        hilo.join(espera)
+
+    def _iniciar(self):
+        """Arranca el hilo escritor la primera vez que se envía una fila"""
+        if self._hilo is not None:
+            return
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escribir, name=f'coalescedor-{self.tabla}', daemon=True)
+                self._hilo.start()
+
+    def _escribir(self):
+        """Bucle del hilo escritor: junta filas durante la ventana y las confirma juntas"""
+        while True:
+            primero = self._pendientes.get()
+            if primero is _FIN:
+                break
+
+            lote = [primero]
+            limite = time.monotonic() + self.ventana
+            fin = False
+            while len(lote) < self.max_filas:
+                # Tomar sin esperar lo que ya está encolado; esperar solo dentro de la ventana
+                restante = limite - time.monotonic()
+                try:
+                    elemento = self._pendientes.get(timeout=restante) if restante > 0 else self._pendientes.get_nowait()
+                except queue.Empty:
+                    break
+                if elemento is _FIN:
+                    fin = True
+                    break
+                lote.append(elemento)
+
+            self._escribir_lote(lote)
+            if fin:
+                break
+        self._cerrar_conexion()
+
+    def _conectar(self):
+        """Retorna la conexión propia del hilo escritor, reabriéndola si se cayó"""
+        if self._connection is not None and self._connection.is_connected():
+            return self._connection
+
+        config = get_db_config()
+        self._connection = mysql.connector.connect(
+            host=config['host'],
+            port=config['port'],
+            user=config['user'],
+            password=config['password'],
+            database=config['database'],
+            charset=config['charset']
+        )
+        return self._connection
+
+    def _cerrar_conexion(self):
+        """Cierra la conexión del hilo escritor"""
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Error:
+                pass
+            self._connection = None
+
+    def _escribir_lote(self, lote):
+        """Inserta el lote en una transacción; si falla, reintenta cada fila por separado"""
+        try:
+            ids = self._insertar([fila for fila, _ in lote])
+        except Exception as e:
+            if len(lote) == 1:
+                lote[0][1].set_exception(e)
+                return
+            logger.warning("Falló la inserción agrupada de %s filas, se reintentan de a una: %s", len(lote), e)
+            for fila, futuro in lote:
+                try:
+                    futuro.set_result(self._insertar([fila])[0])
+                except Exception as e_fila:
+                    futuro.set_exception(e_fila)
+            return
+
+        for (_, futuro), pesaje_id in zip(lote, ids):
+            futuro.set_result(pesaje_id)
+
+    def _insertar(self, filas):
+        """Inserta las filas con un INSERT cada una y un único commit; retorna sus IDs en orden
+
+        El ahorro de la agrupación está en el commit (una sola escritura del registro de
+        transacciones); las sentencias de una fila viajan por la misma conexión ya abierta.
+        """
+        connection = self._conectar()
+        cursor = connection.cursor()
+        ids = []
+        try:
+            for fila in filas:
+                cursor.execute(self._query, fila)
+                ids.append(cursor.lastrowid)
+            connection.commit()
+        except Error:
+            _errores.incrementar()
+            try:
+                connection.rollback()
+            except Error:
+                pass
+            raise
+        finally:
+            cursor.close()
+
+        self.commits += 1
+        self.filas_escritas += len(filas)
+        _commits.incrementar()
+        _filas.incrementar(len(filas))
+        if self.al_confirmar is not None:
+            self.al_confirmar()
+        return ids
@@ -2,17 +2,24 @@
 Módulo para gestionar la conexión a la base de datos MySQL
 """
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error
 import logging
-from config.db_config import get_db_config
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from config.db_config import get_db_config, get_replicas_config, get_replica_max_lag
+from config.logging_config import get_logging_config
+from herramientas.metricas import RegistroMetricas
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('db_connector')
 
+# Métricas de la base de datos
+_errores = RegistroMetricas().contador('carni_db_errores_total', "Errores de MySQL (conexión, consultas y transacciones)")
+_reconexiones = RegistroMetricas().contador('carni_db_reconexiones_total', "Reconexiones a la primaria tras perder la conexión")
+_duracion_consultas = RegistroMetricas().histograma('carni_db_consulta_segundos', "Duración de las consultas a MySQL")
+
 class DatabaseConnector:
     """Clase para gestionar la conexión a la base de datos MySQL"""
     
@@ -23,12 +30,29 @@ class DatabaseConnector:
         if cls._instance is None:
             cls._instance = super(DatabaseConnector, cls).__new__(cls)
             cls._instance._connection = None
+            cls._instance._replicas = {}
+            cls._instance._retraso_replicas = {}
+            cls._instance._siguiente_replica = 0
+            cls._instance._ultima_escritura = None
+            cls._instance._pools = {}
+            # Conexión asignada al hilo actual por conexion_cancelable (si la hay)
+            cls._instance._local = threading.local()
+            # Conexiones para KILL QUERY, una por servidor (None es la primaria)
+            cls._instance._conexiones_control = {}
+            cls._instance._lock_control = threading.Lock()
+            cls._instance._lock_pools = threading.Lock()
+            # Diferencia entre el reloj de la primaria y el local, y cuándo se midió
+            cls._instance._diferencia_reloj = None
+            cls._instance._medicion_reloj = 0.0
+            cls._instance._lock_reloj = threading.Lock()
         return cls._instance
     
     def connect(self):
         """Establece la conexión con la base de datos MySQL"""
         if self._connection is not None and self._connection.is_connected():
             return self._connection
+        if self._connection is not None:
+            _reconexiones.incrementar()
         
         try:
             # Obtener configuración actual
@@ -49,7 +73,8 @@ class DatabaseConnector:
                 return self._connection
             
         except Error as e:
-            logger.error(f"Error al conectar a MySQL: {e}")
+            _errores.incrementar()
+            logger.error("Error al conectar a MySQL: %s", e)
             self._connection = None
             raise
     
@@ -59,11 +84,267 @@ class DatabaseConnector:
             self._connection.close()
             logger.info("Conexión a MySQL cerrada")
             self._connection = None
+        
+        for indice in list(self._replicas):
+            self._descartar_replica(indice)
+        
+        with self._lock_control:
+            for conexion_control in self._conexiones_control.values():
+                try:
+                    conexion_control.close()
+                except Error:
+                    pass
+            self._conexiones_control.clear()
+    
+    # Segundos durante los que se reutiliza la última medición del retraso de una réplica
+    INTERVALO_MEDICION_RETRASO = 2.0
+    
+    def _conectar_replica(self, indice, config):
+        """Retorna la conexión abierta a una réplica, creándola si hace falta"""
+        connection = self._replicas.get(indice)
+        if connection is not None and connection.is_connected():
+            return connection
+        
+        connection = mysql.connector.connect(
+            host=config['host'],
+            port=config['port'],
+            user=config['user'],
+            password=config['password'],
+            database=config['database'],
+            charset=config['charset'],
+            autocommit=True
+        )
+        self._replicas[indice] = connection
+        logger.info("Conexión a réplica %s:%s establecida", config['host'], config['port'])
+        return connection
+    
+    def _descartar_replica(self, indice):
+        """Cierra y olvida la conexión a una réplica"""
+        connection = self._replicas.pop(indice, None)
+        self._retraso_replicas.pop(indice, None)
+        if connection is not None:
+            try:
+                connection.close()
+            except Error:
+                pass
+    
+    def _retraso_replica(self, indice, connection):
+        """Retraso de replicación en segundos (None si la replicación está detenida)"""
+        medicion = self._retraso_replicas.get(indice)
+        if medicion is not None and time.monotonic() - medicion[1] < self.INTERVALO_MEDICION_RETRASO:
+            return medicion[0]
+        
+        cursor = connection.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Error:
+                # Servidores anteriores a MySQL 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+            estado = cursor.fetchone()
+        finally:
+            cursor.close()
+        
+        retraso = None
+        if estado:
+            retraso = estado.get('Seconds_Behind_Source', estado.get('Seconds_Behind_Master'))
+        self._retraso_replicas[indice] = (retraso, time.monotonic())
+        return retraso
+    
+    def _escritura_reciente(self):
+        """Indica si este proceso escribió dentro del retraso máximo tolerado (leer de la primaria)"""
+        return self._ultima_escritura is not None and time.monotonic() - self._ultima_escritura < get_replica_max_lag()
+    
+    def connect_lectura(self):
+        """Retorna una conexión para lecturas analíticas: una réplica al día o, si no hay, la primaria
+        
+        Tras una escritura desde este proceso las lecturas siguen yendo a la primaria durante
+        el retraso máximo tolerado, para que cada operador vea sus propios registros.
+        """
+        replicas = get_replicas_config()
+        max_lag = get_replica_max_lag()
+        
+        if not replicas or self._escritura_reciente():
+            return self.connect()
+        
+        # Recorrer las réplicas en turno rotativo, saltando las caídas o atrasadas
+        for paso in range(len(replicas)):
+            indice = (self._siguiente_replica + paso) % len(replicas)
+            try:
+                connection = self._conectar_replica(indice, replicas[indice])
+                retraso = self._retraso_replica(indice, connection)
+            except Error as e:
+                logger.warning("Réplica %s no disponible: %s", replicas[indice]['host'], e)
+                self._descartar_replica(indice)
+                continue
+            
+            if retraso is not None and retraso <= max_lag:
+                self._siguiente_replica = indice + 1
+                return connection
+            logger.warning("Réplica %s con retraso %ss; se omite", replicas[indice]['host'], retraso)
+        
+        return self.connect()
+    
+    def pool_lectura(self, tamano, destino=None, nombre='lectura'):
+        """Pool de conexiones para lecturas concurrentes en un servidor: la réplica de índice destino o la primaria (None)
+        
+        Cada uso (nombre) tiene sus propios pools, para que unos no agoten las conexiones de otros.
+        """
+        clave = (nombre, tamano, destino)
+        with self._lock_pools:
+            pool = self._pools.get(clave)
+            if pool is not None:
+                return pool
+            
+            config = get_db_config() if destino is None else get_replicas_config()[destino]
+            pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name=f"{nombre}_{tamano}_{'primaria' if destino is None else destino}",
+                pool_size=tamano,
+                host=config['host'],
+                port=config['port'],
+                user=config['user'],
+                password=config['password'],
+                database=config['database'],
+                charset=config['charset']
+            )
+            self._pools[clave] = pool
+        logger.info("Pool de lectura %s de %s conexiones creado en %s", nombre, tamano, config['host'])
+        return pool
+    
+    def conexion_lectura(self, tamano, nombre='lectura'):
+        """Toma una conexión de pool para lecturas con las reglas de connect_lectura; retorna (conexion, destino)
+        
+        Se usa una réplica solo si su retraso (medido en la misma conexión) no supera el máximo
+        tolerado y este proceso no escribió hace poco; si no, una conexión a la primaria.
+        """
+        replicas = get_replicas_config()
+        max_lag = get_replica_max_lag()
+        
+        if replicas and not self._escritura_reciente():
+            for paso in range(len(replicas)):
+                indice = (self._siguiente_replica + paso) % len(replicas)
+                connection = None
+                try:
+                    connection = self.pool_lectura(tamano, indice, nombre).get_connection()
+                    retraso = self._retraso_replica(indice, connection)
+                except Error as e:
+                    logger.warning("Réplica %s no disponible: %s", replicas[indice]['host'], e)
+                    if connection is not None:
+                        connection.close()
+                    continue
+                
+                if retraso is not None and retraso <= max_lag:
+                    self._siguiente_replica = indice + 1
+                    return connection, indice
+                connection.close()
+                logger.warning("Réplica %s con retraso %ss; se omite", replicas[indice]['host'], retraso)
+        
+        return self.pool_lectura(tamano, None, nombre).get_connection(), None
+    
+    # Conexiones del pool de lecturas de catálogos con versión (instantánea de precios e índices de búsqueda)
+    TAMANO_POOL_CATALOGO = 3
+    
+    def leer_con_version(self, tabla, query=None, params=None):
+        """Lee la versión del catálogo de la tabla (versiones_catalogo) y, si se indica, las filas de la consulta
+        
+        Ambas lecturas se hacen en una misma transacción de una conexión de pool (con las reglas
+        de conexion_lectura), de modo que las filas corresponden a la versión leída y nunca a una
+        instantánea vieja de la conexión principal. Retorna (version, filas); version es None si
+        la tabla de versiones no está creada.
+        """
+        connection, _ = self.conexion_lectura(self.TAMANO_POOL_CATALOGO, 'catalogo')
+        try:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute("SELECT version FROM versiones_catalogo WHERE tabla = %s", (tabla,))
+                fila = cursor.fetchone()
+                filas = None
+                if query is not None:
+                    cursor.execute(query, params or ())
+                    filas = cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            connection.close()  # devuelve la conexión al pool
+        return (fila['version'] if fila else None), filas
+    
+    # Conexiones mínimas del pool reservado para cargas cancelables (historial, estadísticas);
+    # CargaCancelable lo agranda a una conexión por instancia cuando hay varias estaciones
+    TAMANO_POOL_CANCELABLE = 4
+    
+    @contextmanager
+    def conexion_cancelable(self, tamano=TAMANO_POOL_CANCELABLE, nombre='cancelable'):
+        """Asigna al hilo actual una conexión propia para sus lecturas con replica=True
+        
+        Entrega (destino, ID de la conexión en el servidor), con el que cancelar_consulta puede
+        interrumpir la consulta en curso desde otro hilo.
+        """
+        connection, destino = self.conexion_lectura(tamano, nombre)
+        self._local.connection = connection
+        try:
+            yield destino, connection.connection_id
+        finally:
+            self._local.connection = None
+            connection.close()  # devuelve la conexión al pool
     
-    def execute_query(self, query, params=None, fetchall=True):
-        """Ejecuta una consulta SQL y retorna los resultados"""
+    # Segundos máximos para abrir la conexión de control de cancelar_consulta
+    TIEMPO_CONEXION_CONTROL = 3
+    
+    def cancelar_consulta(self, conexion):
+        """Interrumpe la consulta en curso de una conexión (destino, ID) con KILL QUERY desde una conexión aparte al mismo servidor"""
+        destino, connection_id = conexion
+        with self._lock_control:
+            try:
+                conexion_control = self._conexiones_control.get(destino)
+                if conexion_control is None or not conexion_control.is_connected():
+                    config = get_db_config() if destino is None else get_replicas_config()[destino]
+                    conexion_control = mysql.connector.connect(
+                        host=config['host'],
+                        port=config['port'],
+                        user=config['user'],
+                        password=config['password'],
+                        database=config['database'],
+                        charset=config['charset'],
+                        autocommit=True,
+                        connection_timeout=self.TIEMPO_CONEXION_CONTROL
+                    )
+                    self._conexiones_control[destino] = conexion_control
+                cursor = conexion_control.cursor()
+                try:
+                    cursor.execute(f"KILL QUERY {int(connection_id)}")
+                finally:
+                    cursor.close()
+                return True
+            except Error as e:
+                # La consulta pudo haber terminado entre tanto (error 1094: hilo desconocido)
+                logger.warning("No se pudo cancelar la consulta de la conexión %s: %s", connection_id, e)
+                return False
+    
+    def execute_query(self, query, params=None, fetchall=True, replica=False):
+        """Ejecuta una consulta SQL y retorna los resultados
+        
+        Con replica=True las lecturas pueden resolverse en una réplica de solo lectura, o
+        en la conexión cancelable asignada al hilo actual.
+        """
+        es_lectura = query.strip().upper().startswith(('SELECT', 'SHOW'))
+        if replica and es_lectura:
+            connection = getattr(self._local, 'connection', None)
+            if connection is not None:
+                return self._ejecutar_lectura(connection, query, params, fetchall)
+            connection = self.connect_lectura()
+            if connection is not self._connection:
+                try:
+                    return self._ejecutar_lectura(connection, query, params, fetchall)
+                except Error as e:
+                    _errores.incrementar()
+                    logger.warning("Error al leer de la réplica, se usa la primaria: %s", e)
+                    for indice, conexion_replica in list(self._replicas.items()):
+                        if conexion_replica is connection:
+                            self._descartar_replica(indice)
+        
         connection = self.connect()
         cursor = connection.cursor(dictionary=True)
+        inicio = time.perf_counter()
         
         try:
             cursor.execute(query, params or ())
@@ -75,15 +356,66 @@ class DatabaseConnector:
                     return cursor.fetchone()
             else:
                 connection.commit()
+                self._ultima_escritura = time.monotonic()
                 return cursor.lastrowid
                 
         except Error as e:
-            logger.error(f"Error al ejecutar consulta: {e}")
+            _errores.incrementar()
+            logger.error("Error al ejecutar consulta: %s", e)
             if not query.strip().upper().startswith(('SELECT', 'SHOW')):
                 connection.rollback()
             raise
         finally:
             cursor.close()
+            self._registrar_si_lenta(query, inicio)
+    
+    # Segundos durante los que se reutiliza la diferencia medida con el reloj de la primaria
+    VIGENCIA_RELOJ_SERVIDOR = 600
+    
+    def hora_servidor(self):
+        """Retorna la hora actual según el reloj de la primaria, sin fracción de segundo
+        
+        La diferencia con el reloj local se mide con SELECT NOW(6) y se reutiliza durante
+        VIGENCIA_RELOJ_SERVIDOR segundos: todas las estaciones fechan con el reloj del servidor
+        (el de CURRENT_TIMESTAMP y CURDATE()) sin una consulta por registro.
+        """
+        with self._lock_reloj:
+            if self._diferencia_reloj is None or time.monotonic() - self._medicion_reloj >= self.VIGENCIA_RELOJ_SERVIDOR:
+                antes = datetime.now()
+                fila = self.execute_query("SELECT NOW(6) AS ahora", fetchall=False)
+                despues = datetime.now()
+                # Se toma el punto medio de la consulta como instante de la lectura
+                self._diferencia_reloj = fila['ahora'] - (antes + (despues - antes) / 2)
+                self._medicion_reloj = time.monotonic()
+                logger.debug("Diferencia con el reloj de la primaria: %.3f s", self._diferencia_reloj.total_seconds())
+            diferencia = self._diferencia_reloj
+        return (datetime.now() + diferencia).replace(microsecond=0)
+    
+    def registrar_escritura(self):
+        """Marca una escritura confirmada fuera de este conector (p. ej. por el coalescedor)"""
+        self._ultima_escritura = time.monotonic()
+    
+    def _registrar_si_lenta(self, query, inicio):
+        """Registra la duración de la consulta y, si supera el umbral de consulta lenta, una advertencia"""
+        duracion = time.perf_counter() - inicio
+        _duracion_consultas.observar(duracion)
+        duracion_ms = duracion * 1000
+        if duracion_ms >= get_logging_config()['consulta_lenta_ms']:
+            logger.warning(
+                "Consulta lenta: %s", ' '.join(query.split())[:200],
+                extra={'duracion_ms': round(duracion_ms, 3)}
+            )
+    
+    def _ejecutar_lectura(self, connection, query, params, fetchall):
+        """Ejecuta una lectura sobre una conexión dada"""
+        cursor = connection.cursor(dictionary=True)
+        inicio = time.perf_counter()
+        try:
+            cursor.execute(query, params or ())
+            return cursor.fetchall() if fetchall else cursor.fetchone()
+        finally:
+            cursor.close()
+            self._registrar_si_lenta(query, inicio)
     
     def execute_many(self, query, params_list):
         """Ejecuta una consulta SQL múltiples veces con diferentes parámetros"""
@@ -93,9 +425,33 @@ class DatabaseConnector:
         try:
             cursor.executemany(query, params_list)
             connection.commit()
+            self._ultima_escritura = time.monotonic()
             return cursor.lastrowid
         except Error as e:
-            logger.error(f"Error al ejecutar consulta múltiple: {e}")
+            _errores.incrementar()
+            logger.error("Error al ejecutar consulta múltiple: %s", e)
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    @contextmanager
+    def transaction(self):
+        """Abre una transacción y entrega un cursor; confirma al salir o revierte si hay error"""
+        connection = self.connect()
+        cursor = connection.cursor(dictionary=True)
+        
+        try:
+            # La conexión trabaja sin autocommit: todas las sentencias quedan en la misma transacción
+            yield cursor
+            connection.commit()
+            self._ultima_escritura = time.monotonic()
+        except Error as e:
+            _errores.incrementar()
+            logger.error("Error en la transacción: %s", e)
+            connection.rollback()
+            raise
+        except Exception:
             connection.rollback()
             raise
         finally:
@@ -4,11 +4,6 @@ Script para crear la estructura de tablas en la base de datos MySQL
 import logging
 from database.db_connector import DatabaseConnector
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('db_schema')
 
 # SQL para crear la tabla de productos
@@ -59,6 +54,204 @@ CREATE TABLE IF NOT EXISTS pesajes (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 """
 
+# SQL para crear la tabla de historial de precios (vigencia [vigente_desde, vigente_hasta))
+CREATE_PRECIOS_HISTORIAL_TABLE = """
+CREATE TABLE IF NOT EXISTS precios_historial (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    codigo_producto VARCHAR(20) NOT NULL,
+    precio_kg DECIMAL(10, 2),
+    vigente_desde DATETIME NOT NULL,
+    vigente_hasta DATETIME NULL,
+    FOREIGN KEY (codigo_producto) REFERENCES productos(codigo) ON DELETE RESTRICT,
+    INDEX idx_producto_vigencia (codigo_producto, vigente_desde, vigente_hasta),
+    INDEX idx_vigente_desde (vigente_desde)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+# SQL para crear la tabla de series de kilos por vendedor y producto en intervalos de hora, día y
+# semana (lunes); codigo_producto '' acumula todos los productos del vendedor
+CREATE_SERIES_KILOS_TABLE = """
+CREATE TABLE IF NOT EXISTS series_kilos (
+    resolucion ENUM('hora', 'dia', 'semana') NOT NULL,
+    codigo_vendedor VARCHAR(20) NOT NULL,
+    codigo_producto VARCHAR(20) NOT NULL,
+    inicio DATETIME NOT NULL,
+    kilos DECIMAL(14, 3) NOT NULL DEFAULT 0,
+    pesajes INT NOT NULL DEFAULT 0,
+    importe DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (resolucion, codigo_producto, codigo_vendedor, inicio),
+    INDEX idx_resolucion_inicio (resolucion, codigo_producto, inicio)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+# Cuerpo de los triggers que mantienen series_kilos al insertar o borrar pesajes ({fila} es NEW u
+# OLD y {signo} el sentido del ajuste). Las cargas masivas pueden diferirlo con @series_diferidas
+# y reconstruir luego el rango (models/series_kilos.py)
+_CUERPO_TRIGGER_SERIES = """
+BEGIN
+    IF @series_diferidas IS NULL THEN
+        INSERT INTO series_kilos (resolucion, codigo_vendedor, codigo_producto, inicio, kilos, pesajes, importe)
+        SELECT r.resolucion, {fila}.codigo_vendedor, c.codigo_producto,
+               CASE r.resolucion
+                   WHEN 'hora' THEN TIMESTAMP(DATE({fila}.fecha_hora), MAKETIME(HOUR({fila}.fecha_hora), 0, 0))
+                   WHEN 'dia' THEN TIMESTAMP(DATE({fila}.fecha_hora))
+                   ELSE TIMESTAMP(DATE({fila}.fecha_hora) - INTERVAL WEEKDAY({fila}.fecha_hora) DAY)
+               END,
+               {signo}{fila}.peso, {signo}1, {signo}IFNULL({fila}.peso * {fila}.precio_kg, 0)
+        FROM (SELECT 'hora' AS resolucion UNION ALL SELECT 'dia' UNION ALL SELECT 'semana') r
+            CROSS JOIN (SELECT {fila}.codigo_producto AS codigo_producto UNION ALL SELECT '') c
+        ON DUPLICATE KEY UPDATE
+            kilos = kilos + VALUES(kilos), pesajes = pesajes + VALUES(pesajes), importe = importe + VALUES(importe);
+    END IF;
+END
+"""
+
+CREATE_TRIGGERS_SERIES_KILOS = (
+    "DROP TRIGGER IF EXISTS series_kilos_alta",
+    "CREATE TRIGGER series_kilos_alta AFTER INSERT ON pesajes FOR EACH ROW"
+    + _CUERPO_TRIGGER_SERIES.format(fila='NEW', signo=''),
+    "DROP TRIGGER IF EXISTS series_kilos_baja",
+    "CREATE TRIGGER series_kilos_baja AFTER DELETE ON pesajes FOR EACH ROW"
+    + _CUERPO_TRIGGER_SERIES.format(fila='OLD', signo='-'),
+)
+
+# SQL para crear las tablas de bocetos diarios (HyperLogLog y t-digest, ver models/bocetos.py) y
+# de los días ya construidos; un día sin fila en bocetos_dias se reconstruye al consultarlo
+CREATE_BOCETOS_DIARIOS_TABLE = """
+CREATE TABLE IF NOT EXISTS bocetos_diarios (
+    dia DATE NOT NULL,
+    dimension ENUM('vendedor', 'producto') NOT NULL,
+    codigo VARCHAR(20) NOT NULL,
+    pesajes INT NOT NULL,
+    kilos DECIMAL(14, 3) NOT NULL,
+    distintos BLOB NOT NULL,
+    pesos BLOB NOT NULL,
+    PRIMARY KEY (dimension, dia, codigo),
+    INDEX idx_dia (dia)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+CREATE_BOCETOS_DIAS_TABLE = """
+CREATE TABLE IF NOT EXISTS bocetos_dias (
+    dia DATE PRIMARY KEY,
+    construido TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+# Los bocetos no admiten restar un pesaje: un alta o baja en un día anterior a hoy descarta el
+# boceto de ese día. Con @series_diferidas la carga masiva invalida su rango al terminar
+_CUERPO_TRIGGER_BOCETOS = """
+BEGIN
+    IF @series_diferidas IS NULL AND DATE({fila}.fecha_hora) < CURDATE() THEN
+        DELETE FROM bocetos_dias WHERE dia = DATE({fila}.fecha_hora);
+    END IF;
+END
+"""
+
+CREATE_TRIGGERS_BOCETOS = (
+    "DROP TRIGGER IF EXISTS bocetos_alta",
+    "CREATE TRIGGER bocetos_alta AFTER INSERT ON pesajes FOR EACH ROW"
+    + _CUERPO_TRIGGER_BOCETOS.format(fila='NEW'),
+    "DROP TRIGGER IF EXISTS bocetos_baja",
+    "CREATE TRIGGER bocetos_baja AFTER DELETE ON pesajes FOR EACH ROW"
+    + _CUERPO_TRIGGER_BOCETOS.format(fila='OLD'),
+)
+
+# SQL para crear la bandeja de salida (outbox) de cambios para sistemas externos; cada fila se
+# escribe por trigger en la misma transacción que el cambio que describe
+CREATE_OUTBOX_TABLE = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    tabla VARCHAR(30) NOT NULL,
+    operacion ENUM('alta', 'modificacion', 'baja') NOT NULL,
+    clave VARCHAR(20) NOT NULL,
+    datos JSON NOT NULL,
+    fecha DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    INDEX idx_fecha (fecha)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+# SQL para crear la tabla de posiciones de los consumidores del outbox
+CREATE_OUTBOX_CONSUMIDORES_TABLE = """
+CREATE TABLE IF NOT EXISTS outbox_consumidores (
+    consumidor VARCHAR(50) PRIMARY KEY,
+    ultimo_id BIGINT NOT NULL DEFAULT 0,
+    huecos TEXT NULL,
+    fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+# Columnas publicadas en el outbox y columna que identifica la fila en cada tabla
+_COLUMNAS_OUTBOX = {
+    'pesajes': ('id', ('id', 'codigo_producto', 'peso', 'codigo_vendedor', 'fecha_hora', 'precio_kg', 'total', 'observaciones')),
+    'productos': ('codigo', ('codigo', 'nombre', 'descripcion', 'precio_kg', 'activo')),
+    'vendedores': ('codigo', ('codigo', 'nombre', 'apellido', 'documento', 'telefono', 'activo')),
+}
+
+def _trigger_outbox(tabla, evento):
+    """Sentencias para (re)crear el trigger que publica en el outbox un evento (INSERT, UPDATE o DELETE) de la tabla
+
+    Las cargas masivas pueden omitir la publicación con @outbox_omitido. Las modificaciones del
+    catálogo que no cambian ninguna columna publicada no se publican; desactivar un registro se
+    publica como baja y reactivarlo como alta.
+    """
+    clave, columnas = _COLUMNAS_OUTBOX[tabla]
+    fila = 'OLD' if evento == 'DELETE' else 'NEW'
+    datos = "JSON_OBJECT(" + ", ".join(f"'{c}', {fila}.{c}" for c in columnas) + ")"
+    condicion = "@outbox_omitido IS NULL"
+    operacion = {'INSERT': "'alta'", 'DELETE': "'baja'"}.get(evento)
+    if evento == 'UPDATE':
+        cambios = " OR ".join(f"NOT (NEW.{c} <=> OLD.{c})" for c in columnas)
+        condicion += f" AND ({cambios})"
+        operacion = "IF(OLD.activo AND NOT NEW.activo, 'baja', IF(NEW.activo AND NOT OLD.activo, 'alta', 'modificacion'))"
+    nombre = f"outbox_{tabla}_{evento.lower()}"
+    return (
+        f"DROP TRIGGER IF EXISTS {nombre}",
+        f"""CREATE TRIGGER {nombre} AFTER {evento} ON {tabla} FOR EACH ROW
+BEGIN
+    IF {condicion} THEN
+        INSERT INTO outbox (tabla, operacion, clave, datos)
+        VALUES ('{tabla}', {operacion}, {fila}.{clave}, {datos});
+    END IF;
+END""",
+    )
+
+CREATE_TRIGGERS_OUTBOX = (
+    _trigger_outbox('pesajes', 'INSERT') + _trigger_outbox('pesajes', 'DELETE')
+    + _trigger_outbox('productos', 'INSERT') + _trigger_outbox('productos', 'UPDATE')
+    + _trigger_outbox('vendedores', 'INSERT') + _trigger_outbox('vendedores', 'UPDATE')
+)
+
+# SQL para crear la tabla de versiones del catálogo: un contador por tabla que los triggers
+# incrementan con cada alta, modificación o baja (también en las cargas masivas), para que cada
+# instancia detecte con una lectura barata que su copia en memoria quedó desactualizada
+CREATE_VERSIONES_CATALOGO_TABLE = """
+CREATE TABLE IF NOT EXISTS versiones_catalogo (
+    tabla VARCHAR(30) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+"""
+
+INSERT_VERSIONES_CATALOGO = """
+INSERT IGNORE INTO versiones_catalogo (tabla, version) VALUES ('productos', 0), ('vendedores', 0);
+"""
+
+def _trigger_version_catalogo(tabla, evento):
+    """Sentencias para (re)crear el trigger que incrementa la versión de la tabla en un evento (INSERT, UPDATE o DELETE)"""
+    nombre = f"version_{tabla}_{evento.lower()}"
+    return (
+        f"DROP TRIGGER IF EXISTS {nombre}",
+        f"""CREATE TRIGGER {nombre} AFTER {evento} ON {tabla} FOR EACH ROW
+    UPDATE versiones_catalogo SET version = version + 1 WHERE tabla = '{tabla}'""",
+    )
+
+CREATE_TRIGGERS_VERSIONES_CATALOGO = (
+    _trigger_version_catalogo('productos', 'INSERT') + _trigger_version_catalogo('productos', 'UPDATE')
+    + _trigger_version_catalogo('productos', 'DELETE')
+    + _trigger_version_catalogo('vendedores', 'INSERT') + _trigger_version_catalogo('vendedores', 'UPDATE')
+    + _trigger_version_catalogo('vendedores', 'DELETE')
+)
+
 # SQL para insertar datos de ejemplo en la tabla de productos
 INSERT_SAMPLE_PRODUCTOS = """
 INSERT IGNORE INTO productos (codigo, nombre, descripcion, precio_kg) VALUES
@@ -79,6 +272,16 @@ INSERT IGNORE INTO vendedores (codigo, nombre, apellido, documento, telefono) VA
     ('V005', 'Luis', 'Hernández', '56789012', '555-567-8901');
 """
 
+# SQL para abrir la vigencia inicial de los productos que aún no tienen historial
+INSERT_PRECIOS_HISTORIAL_INICIAL = """
+INSERT INTO precios_historial (codigo_producto, precio_kg, vigente_desde)
+SELECT p.codigo, p.precio_kg, p.fecha_creacion
+FROM productos p
+WHERE NOT EXISTS (
+    SELECT 1 FROM precios_historial h WHERE h.codigo_producto = p.codigo
+);
+"""
+
 def create_database():
     """Crea la base de datos si no existe"""
     from mysql.connector import connect
@@ -99,14 +302,14 @@ def create_database():
         
         # Crear la base de datos si no existe
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {config['database']} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-        logger.info(f"Base de datos '{config['database']}' creada o verificada correctamente")
+        logger.info("Base de datos '%s' creada o verificada correctamente", config['database'])
         
         # Cerrar conexión
         cursor.close()
         connection.close()
         
     except Exception as e:
-        logger.error(f"Error al crear la base de datos: {e}")
+        logger.error("Error al crear la base de datos: %s", e)
         raise
 
 def initialize_schema():
@@ -128,6 +331,32 @@ def initialize_schema():
         logger.info("Creando tabla de pesajes...")
         db.execute_query(CREATE_PESAJES_TABLE)
         
+        logger.info("Creando tabla de historial de precios...")
+        db.execute_query(CREATE_PRECIOS_HISTORIAL_TABLE)
+        
+        logger.info("Creando tabla y triggers de series de kilos...")
+        db.execute_query(CREATE_SERIES_KILOS_TABLE)
+        for sentencia in CREATE_TRIGGERS_SERIES_KILOS:
+            db.execute_query(sentencia)
+        
+        logger.info("Creando tablas y triggers de bocetos diarios...")
+        db.execute_query(CREATE_BOCETOS_DIARIOS_TABLE)
+        db.execute_query(CREATE_BOCETOS_DIAS_TABLE)
+        for sentencia in CREATE_TRIGGERS_BOCETOS:
+            db.execute_query(sentencia)
+        
+        logger.info("Creando tablas y triggers del outbox de cambios...")
+        db.execute_query(CREATE_OUTBOX_TABLE)
+        db.execute_query(CREATE_OUTBOX_CONSUMIDORES_TABLE)
+        for sentencia in CREATE_TRIGGERS_OUTBOX:
+            db.execute_query(sentencia)
+        
+        logger.info("Creando tabla y triggers de versiones del catálogo...")
+        db.execute_query(CREATE_VERSIONES_CATALOGO_TABLE)
+        db.execute_query(INSERT_VERSIONES_CATALOGO)
+        for sentencia in CREATE_TRIGGERS_VERSIONES_CATALOGO:
+            db.execute_query(sentencia)
+        
         # Insertar datos de ejemplo
         logger.info("Insertando datos de ejemplo en la tabla de productos...")
         db.execute_query(INSERT_SAMPLE_PRODUCTOS)
@@ -135,11 +364,20 @@ def initialize_schema():
         logger.info("Insertando datos de ejemplo en la tabla de vendedores...")
         db.execute_query(INSERT_SAMPLE_VENDEDORES)
         
+        logger.info("Inicializando el historial de precios...")
+        db.execute_query(INSERT_PRECIOS_HISTORIAL_INICIAL)
+        
+        # Completar las series con los pesajes cargados antes de que existieran los triggers
+        if not db.execute_query("SELECT 1 FROM series_kilos LIMIT 1", fetchall=False):
+            logger.info("Reconstruyendo las series de kilos...")
+            from models.series_kilos import SeriesKilos
+            SeriesKilos().reconstruir()
+        
         logger.info("Esquema de base de datos inicializado correctamente")
         return True
     
     except Exception as e:
-        logger.error(f"Error al inicializar el esquema de la base de datos: {e}")
+        logger.error("Error al inicializar el esquema de la base de datos: %s", e)
         return False
 
 if __name__ == "__main__":
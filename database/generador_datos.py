@@ -0,0 +1,404 @@
+"""
+Generador reproducible de datos sintéticos para pruebas de capacidad
+
+Crea un catálogo de productos y vendedores y millones de pesajes con popularidad de
+productos sesgada (Zipf), vendedores que trabajan por turnos, un patrón diario con picos
+al mediodía y a la tarde, y cambios de precio registrados en precios_historial. La misma
+semilla y escala producen siempre los mismos datos (relativos a la fecha final).
+
+Uso:
+    python -m database.generador_datos --escala 1 --semilla 42
+    python -m database.generador_datos --escala 5 --dias 180 --hasta 2025-01-01
+    python -m database.generador_datos --limpiar
+
+Desde código (p. ej. un arnés de pruebas de rendimiento):
+    from database.generador_datos import generar
+    resumen = generar(escala=2, semilla=7)
+
+Los códigos sintéticos usan los prefijos 'ZZSYN-P' (productos) y 'ZZSYN-V' (vendedores), que
+no coinciden con códigos reales, y pueden eliminarse con limpiar(). Para regenerar los datos
+hay que limpiarlos antes: generar() no carga sobre datos sintéticos existentes.
+"""
+import argparse
+import bisect
+import logging
+import math
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from database.db_connector import DatabaseConnector
+from config.logging_config import configurar_logging
+
+logger = logging.getLogger('generador_datos')
+
+# Tamaño del catálogo y volumen diario para escala 1
+PRODUCTOS_POR_ESCALA = 200
+VENDEDORES_POR_ESCALA = 20
+PESAJES_DIARIOS_POR_ESCALA = 10000
+
+# Filas por sentencia INSERT de varias filas
+TAMANO_LOTE = 5000
+
+# Exponente de la distribución de Zipf de la popularidad de productos
+EXPONENTE_ZIPF = 1.1
+
+# Prefijos de los códigos sintéticos
+PREFIJO_PRODUCTO = 'ZZSYN-P'
+PREFIJO_VENDEDOR = 'ZZSYN-V'
+
+# Turnos (hora de inicio, hora de fin) y proporción de vendedores asignados a cada uno
+TURNOS = [((7, 15), 0.45), ((13, 21), 0.45), ((9, 18), 0.10)]
+
+# Peso relativo de cada hora del día en la cantidad de pesajes (picos a las 11-13 y 18-20)
+PATRON_DIARIO = {
+    7: 0.3, 8: 0.6, 9: 0.9, 10: 1.2, 11: 1.6, 12: 1.8, 13: 1.4,
+    14: 0.8, 15: 0.7, 16: 0.8, 17: 1.1, 18: 1.5, 19: 1.6, 20: 1.0
+}
+
+# Factor de volumen por día de la semana (lunes = 0)
+PATRON_SEMANAL = [0.8, 0.85, 0.9, 0.95, 1.15, 1.4, 0.6]
+
+# Días promedio entre cambios de precio de un producto y variación media de cada cambio
+DIAS_ENTRE_CAMBIOS_PRECIO = 30
+VARIACION_PRECIO = (0.03, 0.025)
+
+CORTES = [
+    'Bife de chorizo', 'Lomo', 'Vacío', 'Asado', 'Matambre', 'Entraña', 'Colita de cuadril',
+    'Peceto', 'Nalga', 'Cuadrada', 'Bola de lomo', 'Osobuco', 'Falda', 'Paleta', 'Roast beef',
+    'Carne picada', 'Costilla', 'Bondiola', 'Pechito', 'Pechuga', 'Pata muslo', 'Alitas',
+    'Chorizo', 'Morcilla', 'Milanesa', 'Hamburguesa', 'Riñón', 'Hígado', 'Mollejas', 'Tapa de asado'
+]
+ESPECIES = ['de res', 'de cerdo', 'de pollo', 'de cordero', 'de ternera']
+PRESENTACIONES = ['', 'especial', 'premium', 'feteado', 'en trozos', 'sin hueso', 'con hueso', 'marinado']
+
+NOMBRES = [
+    'Juan', 'María', 'Carlos', 'Ana', 'Luis', 'Lucía', 'Jorge', 'Sofía', 'Pedro', 'Laura',
+    'Diego', 'Valeria', 'Martín', 'Paula', 'Andrés', 'Carmen', 'Raúl', 'Elena', 'Hugo', 'Rosa'
+]
+APELLIDOS = [
+    'Pérez', 'González', 'Rodríguez', 'Martínez', 'Hernández', 'López', 'García', 'Sánchez',
+    'Romero', 'Díaz', 'Torres', 'Flores', 'Ruiz', 'Álvarez', 'Moreno', 'Gómez', 'Castro', 'Vargas'
+]
+
+def _redondear(valor):
+    """Redondea a dos decimales (precisión de las columnas DECIMAL(10, 2))"""
+    return round(valor + 1e-9, 2)
+
+def generar_productos(rnd, cantidad):
+    """Catálogo de productos: código, nombre, descripción, precio inicial y peso típico por pesaje"""
+    productos = []
+    usados = set()
+    for n in range(1, cantidad + 1):
+        # Combinar corte, especie y presentación hasta obtener un nombre no repetido
+        while True:
+            nombre = ' '.join(p for p in (
+                rnd.choice(CORTES), rnd.choice(ESPECIES), rnd.choice(PRESENTACIONES)
+            ) if p)
+            if nombre not in usados or len(usados) >= len(CORTES) * len(ESPECIES) * len(PRESENTACIONES):
+                break
+        usados.add(nombre)
+        productos.append({
+            'codigo': f"{PREFIJO_PRODUCTO}{n:05d}",
+            'nombre': nombre,
+            'descripcion': f"{nombre} (sintético)",
+            'precio_kg': _redondear(rnd.uniform(4.0, 25.0)),
+            # Mediana del peso de cada pesaje de este producto (kg)
+            'peso_tipico': rnd.uniform(0.3, 2.5),
+        })
+    return productos
+
+def generar_vendedores(rnd, cantidad):
+    """Vendedores con su turno y día de franco semanal"""
+    vendedores = []
+    turnos = [t for t, _ in TURNOS]
+    proporciones = [p for _, p in TURNOS]
+    for n in range(1, cantidad + 1):
+        vendedores.append({
+            'codigo': f"{PREFIJO_VENDEDOR}{n:04d}",
+            'nombre': rnd.choice(NOMBRES),
+            'apellido': rnd.choice(APELLIDOS),
+            'documento': str(rnd.randint(10000000, 99999999)),
+            'telefono': f"555-{rnd.randint(100, 999)}-{rnd.randint(1000, 9999)}",
+            'turno': rnd.choices(turnos, weights=proporciones)[0],
+            'franco': rnd.randrange(7),
+        })
+    return vendedores
+
+def generar_precios(rnd, productos, inicio, fin):
+    """Vigencias de precio de cada producto: {codigo: [(desde, precio), ...]} ordenadas por fecha
+
+    Los cambios siguen un proceso de Poisson con DIAS_ENTRE_CAMBIOS_PRECIO días de media;
+    el precio final de cada producto queda en producto['precio_kg'].
+    """
+    vigencias = {}
+    segundos = (fin - inicio).total_seconds()
+    for producto in productos:
+        precio = producto['precio_kg']
+        cambios = [(inicio, precio)]
+        instante = 0.0
+        while True:
+            instante += rnd.expovariate(1 / (DIAS_ENTRE_CAMBIOS_PRECIO * 86400))
+            if instante >= segundos:
+                break
+            precio = _redondear(max(1.0, precio * (1 + rnd.gauss(*VARIACION_PRECIO))))
+            cambios.append((inicio + timedelta(seconds=int(instante)), precio))
+        vigencias[producto['codigo']] = cambios
+        producto['precio_kg'] = precio
+    return vigencias
+
+def precio_en(cambios, fechas_cambios, fecha_hora):
+    """Precio vigente en fecha_hora según la lista de cambios del producto"""
+    return cambios[bisect.bisect_right(fechas_cambios, fecha_hora) - 1][1]
+
+def generar_pesajes_dia(rnd, dia, productos, acumulados_zipf, vendedores, vigencias, fechas_cambios, por_dia):
+    """Pesajes de un día, ordenados por fecha y hora"""
+    cantidad = int(por_dia * PATRON_SEMANAL[dia.weekday()] * rnd.uniform(0.9, 1.1))
+
+    # Vendedores presentes en cada hora (según turno y franco)
+    presentes = {
+        hora: [v['codigo'] for v in vendedores
+               if v['franco'] != dia.weekday() and v['turno'][0] <= hora < v['turno'][1]]
+        for hora in PATRON_DIARIO
+    }
+    horas = [h for h in PATRON_DIARIO if presentes[h]]
+    if not horas:
+        return []
+    pesos_horas = [PATRON_DIARIO[h] for h in horas]
+
+    base = datetime(dia.year, dia.month, dia.day)
+    indices_productos = range(len(productos))
+    elegidos = rnd.choices(indices_productos, cum_weights=acumulados_zipf, k=cantidad)
+    horas_elegidas = rnd.choices(horas, weights=pesos_horas, k=cantidad)
+
+    filas = []
+    for indice, hora in zip(elegidos, horas_elegidas):
+        producto = productos[indice]
+        codigo = producto['codigo']
+        fecha_hora = base + timedelta(hours=hora, seconds=rnd.randrange(3600))
+        peso = _redondear(max(0.05, rnd.lognormvariate(math.log(producto['peso_tipico']), 0.45)))
+        filas.append((
+            codigo, peso, rnd.choice(presentes[hora]), fecha_hora,
+            precio_en(vigencias[codigo], fechas_cambios[codigo], fecha_hora), None
+        ))
+    filas.sort(key=lambda f: f[3])
+    return filas
+
+def _patron(prefijo):
+    """Patrón LIKE que coincide solo con los códigos que empiezan con el prefijo literal"""
+    return prefijo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def _existen_sinteticos(db):
+    """Indica si ya hay productos o vendedores sintéticos cargados"""
+    fila = db.execute_query(
+        """
+        SELECT EXISTS(SELECT 1 FROM productos WHERE codigo LIKE %s)
+            OR EXISTS(SELECT 1 FROM vendedores WHERE codigo LIKE %s) AS existen
+        """,
+        (_patron(PREFIJO_PRODUCTO), _patron(PREFIJO_VENDEDOR)),
+        fetchall=False
+    )
+    return bool(fila and fila['existen'])
+
+def _insertar_en_lotes(db, query, filas, tamano_lote=TAMANO_LOTE):
+    """Inserta filas con sentencias INSERT de varias filas (executemany las agrupa)"""
+    for i in range(0, len(filas), tamano_lote):
+        db.execute_many(query, filas[i:i + tamano_lote])
+
+def _ajustar_sesion(db, carga_masiva):
+    """Desactiva (o restaura) las verificaciones de claves de la sesión durante la carga masiva
+
+    También difiere el mantenimiento de series_kilos y bocetos por trigger (al terminar se
+    reconstruyen o invalidan para todo el rango cargado) y omite publicar los datos sintéticos
+    en el outbox.
+    """
+    valor = 0 if carga_masiva else 1
+    marca = 1 if carga_masiva else 'NULL'
+    cursor = db.connect().cursor()
+    try:
+        cursor.execute(
+            f"SET foreign_key_checks = {valor}, unique_checks = {valor}, "
+            f"@series_diferidas = {marca}, @outbox_omitido = {marca}"
+        )
+    finally:
+        cursor.close()
+
+def generar(escala=1.0, semilla=42, dias=90, hasta=None, tamano_lote=TAMANO_LOTE):
+    """Genera y carga el catálogo sintético y los pesajes; retorna un resumen de la carga
+
+    escala multiplica la cantidad de productos, vendedores y pesajes diarios (escala 1 equivale
+    a unos 900.000 pesajes en 90 días). hasta es la fecha final (exclusiva, por defecto hoy).
+    Lanza RuntimeError si ya hay datos sintéticos: la carga desactiva unique_checks y no debe
+    repetir códigos.
+    """
+    rnd = random.Random(semilla)
+    hasta = hasta or date.today()
+    desde = hasta - timedelta(days=dias)
+    inicio_periodo = datetime(desde.year, desde.month, desde.day)
+    fin_periodo = datetime(hasta.year, hasta.month, hasta.day)
+
+    productos = generar_productos(rnd, max(5, int(PRODUCTOS_POR_ESCALA * escala)))
+    vendedores = generar_vendedores(rnd, max(3, int(VENDEDORES_POR_ESCALA * escala)))
+    vigencias = generar_precios(rnd, productos, inicio_periodo, fin_periodo)
+    fechas_cambios = {codigo: [c[0] for c in cambios] for codigo, cambios in vigencias.items()}
+
+    # Popularidad de Zipf: el producto en la posición r (orden aleatorio) tiene peso 1 / r^s
+    rangos = list(range(1, len(productos) + 1))
+    rnd.shuffle(rangos)
+    acumulados_zipf = list(accumulate(1 / r ** EXPONENTE_ZIPF for r in rangos))
+
+    db = DatabaseConnector()
+    if _existen_sinteticos(db):
+        raise RuntimeError("Ya existen datos sintéticos; elimínelos con --limpiar antes de generarlos de nuevo")
+    inicio = time.monotonic()
+    _ajustar_sesion(db, True)
+    try:
+        _insertar_en_lotes(db, """
+            INSERT INTO productos (codigo, nombre, descripcion, precio_kg, fecha_creacion)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(p['codigo'], p['nombre'], p['descripcion'], p['precio_kg'], inicio_periodo) for p in productos],
+            tamano_lote)
+
+        _insertar_en_lotes(db, """
+            INSERT INTO vendedores (codigo, nombre, apellido, documento, telefono)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(v['codigo'], v['nombre'], v['apellido'], v['documento'], v['telefono']) for v in vendedores],
+            tamano_lote)
+
+        # Cada cambio cierra la vigencia anterior; la última queda abierta (vigente_hasta NULL)
+        historial = []
+        for codigo, cambios in vigencias.items():
+            for i, (vigente_desde, precio) in enumerate(cambios):
+                vigente_hasta = cambios[i + 1][0] if i + 1 < len(cambios) else None
+                historial.append((codigo, precio, vigente_desde, vigente_hasta))
+        _insertar_en_lotes(db, """
+            INSERT INTO precios_historial (codigo_producto, precio_kg, vigente_desde, vigente_hasta)
+            VALUES (%s, %s, %s, %s)
+        """, historial, tamano_lote)
+
+        total_pesajes = 0
+        por_dia = PESAJES_DIARIOS_POR_ESCALA * escala
+        for n in range(dias):
+            dia = desde + timedelta(days=n)
+            filas = generar_pesajes_dia(
+                rnd, dia, productos, acumulados_zipf, vendedores, vigencias, fechas_cambios, por_dia
+            )
+            _insertar_en_lotes(db, """
+                INSERT INTO pesajes (codigo_producto, peso, codigo_vendedor, fecha_hora, precio_kg, observaciones)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, filas, tamano_lote)
+            total_pesajes += len(filas)
+            logger.info("Día %s: %s pesajes generados", dia, len(filas))
+    finally:
+        _ajustar_sesion(db, False)
+
+    # Las series y los bocetos no se mantuvieron por trigger durante la carga: recalcular el rango
+    # generado (los bocetos se reconstruyen al consultarlos)
+    from models.bocetos import BocetosDiarios
+    from models.series_kilos import SeriesKilos
+    SeriesKilos().reconstruir(inicio_periodo, fin_periodo)
+    BocetosDiarios().invalidar(inicio_periodo, fin_periodo)
+    _invalidar_caches()
+
+    duracion = time.monotonic() - inicio
+    resumen = {
+        'productos': len(productos),
+        'vendedores': len(vendedores),
+        'precios_historial': len(historial),
+        'pesajes': total_pesajes,
+        'desde': desde,
+        'hasta': hasta,
+        'segundos': round(duracion, 1),
+        'pesajes_por_segundo': round(total_pesajes / duracion) if duracion else 0,
+    }
+    logger.info("Datos sintéticos generados: %s", resumen)
+    return resumen
+
+def limpiar(tamano_lote=50000):
+    """Elimina los datos sintéticos (pesajes, historial de precios, productos y vendedores)"""
+    db = DatabaseConnector()
+    patron_producto = _patron(PREFIJO_PRODUCTO)
+    patron_vendedor = _patron(PREFIJO_VENDEDOR)
+    _ajustar_sesion(db, True)
+    try:
+        _borrar_en_tramos(db, patron_producto, patron_vendedor, tamano_lote)
+    finally:
+        _ajustar_sesion(db, False)
+
+    from models.bocetos import BocetosDiarios
+    BocetosDiarios().invalidar()
+
+    with db.transaction() as cursor:
+        cursor.execute("DELETE FROM productos WHERE codigo LIKE %s", (patron_producto,))
+        cursor.execute("DELETE FROM vendedores WHERE codigo LIKE %s", (patron_vendedor,))
+
+    _invalidar_caches()
+    logger.info("Datos sintéticos eliminados")
+
+def _borrar_en_tramos(db, patron_producto, patron_vendedor, tamano_lote):
+    """Borra los pesajes, el historial de precios y las series de los códigos sintéticos"""
+    # Borrar en tramos para no generar una única transacción de millones de filas
+    for query, patron in (
+        ("DELETE FROM pesajes WHERE codigo_vendedor LIKE %s LIMIT " + str(tamano_lote), patron_vendedor),
+        ("DELETE FROM pesajes WHERE codigo_producto LIKE %s LIMIT " + str(tamano_lote), patron_producto),
+        ("DELETE FROM precios_historial WHERE codigo_producto LIKE %s LIMIT " + str(tamano_lote), patron_producto),
+        ("DELETE FROM series_kilos WHERE codigo_vendedor LIKE %s LIMIT " + str(tamano_lote), patron_vendedor),
+    ):
+        while True:
+            with db.transaction() as cursor:
+                cursor.execute(query, (patron,))
+                borradas = cursor.rowcount
+            if borradas < tamano_lote:
+                break
+
+def _invalidar_caches():
+    """Invalida las cachés en memoria del proceso que dependen del catálogo y los pesajes"""
+    from models.precios_snapshot import PreciosSnapshot
+    from models.repository import ProductoRepository, VendedorRepository, PesajeRepository
+
+    PreciosSnapshot().invalidar()
+    ProductoRepository.version_catalogo += 1
+    VendedorRepository.version_catalogo += 1
+    PesajeRepository.cache_resultados.limpiar()
+
+def crear_parser():
+    """Construye el analizador de argumentos de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Generador de datos sintéticos para pruebas de capacidad")
+    parser.add_argument('--escala', type=float, default=1.0,
+                        help="Factor de escala (1 = 200 productos, 20 vendedores, 10000 pesajes/día)")
+    parser.add_argument('--semilla', type=int, default=42, help="Semilla del generador (por defecto 42)")
+    parser.add_argument('--dias', type=int, default=90, help="Días de pesajes a generar (por defecto 90)")
+    parser.add_argument('--hasta', type=date.fromisoformat, default=None,
+                        help="Fecha final exclusiva AAAA-MM-DD (por defecto hoy)")
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                        help=f"Filas por sentencia INSERT (por defecto {TAMANO_LOTE})")
+    parser.add_argument('--limpiar', action='store_true',
+                        help="Eliminar los datos sintéticos en lugar de generarlos")
+    return parser
+
+def main(argv=None):
+    """Función principal del generador"""
+    args = crear_parser().parse_args(argv)
+    configurar_logging('generador_datos.log')
+
+    if not DatabaseConnector().test_connection():
+        print("No se pudo conectar a la base de datos MySQL. "
+              "Verifique la configuración en config/db_config.py", file=sys.stderr)
+        return 1
+
+    if args.limpiar:
+        limpiar()
+        return 0
+
+    try:
+        resumen = generar(args.escala, args.semilla, args.dias, args.hasta, args.lote)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for clave, valor in resumen.items():
+        print(f"{clave}: {valor}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# Este archivo permite que el directorio herramientas se comporte como un paquete
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+Registro de métricas de funcionamiento y su exportación en formato de texto de Prometheus
+
+Los contadores e histogramas se actualizan desde cualquier hilo con un lock propio de cada
+métrica (sin un lock global) y los medidores se calculan recién al exportar, llamando a las
+funciones registradas. La exportación corre en hilos propios: un servidor HTTP local opcional
+(GET /metrics) y un volcado periódico a un archivo; nunca se usa el hilo de la interfaz.
+"""
+import bisect
+import logging
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.metricas_config import get_metricas_config
+
+logger = logging.getLogger('metricas')
+
+# Límites (segundos) por defecto de los histogramas de latencia
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _formatear(valor):
+    """Formatea un valor numérico según el formato de texto de Prometheus"""
+    if valor == math.inf:
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+class Contador:
+    """Valor que solo aumenta (p. ej. pesajes registrados, errores)"""
+
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._valor = 0
+        self._lock = threading.Lock()
+
+    def incrementar(self, cantidad=1):
+        """Suma la cantidad al contador"""
+        with self._lock:
+            self._valor += cantidad
+
+    def valor(self):
+        """Valor actual"""
+        return self._valor
+
+    def muestras(self):
+        """Líneas de la exposición: (nombre con etiquetas, valor)"""
+        return [(self.nombre, self.valor())]
+
+class Medidor:
+    """Valor instantáneo calculado al exportar (p. ej. profundidad de una cola)
+
+    Se le pueden asociar varias funciones (una por instancia observada); el valor es su suma.
+    """
+
+    tipo = 'gauge'
+
+    def __init__(self, nombre, ayuda, tipo=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        if tipo is not None:
+            self.tipo = tipo
+        self._funciones = []
+        self._valor = 0
+
+    def observar(self, funcion):
+        """Agrega una función sin argumentos cuyo valor se suma al medidor"""
+        self._funciones.append(funcion)
+
+    def establecer(self, valor):
+        """Fija el valor del medidor (se suma al de las funciones asociadas)"""
+        self._valor = valor
+
+    def valor(self):
+        """Valor actual: el establecido más el de cada función asociada"""
+        total = self._valor
+        for funcion in list(self._funciones):
+            try:
+                total += funcion()
+            except Exception as e:
+                logger.debug("Error al calcular el medidor %s: %s", self.nombre, e)
+        return total
+
+    def muestras(self):
+        """Líneas de la exposición: (nombre con etiquetas, valor)"""
+        return [(self.nombre, self.valor())]
+
+class Histograma:
+    """Distribución de valores en intervalos fijos (p. ej. latencias en segundos)"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, limites=LIMITES_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = tuple(sorted(limites))
+        self._cuentas = [0] * (len(self.limites) + 1)
+        self._suma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        """Registra un valor en su intervalo"""
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self._cuentas[indice] += 1
+            self._suma += valor
+
+    def muestras(self):
+        """Líneas de la exposición: intervalos acumulados, suma y cantidad"""
+        with self._lock:
+            cuentas = list(self._cuentas)
+            suma = self._suma
+        lineas = []
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + (math.inf,), cuentas):
+            acumulado += cuenta
+            lineas.append((f'{self.nombre}_bucket{{le="{_formatear(float(limite))}"}}', acumulado))
+        lineas.append((f'{self.nombre}_sum', suma))
+        lineas.append((f'{self.nombre}_count', acumulado))
+        return lineas
+
+class RegistroMetricas:
+    """Registro único de las métricas del proceso"""
+
+    _instance = None
+
+    def __new__(cls):
+        """Implementación de patrón Singleton para compartir las métricas en todo el proceso"""
+        if cls._instance is None:
+            cls._instance = super(RegistroMetricas, cls).__new__(cls)
+            cls._instance._metricas = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def _obtener(self, clase, nombre, *args, **kwargs):
+        """Retorna la métrica registrada con el nombre o la crea"""
+        with self._lock:
+            metrica = self._metricas.get(nombre)
+            if metrica is None:
+                metrica = self._metricas[nombre] = clase(nombre, *args, **kwargs)
+            elif not isinstance(metrica, clase):
+                raise ValueError(f"La métrica {nombre} ya está registrada con otro tipo")
+            return metrica
+
+    def contador(self, nombre, ayuda):
+        """Retorna (creándolo si hace falta) un contador"""
+        return self._obtener(Contador, nombre, ayuda)
+
+    def medidor(self, nombre, ayuda, tipo=None):
+        """Retorna (creándolo si hace falta) un medidor; tipo='counter' para totales leídos de otro objeto"""
+        return self._obtener(Medidor, nombre, ayuda, tipo)
+
+    def histograma(self, nombre, ayuda, limites=LIMITES_LATENCIA):
+        """Retorna (creándolo si hace falta) un histograma"""
+        return self._obtener(Histograma, nombre, ayuda, limites)
+
+    def exposicion(self):
+        """Texto con todas las métricas en el formato de exposición de Prometheus"""
+        with self._lock:
+            metricas = sorted(self._metricas.values(), key=lambda m: m.nombre)
+        lineas = []
+        for metrica in metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            for nombre, valor in metrica.muestras():
+                lineas.append(f"{nombre} {_formatear(valor)}")
+        return "\n".join(lineas) + "\n"
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    """Atiende GET /metrics con la exposición del registro"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        cuerpo = RegistroMetricas().exposicion().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        logger.debug("Métricas HTTP: " + formato, *args)
+
+class VolcadorMetricas(threading.Thread):
+    """Hilo que escribe periódicamente la exposición en un archivo (de forma atómica)"""
+
+    def __init__(self, ruta, intervalo_s=15):
+        super().__init__(name='volcador-metricas', daemon=True)
+        self.ruta = ruta
+        self.intervalo = intervalo_s
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            self.volcar()
+
+    def volcar(self):
+        """Escribe la exposición actual en el archivo"""
+        try:
+            temporal = self.ruta + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                archivo.write(RegistroMetricas().exposicion())
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            logger.error("Error al volcar las métricas en %s: %s", self.ruta, e)
+
+    def detener(self):
+        """Detiene el hilo tras un último volcado"""
+        self._detener.set()
+        self.join(self.intervalo)
+        self.volcar()
+
+# Servidor HTTP y volcador activos (si los hay)
+_servidor = None
+_volcador = None
+
+def iniciar_exportacion():
+    """Inicia el servidor HTTP local y el volcado a archivo según config/metricas_config.py"""
+    global _servidor, _volcador
+    config = get_metricas_config()
+
+    if config['puerto'] is not None and _servidor is None:
+        try:
+            _servidor = ThreadingHTTPServer((config['host'], config['puerto']), _ManejadorMetricas)
+            _servidor.daemon_threads = True
+            threading.Thread(target=_servidor.serve_forever, name='servidor-metricas', daemon=True).start()
+            logger.info("Métricas disponibles en http://%s:%s/metrics", config['host'], _servidor.server_port)
+        except OSError as e:
+            logger.error("No se pudo iniciar el servidor de métricas: %s", e)
+            _servidor = None
+
+    if config['archivo'] and _volcador is None:
+        _volcador = VolcadorMetricas(config['archivo'], config['intervalo_archivo_s'])
+        _volcador.start()
+
+def detener_exportacion():
+    """Detiene el servidor HTTP y el volcado a archivo (con un último volcado)"""
+    global _servidor, _volcador
+    if _servidor is not None:
+        _servidor.shutdown()
+        _servidor.server_close()
+        _servidor = None
+    if _volcador is not None:
+        _volcador.detener()
+        _volcador = None
@@ -0,0 +1,225 @@
+"""
+Perfilador integrado: mide la latencia de los slots de la ventana y de los métodos públicos
+del controlador, y opcionalmente captura un perfil de cProfile o muestras de pilas
+
+Se activa con la variable de entorno CARNI_PERFIL (1/tiempos, cprofile o muestreo) o desde
+la acción oculta de la ventana principal (Ctrl+Shift+P). Al detenerse escribe un reporte con
+llamadas, percentiles p50/p95/p99 y las funciones con más tiempo propio.
+"""
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+logger = logging.getLogger('perfilador')
+
+# Variable de entorno que activa el perfilador al iniciar y directorio de los reportes
+VARIABLE_ENTORNO = 'CARNI_PERFIL'
+VARIABLE_DIRECTORIO = 'CARNI_PERFIL_DIR'
+
+# Modos admitidos: solo tiempos por método, tiempos + cProfile, tiempos + muestreo de pilas
+MODOS = ('tiempos', 'cprofile', 'muestreo')
+
+# Intervalo entre muestras de pilas en el modo muestreo
+INTERVALO_MUESTREO = 0.005
+
+# Cantidad de funciones listadas en la sección de tiempo propio del reporte
+FUNCIONES_EN_REPORTE = 25
+
+def percentil(ordenados, p):
+    """Percentil p (0-100) por rango más cercano sobre una lista ya ordenada"""
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+class MuestreadorPilas(threading.Thread):
+    """Toma muestras periódicas de la pila de un hilo y cuenta la función en ejecución (tiempo propio)"""
+
+    def __init__(self, id_hilo, intervalo=INTERVALO_MUESTREO):
+        super().__init__(name='muestreador-pilas', daemon=True)
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.muestras = 0
+        self.propio = Counter()
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self.id_hilo)
+            if marco is None:
+                continue
+            codigo = marco.f_code
+            self.propio[(codigo.co_filename, marco.f_lineno, codigo.co_name)] += 1
+            self.muestras += 1
+
+    def detener(self):
+        """Detiene el muestreo y espera al hilo"""
+        self._detener.set()
+        self.join()
+
+class Perfilador:
+    """Registro de latencias por método durante una sesión de perfilado"""
+
+    _instance = None
+
+    def __new__(cls):
+        """Implementación de patrón Singleton para compartir las mediciones en todo el proceso"""
+        if cls._instance is None:
+            cls._instance = super(Perfilador, cls).__new__(cls)
+            cls._instance.activo = False
+            cls._instance.modo = None
+            cls._instance._duraciones = defaultdict(list)
+            cls._instance._inicio = None
+            cls._instance._perfil = None
+            cls._instance._muestreador = None
+        return cls._instance
+
+    def iniciar(self, modo='tiempos'):
+        """Inicia una sesión de perfilado; las mediciones de sesiones anteriores se descartan"""
+        if self.activo:
+            return
+        if modo not in MODOS:
+            raise ValueError(f"Modo de perfilado no válido: {modo}")
+
+        self.modo = modo
+        self._duraciones = defaultdict(list)
+        self._inicio = time.perf_counter()
+        if modo == 'cprofile':
+            # cProfile solo mide el hilo que lo activa (el hilo de la interfaz)
+            self._perfil = cProfile.Profile()
+            self._perfil.enable()
+        elif modo == 'muestreo':
+            self._muestreador = MuestreadorPilas(threading.get_ident())
+            self._muestreador.start()
+        self.activo = True
+        logger.info("Perfilado iniciado (modo %s)", modo)
+
+    def detener(self, directorio=None):
+        """Detiene la sesión y escribe el reporte; retorna su ruta o None si no había sesión"""
+        if not self.activo:
+            return None
+        self.activo = False
+        if self._perfil is not None:
+            self._perfil.disable()
+        if self._muestreador is not None:
+            self._muestreador.detener()
+
+        directorio = directorio or os.environ.get(VARIABLE_DIRECTORIO) or '.'
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(self.reporte())
+
+        self._perfil = None
+        self._muestreador = None
+        logger.info("Reporte de perfilado escrito en %s", ruta)
+        return ruta
+
+    def alternar(self, modo='tiempos'):
+        """Inicia una sesión si no hay una activa, o la detiene; retorna la ruta del reporte al detener"""
+        if self.activo:
+            return self.detener()
+        self.iniciar(modo)
+        return None
+
+    def registrar(self, nombre, duracion):
+        """Agrega la duración (segundos) de una llamada"""
+        self._duraciones[nombre].append(duracion)
+
+    def reporte(self):
+        """Texto del reporte: latencias por método y funciones con más tiempo propio"""
+        salida = io.StringIO()
+        total = time.perf_counter() - self._inicio if self._inicio else 0.0
+        salida.write(f"Reporte de perfilado - {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+        salida.write(f"Modo: {self.modo}  Duración de la sesión: {total:.1f} s\n\n")
+
+        salida.write("Latencia por método (ms, incluye las llamadas anidadas)\n")
+        salida.write(f"{'método':<60} {'llamadas':>9} {'total':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}\n")
+        filas = []
+        for nombre, duraciones in self._duraciones.items():
+            ordenadas = sorted(duraciones)
+            filas.append((sum(ordenadas), nombre, ordenadas))
+        for suma, nombre, ordenadas in sorted(filas, reverse=True):
+            salida.write(
+                f"{nombre:<60} {len(ordenadas):>9} {suma * 1000:>10.1f} "
+                f"{percentil(ordenadas, 50) * 1000:>8.2f} {percentil(ordenadas, 95) * 1000:>8.2f} "
+                f"{percentil(ordenadas, 99) * 1000:>8.2f} {ordenadas[-1] * 1000:>8.2f}\n"
+            )
+
+        if self._perfil is not None:
+            salida.write("\nFunciones con más tiempo propio (cProfile, hilo de la interfaz)\n")
+            estadisticas = pstats.Stats(self._perfil, stream=salida)
+            estadisticas.sort_stats('tottime').print_stats(FUNCIONES_EN_REPORTE)
+
+        if self._muestreador is not None and self._muestreador.muestras:
+            muestras = self._muestreador.muestras
+            salida.write(f"\nFunciones con más tiempo propio (muestreo, {muestras} muestras)\n")
+            for (archivo, linea, funcion), cantidad in self._muestreador.propio.most_common(FUNCIONES_EN_REPORTE):
+                salida.write(f"{cantidad / muestras:>7.1%}  {funcion} ({archivo}:{linea})\n")
+
+        return salida.getvalue()
+
+def cronometrado(nombre, funcion):
+    """Envuelve una función para registrar su duración mientras el perfilador está activo
+
+    Con el perfilador inactivo el costo es una consulta de atributo y una llamada adicional.
+    """
+    perfilador = Perfilador()
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not perfilador.activo:
+            return funcion(*args, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            perfilador.registrar(nombre, time.perf_counter() - inicio)
+
+    envoltura.__perfilado__ = True
+    return envoltura
+
+def instrumentar(cls, nombres):
+    """Reemplaza los métodos indicados de la clase por versiones cronometradas
+
+    Debe llamarse antes de crear las instancias: las conexiones de señales guardan el método
+    que existía al conectarse.
+    """
+    for nombre in nombres:
+        funcion = cls.__dict__.get(nombre)
+        if callable(funcion) and not getattr(funcion, '__perfilado__', False):
+            setattr(cls, nombre, cronometrado(f"{cls.__name__}.{nombre}", funcion))
+
+def slots_de(cls):
+    """Nombres de los slots declarados con @Slot en la propia clase (según su QMetaObject)"""
+    from PySide6.QtCore import QMetaMethod
+
+    meta = cls.staticMetaObject
+    nombres = set()
+    for i in range(meta.methodOffset(), meta.methodCount()):
+        metodo = meta.method(i)
+        if metodo.methodType() == QMetaMethod.MethodType.Slot:
+            nombres.add(bytes(metodo.name()).decode())
+    return sorted(n for n in nombres if n in cls.__dict__)
+
+def metodos_publicos(cls):
+    """Nombres de los métodos públicos definidos en la propia clase"""
+    return sorted(
+        nombre for nombre, valor in vars(cls).items()
+        if not nombre.startswith('_') and callable(valor) and not isinstance(valor, type)
+    )
+
+def modo_desde_entorno():
+    """Modo de perfilado pedido por la variable de entorno, o None si no está activada"""
+    valor = os.environ.get(VARIABLE_ENTORNO, '').strip().lower()
+    if valor in ('', '0', 'no'):
+        return None
+    return valor if valor in MODOS else 'tiempos'
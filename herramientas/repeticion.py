@@ -0,0 +1,305 @@
+"""
+Grabación y reproducción de sesiones de registro para medir el rendimiento de punta a punta
+
+La grabación (variable de entorno CARNI_GRABAR=RUTA) guarda en JSON Lines, con su instante
+relativo, cada entrada del operador en la ventana principal: escaneos, vendedores, productos
+elegidos, guardados, limpiezas y el estado del modo rápido (al comenzar y en cada cambio). La
+reproducción crea la ventana principal con la plataforma Qt offscreen, en el modo grabado, e
+inyecta las entradas por los mismos widgets y señales a 1x o Nx
+contra la base configurada. Mide cada paso desde la inyección hasta que el bucle de eventos
+termina de procesarlo (slot, controlador, repositorio y actualización de la interfaz).
+
+    python -m herramientas.repeticion sesion.jsonl --velocidad 10 --base carniceria_pruebas
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from PySide6.QtCore import QTimer
+from herramientas.perfilador import percentil
+
+logger = logging.getLogger('repeticion')
+
+# Variable de entorno con la ruta del archivo de grabación
+VARIABLE_ENTORNO = 'CARNI_GRABAR'
+
+# Tipos de entrada que se graban y se reproducen
+TIPOS_ENTRADA = ('escaneo', 'vendedor', 'producto', 'guardar', 'limpiar', 'modo')
+
+class GrabadorSesion:
+    """Agrega las entradas del operador a un archivo JSON Lines a medida que ocurren"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = open(ruta, 'a', encoding='utf-8')
+        self._inicio = None
+        self._lock = threading.Lock()
+        logger.info("Grabando la sesión en %s", ruta)
+
+    @classmethod
+    def desde_entorno(cls):
+        """Retorna un grabador si CARNI_GRABAR indica un archivo, o None"""
+        ruta = os.environ.get(VARIABLE_ENTORNO)
+        return cls(ruta) if ruta else None
+
+    def registrar(self, tipo, valor=None):
+        """Agrega una entrada con los segundos transcurridos desde la primera"""
+        ahora = time.monotonic()
+        with self._lock:
+            if self._inicio is None:
+                self._inicio = ahora
+            linea = json.dumps({'t': round(ahora - self._inicio, 4), 'tipo': tipo, 'valor': valor}, ensure_ascii=False)
+            self._archivo.write(linea + "\n")
+            self._archivo.flush()
+
+    def cerrar(self):
+        """Cierra el archivo de grabación"""
+        with self._lock:
+            self._archivo.close()
+
+def leer_sesion(ruta):
+    """Lee las entradas de una grabación, ordenadas por instante; omite las líneas no válidas"""
+    entradas = []
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        for numero, linea in enumerate(archivo, 1):
+            if not linea.strip():
+                continue
+            try:
+                entrada = json.loads(linea)
+            except json.JSONDecodeError:
+                logger.warning("Línea %s de %s no válida", numero, ruta)
+                continue
+            if entrada.get('tipo') in TIPOS_ENTRADA:
+                entradas.append(entrada)
+    entradas.sort(key=lambda e: e['t'])
+    return entradas
+
+class ReproductorSesion:
+    """Inyecta las entradas grabadas en una ventana principal y mide la latencia de cada paso
+
+    velocidad multiplica el ritmo grabado (1 = tiempo real); con velocidad 0 cada entrada se
+    inyecta apenas termina la anterior. al_terminar recibe el resumen al finalizar.
+    """
+
+    def __init__(self, ventana, entradas, velocidad=1.0, al_terminar=None):
+        self.ventana = ventana
+        self.entradas = entradas
+        self.velocidad = velocidad
+        self.al_terminar = al_terminar
+
+        self.latencias = defaultdict(list)
+        self.errores = []
+        self.pesajes_guardados = 0
+        self.retraso_maximo = 0.0
+        self._siguiente = 0
+        self._en_curso = 0
+        self._escaneos_pendientes = []
+        self._inicio = None
+        self._fin = None
+
+        # Los errores se cuentan en lugar de abrir diálogos modales que detendrían la reproducción
+        ventana.manejador_errores = self.errores.append
+        ventana.controller.pesaje_guardado.connect(self._al_guardar)
+        # Conectado después que la ventana: corre cuando ya procesó los escaneos encolados
+        ventana.timer_escaner.timeout.connect(self._al_procesar_escaneos)
+
+    def iniciar(self):
+        """Establece el modo grabado al comenzar y comienza a inyectar las entradas
+
+        Las grabaciones anteriores al registro del modo no lo indican y se reproducen en modo rápido.
+        """
+        inicial = True
+        if self.entradas and self.entradas[0]['tipo'] == 'modo':
+            inicial = bool(self.entradas[0].get('valor'))
+        self.ventana.actionModo_rapido.setChecked(inicial)
+        self._inicio = time.perf_counter()
+        QTimer.singleShot(0, self._programar)
+
+    def _programar(self):
+        """Programa la inyección de la próxima entrada según su instante grabado"""
+        if self._siguiente >= len(self.entradas):
+            if self._en_curso == 0:
+                self._terminar()
+            return
+        if self.velocidad <= 0:
+            self._inyectar(time.perf_counter())
+            return
+        programado = self._inicio + self.entradas[self._siguiente]['t'] / self.velocidad
+        espera_ms = max(0, int((programado - time.perf_counter()) * 1000))
+        QTimer.singleShot(espera_ms, lambda: self._inyectar(programado))
+
+    def _inyectar(self, programado):
+        """Reproduce una entrada por los widgets y señales de la ventana"""
+        entrada = self.entradas[self._siguiente]
+        self._siguiente += 1
+        self.retraso_maximo = max(self.retraso_maximo, time.perf_counter() - programado)
+        paso = {'tipo': entrada['tipo'], 'inicio': time.perf_counter()}
+        self._en_curso += 1
+        ui = self.ventana.ui
+        valor = entrada.get('valor')
+
+        if entrada['tipo'] == 'escaneo':
+            ui.lineEdit_codigo_barra.setText(valor)
+            ui.lineEdit_codigo_barra.returnPressed.emit()
+            # Termina cuando el temporizador del escáner procese la lectura encolada
+            self._escaneos_pendientes.append(paso)
+        else:
+            if entrada['tipo'] == 'vendedor':
+                ui.lineEdit_codigo_vendedor.setText(valor)
+                ui.lineEdit_codigo_vendedor.returnPressed.emit()
+            elif entrada['tipo'] == 'producto':
+                ui.lineEdit_codigo_barra.setText(valor)
+                self.ventana.controller.buscar_producto_por_codigo(valor)
+            elif entrada['tipo'] == 'guardar':
+                if valor and valor.get('peso'):
+                    ui.lineEdit_peso.setText(valor['peso'])
+                ui.pushButton_guardar.click()
+            elif entrada['tipo'] == 'limpiar':
+                ui.pushButton_limpiar.click()
+            elif entrada['tipo'] == 'modo':
+                self.ventana.actionModo_rapido.setChecked(bool(valor))
+            self._completar(paso)
+
+        if self.velocidad > 0:
+            self._programar()
+
+    def _al_procesar_escaneos(self):
+        """Da por terminados los escaneos inyectados una vez que el escáner vació su cola"""
+        if self._escaneos_pendientes and self.ventana.pipeline_escaner.pendientes() == 0:
+            pasos, self._escaneos_pendientes = self._escaneos_pendientes, []
+            for paso in pasos:
+                self._completar(paso)
+
+    def _al_guardar(self, pesaje_id):
+        """Cuenta los pesajes guardados durante la reproducción"""
+        self.pesajes_guardados += 1
+
+    def _completar(self, paso):
+        """Registra el fin del paso cuando el bucle de eventos procesó lo que quedó pendiente"""
+        QTimer.singleShot(0, lambda: self._registrar_fin(paso))
+
+    def _registrar_fin(self, paso):
+        """Anota la latencia del paso y, si corresponde, continúa con la próxima entrada"""
+        self.latencias[paso['tipo']].append(time.perf_counter() - paso['inicio'])
+        self._en_curso -= 1
+        if self._en_curso == 0 and (self.velocidad <= 0 or self._siguiente >= len(self.entradas)):
+            self._programar()
+
+    def _terminar(self):
+        """Cierra la medición y entrega el resumen"""
+        self._fin = time.perf_counter()
+        if self.al_terminar is not None:
+            self.al_terminar(self.resumen())
+
+    def resumen(self):
+        """Latencias por tipo de paso (ms), duración y ritmo alcanzado"""
+        duracion = max((self._fin or time.perf_counter()) - (self._inicio or 0), 1e-9)
+        pasos = {}
+        for tipo, latencias in self.latencias.items():
+            ordenadas = sorted(latencias)
+            pasos[tipo] = {
+                'cantidad': len(ordenadas),
+                'p50_ms': round(percentil(ordenadas, 50) * 1000, 2),
+                'p95_ms': round(percentil(ordenadas, 95) * 1000, 2),
+                'p99_ms': round(percentil(ordenadas, 99) * 1000, 2),
+                'max_ms': round(ordenadas[-1] * 1000, 2),
+            }
+        escaneos = len(self.latencias.get('escaneo', []))
+        return {
+            'entradas': len(self.entradas),
+            'velocidad': self.velocidad,
+            'segundos': round(duracion, 3),
+            'escaneos_por_segundo': round(escaneos / duracion, 1),
+            'pesajes_guardados': self.pesajes_guardados,
+            'pesajes_por_segundo': round(self.pesajes_guardados / duracion, 1),
+            'retraso_maximo_ms': round(self.retraso_maximo * 1000, 1),
+            'errores': len(self.errores),
+            'pasos': pasos,
+        }
+
+def formatear_resumen(resumen):
+    """Texto del resumen de una reproducción"""
+    lineas = [
+        f"Entradas: {resumen['entradas']}  Velocidad: {resumen['velocidad'] or 'máxima'}x  "
+        f"Duración: {resumen['segundos']} s",
+        f"Escaneos/s: {resumen['escaneos_por_segundo']}  Pesajes guardados: {resumen['pesajes_guardados']} "
+        f"({resumen['pesajes_por_segundo']}/s)  Errores: {resumen['errores']}  "
+        f"Retraso máximo respecto de lo grabado: {resumen['retraso_maximo_ms']} ms",
+        "",
+        f"{'paso':<10} {'cantidad':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}  (ms)",
+    ]
+    for tipo, paso in sorted(resumen['pasos'].items()):
+        lineas.append(
+            f"{tipo:<10} {paso['cantidad']:>9} {paso['p50_ms']:>8.2f} {paso['p95_ms']:>8.2f} "
+            f"{paso['p99_ms']:>8.2f} {paso['max_ms']:>8.2f}"
+        )
+    return "\n".join(lineas)
+
+def crear_parser():
+    """Construye el analizador de argumentos de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Reproduce una sesión grabada y mide la latencia de punta a punta")
+    parser.add_argument('sesion', help="Archivo de grabación (JSON Lines, ver CARNI_GRABAR)")
+    parser.add_argument('--velocidad', type=float, default=1.0,
+                        help="Multiplicador del ritmo grabado; 0 inyecta cada entrada al terminar la anterior (por defecto 1)")
+    parser.add_argument('--base', default=None,
+                        help="Base de datos contra la que se reproduce (por defecto la de config/db_config.py)")
+    parser.add_argument('--json', default=None, help="Archivo donde guardar además el resumen en JSON")
+    return parser
+
+def main(argv=None):
+    """Reproduce una grabación en una ventana offscreen e imprime el resumen"""
+    args = crear_parser().parse_args(argv)
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # La reproducción no debe grabarse a sí misma
+    os.environ.pop(VARIABLE_ENTORNO, None)
+
+    from PySide6.QtWidgets import QApplication
+    from config.db_config import set_db_config
+    from config.dispositivos_config import get_balanza_config, get_escaner_config
+    from config.logging_config import configurar_logging
+    from controllers.pesaje_controller import PesajeController
+    from database.db_connector import DatabaseConnector
+    from src.ui.main_window import MainWindow
+
+    configurar_logging('repeticion.log')
+    if args.base:
+        set_db_config(database=args.base)
+    # Sin dispositivos serie; las lecturas grabadas ya pasaron el antirrebote y a velocidad Nx
+    # las repetidas caerían dentro de su ventana
+    get_escaner_config()['puerto'] = None
+    get_escaner_config()['antirrebote_ms'] = 0
+    get_balanza_config()['puerto'] = None
+    entradas = leer_sesion(args.sesion)
+    if not entradas:
+        print(f"La grabación {args.sesion} no tiene entradas", file=sys.stderr)
+        return 1
+
+    app = QApplication(sys.argv[:1])
+    if not DatabaseConnector().test_connection():
+        print("No se pudo conectar a la base de datos MySQL", file=sys.stderr)
+        return 1
+
+    ventana = MainWindow(PesajeController())
+    ventana.show()
+    resultado = {}
+
+    def al_terminar(resumen):
+        resultado.update(resumen)
+        app.quit()
+
+    ReproductorSesion(ventana, entradas, args.velocidad, al_terminar).iniciar()
+    app.exec()
+    ventana.close()
+
+    print(formatear_resumen(resultado))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
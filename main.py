@@ -9,15 +9,15 @@ from PySide6.QtCore import QFile
 from src.ui.main_window import MainWindow
 from controllers.pesaje_controller import PesajeController
 from database.db_connector import DatabaseConnector
+from controllers.pesaje_core import PesajeControllerCore, RecursosCompartidos
+from config.logging_config import configurar_logging
+from herramientas import metricas, perfilador
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='app.log'
-)
 logger = logging.getLogger('main')
 
+# Variable de entorno con la cantidad de estaciones (ventanas) que atiende el proceso
+VARIABLE_ESTACIONES = 'CARNI_ESTACIONES'
+
 def verificar_conexion_bd():
     """Verifica la conexión a la base de datos"""
     db = DatabaseConnector()
@@ -25,6 +25,8 @@ def verificar_conexion_bd():
 
 def main():
     """Función principal"""
+    configurar_logging('app.log')
+    
     # Crear directorios necesarios
     os.makedirs("exports", exist_ok=True)
     
@@ -43,16 +45,39 @@ def main():
         )
         return 1
     
-    # Inicializar controlador
-    controller = PesajeController()
+    # Instrumentar slots y métodos del controlador antes de crear instancias (el perfilado
+    # se activa con CARNI_PERFIL o con Ctrl+Shift+P; inactivo, el costo es despreciable)
+    perfilador.instrumentar(MainWindow, perfilador.slots_de(MainWindow))
+    perfilador.instrumentar(PesajeControllerCore, perfilador.metodos_publicos(PesajeControllerCore))
+    modo_perfil = perfilador.modo_desde_entorno()
+    if modo_perfil:
+        perfilador.Perfilador().iniciar(modo_perfil)
+    
+    # Inicializar controlador y ventana principal; en modo multiestación, uno por puesto con
+    # los repositorios, índices, caché del historial y detector compartidos
+    try:
+        estaciones = max(1, int(os.environ.get(VARIABLE_ESTACIONES, '1')))
+    except ValueError:
+        estaciones = 1
+    compartidos = RecursosCompartidos()
+    ventanas = []
+    for numero in range(1, estaciones + 1):
+        controller = PesajeController(compartidos, str(numero) if estaciones > 1 else None)
+        # Los dispositivos serie configurados quedan asignados a la primera estación
+        main_window = MainWindow(controller, dispositivos=numero == 1)
+        titulo = "Sistema de Registro de Pesajes - Carnicería"
+        main_window.setWindowTitle(f"{titulo} - Estación {numero}" if estaciones > 1 else titulo)
+        main_window.show()
+        ventanas.append(main_window)
     
-    # Crear y mostrar ventana principal
-    main_window = MainWindow(controller)
-    main_window.setWindowTitle("Sistema de Registro de Pesajes - Carnicería")
-    main_window.show()
+    # Exponer las métricas de funcionamiento (si están configuradas) desde hilos propios
+    metricas.iniciar_exportacion()
     
     # Ejecutar la aplicación
-    return app.exec()
+    try:
+        return app.exec()
+    finally:
+        metricas.detener_exportacion()
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
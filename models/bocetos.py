@@ -0,0 +1,386 @@
+"""
+Analítica aproximada de rangos largos con bocetos (sketches) diarios combinables
+
+Por cada día y cada vendedor (y cada producto) la tabla bocetos_diarios guarda la cantidad de
+pesajes y los kilos (exactos), un HyperLogLog de los códigos distintos (productos del vendedor o
+vendedores del producto) y un t-digest de los pesos. Una consulta de rango combina los bocetos de
+sus días en lugar de recorrer los pesajes, de modo que el costo depende de los días y los códigos
+y no de la cantidad de pesajes.
+
+Cotas de error:
+- HyperLogLog con 2^12 registros: error estándar 1,04 / √4096 ≈ 1,6 % (≈ 3,3 % con 95 % de
+  confianza). Hasta unos 10.000 distintos se usa conteo lineal, con error típico cercano al 1 %
+  (uno o dos códigos para un vendedor con un centenar de productos).
+- t-digest con compresión 100: un código con hasta unas decenas de pesajes en el día se guarda
+  sin agrupar (exacto). Combinando un año de días, el error del cuantil medido como error de
+  rango queda por debajo del 0,5 % y ronda el 0,1 % o menos en las colas (p1, p99, p99.9). El
+  mínimo y el máximo son exactos.
+- Pesajes y kilos son exactos.
+
+Los días ya cerrados se construyen al consultarlos por primera vez y quedan guardados; un
+trigger sobre pesajes descarta el boceto de un día anterior a hoy cuando cambian sus pesajes. El
+día en curso se resume al vuelo. consultar(exacto=True) calcula lo mismo con COUNT(DISTINCT) y los
+pesos ordenados, para verificar o cuando se necesita el valor exacto.
+"""
+import hashlib
+import logging
+import math
+import struct
+from datetime import date, timedelta
+from functools import lru_cache
+from models.repository import Repository
+
+logger = logging.getLogger('bocetos')
+
+# Bits de índice del HyperLogLog (2^12 = 4096 registros)
+PRECISION_HLL = 12
+
+# Compresión del t-digest (cantidad aproximada de centroides que se conservan)
+COMPRESION_TDIGEST = 100
+
+# Cuantiles de peso que se informan por defecto
+CUANTILES = (0.5, 0.9, 0.99)
+
+# Dimensión de cada boceto y columna de pesajes cuyos valores distintos se cuentan
+DIMENSIONES = {
+    'vendedor': ('codigo_vendedor', 'codigo_producto'),
+    'producto': ('codigo_producto', 'codigo_vendedor'),
+}
+
+@lru_cache(maxsize=65536)
+def _hash64(valor):
+    """Hash estable de 64 bits (el hash() de Python cambia entre procesos)"""
+    return int.from_bytes(hashlib.blake2b(valor.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HyperLogLog:
+    """Estimador de cardinalidad combinable; se serializa disperso mientras tiene pocos registros usados"""
+
+    def __init__(self, precision=PRECISION_HLL):
+        self.precision = precision
+        self.registros = bytearray(1 << precision)
+
+    def agregar(self, valor):
+        h = _hash64(valor)
+        indice = h >> (64 - self.precision)
+        resto = h & ((1 << (64 - self.precision)) - 1)
+        rango = (64 - self.precision) - resto.bit_length() + 1
+        if rango > self.registros[indice]:
+            self.registros[indice] = rango
+
+    def fusionar(self, otro):
+        if otro.precision != self.precision:
+            raise ValueError("No se pueden fusionar HyperLogLog de distinta precisión")
+        self.registros = bytearray(map(max, self.registros, otro.registros))
+
+    def estimar(self):
+        """Cantidad estimada de valores distintos"""
+        m = len(self.registros)
+        ceros = self.registros.count(0)
+        if ceros == m:
+            return 0
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimacion = alfa * m * m / sum(2.0 ** -r for r in self.registros)
+        # Corrección para cardinalidades bajas: conteo lineal sobre los registros vacíos
+        if estimacion <= 2.5 * m and ceros:
+            estimacion = m * math.log(m / ceros)
+        return round(estimacion)
+
+    def serializar(self):
+        """Bytes del boceto: pares (índice, rango) si ocupan menos que los registros completos"""
+        usados = [(i, r) for i, r in enumerate(self.registros) if r]
+        if len(usados) * 3 < len(self.registros):
+            return bytes([self.precision, 1]) + b''.join(struct.pack('<HB', i, r) for i, r in usados)
+        return bytes([self.precision, 0]) + bytes(self.registros)
+
+    @classmethod
+    def desde_bytes(cls, datos):
+        boceto = cls(datos[0])
+        if datos[1]:
+            for i, r in struct.iter_unpack('<HB', datos[2:]):
+                boceto.registros[i] = r
+        else:
+            boceto.registros = bytearray(datos[2:])
+        return boceto
+
+def interpolar_cuantil(centroides, total, minimo, maximo, q):
+    """Cuantil q por interpolación lineal entre los centros de los centroides [(media, peso)] ordenados
+
+    Con centroides de peso 1 coincide con el cuantil exacto por rangos medios.
+    """
+    if not centroides:
+        return None
+    if len(centroides) == 1:
+        return centroides[0][0]
+    objetivo = q * total
+    acumulado = 0
+    centro_anterior, media_anterior = 0, minimo
+    for media, peso in centroides:
+        centro = acumulado + peso / 2
+        if objetivo < centro:
+            if centro == centro_anterior:
+                return media
+            return media_anterior + (media - media_anterior) * (objetivo - centro_anterior) / (centro - centro_anterior)
+        acumulado += peso
+        centro_anterior, media_anterior = centro, media
+    if total == centro_anterior:
+        return maximo
+    return media_anterior + (maximo - media_anterior) * (objetivo - centro_anterior) / (total - centro_anterior)
+
+class TDigest:
+    """Resumen combinable de una distribución para estimar cuantiles (variante de fusión con escala arcoseno)"""
+
+    def __init__(self, compresion=COMPRESION_TDIGEST):
+        self.compresion = compresion
+        self.centroides = []
+        self.minimo = None
+        self.maximo = None
+        self._pendientes = []
+
+    @property
+    def total(self):
+        return sum(peso for _, peso in self.centroides) + sum(peso for _, peso in self._pendientes)
+
+    def agregar(self, valor, peso=1):
+        self._pendientes.append((valor, peso))
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+        if len(self._pendientes) >= 5 * self.compresion:
+            self._comprimir()
+
+    def fusionar(self, otro):
+        if otro.minimo is None:
+            return
+        self._pendientes.extend(otro.centroides)
+        self._pendientes.extend(otro._pendientes)
+        self.minimo = otro.minimo if self.minimo is None else min(self.minimo, otro.minimo)
+        self.maximo = otro.maximo if self.maximo is None else max(self.maximo, otro.maximo)
+        if len(self._pendientes) >= 5 * self.compresion:
+            self._comprimir()
+
+    def _limite(self, q):
+        """Cuantil hasta el que puede crecer un centroide que empieza en q (una unidad de la escala k)"""
+        k = self.compresion / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compresion / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compresion) + 1) / 2
+
+    def _comprimir(self):
+        if not self._pendientes:
+            return
+        datos = sorted(self.centroides + self._pendientes)
+        self._pendientes = []
+        total = sum(peso for _, peso in datos)
+        centroides = []
+        acumulado = 0
+        media, peso = datos[0]
+        limite = self._limite(0)
+        for media_siguiente, peso_siguiente in datos[1:]:
+            if (acumulado + peso + peso_siguiente) / total <= limite:
+                peso += peso_siguiente
+                media += (media_siguiente - media) * peso_siguiente / peso
+            else:
+                centroides.append((media, peso))
+                acumulado += peso
+                limite = self._limite(acumulado / total)
+                media, peso = media_siguiente, peso_siguiente
+        centroides.append((media, peso))
+        self.centroides = centroides
+
+    def cuantil(self, q):
+        """Valor estimado del cuantil q (0 a 1), o None si el resumen está vacío"""
+        self._comprimir()
+        return interpolar_cuantil(self.centroides, self.total, self.minimo, self.maximo, q)
+
+    def serializar(self):
+        self._comprimir()
+        return struct.pack('<dd', self.minimo, self.maximo) + b''.join(
+            struct.pack('<fI', media, peso) for media, peso in self.centroides
+        )
+
+    @classmethod
+    def desde_bytes(cls, datos, compresion=COMPRESION_TDIGEST):
+        boceto = cls(compresion)
+        boceto.minimo, boceto.maximo = struct.unpack_from('<dd', datos)
+        boceto.centroides = list(struct.iter_unpack('<fI', datos[16:]))
+        return boceto
+
+class ResumenRango:
+    """Acumula los bocetos de un código a lo largo de los días de un rango"""
+
+    def __init__(self):
+        self.pesajes = 0
+        self.kilos = 0.0
+        self.distintos = HyperLogLog()
+        self.pesos = TDigest()
+
+    def agregar_pesaje(self, codigo_distinto, peso):
+        self.pesajes += 1
+        self.kilos += peso
+        self.distintos.agregar(codigo_distinto)
+        self.pesos.agregar(peso)
+
+    def fusionar(self, pesajes, kilos, distintos, pesos):
+        self.pesajes += pesajes
+        self.kilos += kilos
+        self.distintos.fusionar(distintos)
+        self.pesos.fusionar(pesos)
+
+    def resultado(self, cuantiles):
+        return {
+            'pesajes': self.pesajes,
+            'kilos': round(self.kilos, 3),
+            'distintos': self.distintos.estimar(),
+            'minimo': self.pesos.minimo,
+            'maximo': self.pesos.maximo,
+            'cuantiles': {q: self.pesos.cuantil(q) for q in cuantiles},
+        }
+
+class BocetosDiarios(Repository):
+    """Construcción, invalidación y consulta de los bocetos diarios"""
+
+    def consultar(self, fecha_desde, fecha_hasta, dimension='vendedor', codigo=None, cuantiles=CUANTILES, exacto=False):
+        """Resumen por código de los días [fecha_desde, fecha_hasta)
+
+        Retorna {'exacto', 'dias', 'resultados': {codigo: {'pesajes', 'kilos', 'distintos',
+        'minimo', 'maximo', 'cuantiles': {q: peso}}}}. 'distintos' cuenta los productos de cada
+        vendedor (dimension='vendedor') o los vendedores de cada producto (dimension='producto').
+        """
+        if dimension not in DIMENSIONES:
+            raise ValueError(f"Dimensión desconocida: {dimension}")
+        desde, hasta = self._a_fecha(fecha_desde), self._a_fecha(fecha_hasta)
+        if exacto:
+            resultados = self._consultar_exacto(desde, hasta, dimension, codigo, cuantiles)
+        else:
+            resultados = {c: r.resultado(cuantiles) for c, r in self._combinar(desde, hasta, dimension, codigo).items()}
+        return {'exacto': exacto, 'dias': max(0, (hasta - desde).days), 'resultados': resultados}
+
+    def construir(self, fecha_desde, fecha_hasta):
+        """Construye los bocetos que falten de los días cerrados de [fecha_desde, fecha_hasta); retorna cuántos días"""
+        desde, hasta = self._a_fecha(fecha_desde), min(self._a_fecha(fecha_hasta), date.today())
+        with self.db.transaction() as cursor:
+            cursor.execute("SELECT dia FROM bocetos_dias WHERE dia >= %s AND dia < %s", (desde, hasta))
+            listos = {fila['dia'] for fila in cursor.fetchall()}
+        faltantes = [desde + timedelta(days=n) for n in range((hasta - desde).days)]
+        faltantes = [dia for dia in faltantes if dia not in listos]
+        for dia in faltantes:
+            self._construir_dia(dia)
+        if faltantes:
+            logger.info("Bocetos construidos para %s días entre %s y %s", len(faltantes), faltantes[0], faltantes[-1])
+        return len(faltantes)
+
+    def invalidar(self, fecha_desde=None, fecha_hasta=None):
+        """Descarta los bocetos de un rango (todos, si no se indica) para que se reconstruyan al consultarlos"""
+        with self.db.transaction() as cursor:
+            if fecha_desde is None and fecha_hasta is None:
+                cursor.execute("DELETE FROM bocetos_dias")
+            else:
+                desde = self._a_fecha(fecha_desde) if fecha_desde is not None else date.min
+                hasta = self._a_fecha(fecha_hasta) if fecha_hasta is not None else date.max
+                cursor.execute("DELETE FROM bocetos_dias WHERE dia >= %s AND dia < %s", (desde, hasta))
+
+    @staticmethod
+    def _a_fecha(valor):
+        if isinstance(valor, date):
+            return valor if type(valor) is date else valor.date()
+        return date.fromisoformat(str(valor)[:10])
+
+    def _resumir(self, cursor, desde, hasta):
+        """Resume los pesajes de [desde, hasta) en {(dimension, codigo): ResumenRango}"""
+        cursor.execute(
+            "SELECT codigo_vendedor, codigo_producto, peso FROM pesajes WHERE fecha_hora >= %s AND fecha_hora < %s",
+            (desde, hasta)
+        )
+        resumenes = {}
+        for fila in cursor.fetchall():
+            peso = float(fila['peso'])
+            for dimension, (columna, distinta) in DIMENSIONES.items():
+                resumen = resumenes.get((dimension, fila[columna]))
+                if resumen is None:
+                    resumen = resumenes[(dimension, fila[columna])] = ResumenRango()
+                resumen.agregar_pesaje(fila[distinta], peso)
+        return resumenes
+
+    def _construir_dia(self, dia):
+        """Reemplaza los bocetos de un día cerrado y lo marca como construido, en una transacción"""
+        with self.db.transaction() as cursor:
+            resumenes = self._resumir(cursor, dia, dia + timedelta(days=1))
+            cursor.execute("DELETE FROM bocetos_diarios WHERE dia = %s", (dia,))
+            if resumenes:
+                cursor.executemany("""
+                    INSERT INTO bocetos_diarios (dia, dimension, codigo, pesajes, kilos, distintos, pesos)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, [
+                    (dia, dimension, codigo, r.pesajes, round(r.kilos, 3), r.distintos.serializar(), r.pesos.serializar())
+                    for (dimension, codigo), r in resumenes.items()
+                ])
+            cursor.execute("INSERT INTO bocetos_dias (dia) VALUES (%s) ON DUPLICATE KEY UPDATE construido = NOW()", (dia,))
+
+    def _combinar(self, desde, hasta, dimension, codigo):
+        """Fusiona los bocetos guardados del rango con el resumen al vuelo del día en curso"""
+        self.construir(desde, hasta)
+        hoy = date.today()
+        condiciones = ["b.dimension = %s", "b.dia >= %s", "b.dia < %s"]
+        params = [dimension, desde, min(hasta, hoy)]
+        if codigo:
+            condiciones.append("b.codigo = %s")
+            params.append(codigo)
+
+        combinados = {}
+        with self.db.transaction() as cursor:
+            cursor.execute(f"""
+                SELECT b.codigo, b.pesajes, b.kilos, b.distintos, b.pesos
+                FROM bocetos_diarios b JOIN bocetos_dias d ON d.dia = b.dia
+                WHERE {' AND '.join(condiciones)}
+            """, tuple(params))
+            for fila in cursor.fetchall():
+                combinados.setdefault(fila['codigo'], ResumenRango()).fusionar(
+                    fila['pesajes'], float(fila['kilos']),
+                    HyperLogLog.desde_bytes(fila['distintos']), TDigest.desde_bytes(fila['pesos'])
+                )
+
+            # El día en curso (y lo posterior) todavía cambia: se resume sin guardarlo
+            if hasta > hoy:
+                for (dimension_dia, codigo_dia), r in self._resumir(cursor, max(desde, hoy), hasta).items():
+                    if dimension_dia == dimension and (not codigo or codigo_dia == codigo):
+                        combinados.setdefault(codigo_dia, ResumenRango()).fusionar(r.pesajes, r.kilos, r.distintos, r.pesos)
+        return combinados
+
+    def _consultar_exacto(self, desde, hasta, dimension, codigo, cuantiles):
+        """Mismo resumen que consultar(), calculado sobre los pesajes con COUNT(DISTINCT) y los pesos ordenados"""
+        columna, distinta = DIMENSIONES[dimension]
+        condiciones = ["fecha_hora >= %s", "fecha_hora < %s"]
+        params = [desde, hasta]
+        if codigo:
+            condiciones.append(f"{columna} = %s")
+            params.append(codigo)
+        where = ' AND '.join(condiciones)
+
+        resultados = {}
+        for fila in self.db.execute_query(f"""
+            SELECT {columna} AS codigo, COUNT(*) AS pesajes, SUM(peso) AS kilos,
+                   COUNT(DISTINCT {distinta}) AS distintos, MIN(peso) AS minimo, MAX(peso) AS maximo
+            FROM pesajes WHERE {where} GROUP BY {columna}
+        """, tuple(params), replica=True):
+            resultados[fila['codigo']] = {
+                'pesajes': fila['pesajes'],
+                'kilos': round(float(fila['kilos']), 3),
+                'distintos': fila['distintos'],
+                'minimo': float(fila['minimo']),
+                'maximo': float(fila['maximo']),
+                'cuantiles': {},
+            }
+
+        # MySQL no tiene funciones de percentil: los pesos de cada código se leen ordenados
+        pesos = {}
+        for fila in self.db.execute_query(
+            f"SELECT {columna} AS codigo, peso FROM pesajes WHERE {where} ORDER BY {columna}, peso",
+            tuple(params), replica=True
+        ):
+            pesos.setdefault(fila['codigo'], []).append((float(fila['peso']), 1))
+        for codigo_fila, valores in pesos.items():
+            resultado = resultados[codigo_fila]
+            resultado['cuantiles'] = {
+                q: interpolar_cuantil(valores, len(valores), resultado['minimo'], resultado['maximo'], q)
+                for q in cuantiles
+            }
+        return resultados
@@ -0,0 +1,121 @@
+"""
+Caché LRU de resultados de consultas, con tamaño acotado e invalidación por rango de fechas
+"""
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+
+logger = logging.getLogger('cache_resultados')
+
+# Entrada de la caché: resultado, tamaño estimado, rango de fechas y vendedor que cubre, y vencimiento
+EntradaCache = namedtuple('EntradaCache', ['valor', 'bytes', 'desde', 'hasta', 'vendedor', 'vence'])
+
+def a_datetime(valor):
+    """Convierte una fecha (texto, date o datetime) a datetime; None se mantiene"""
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day)
+    return datetime.fromisoformat(str(valor))
+
+def tamano_estimado(valor):
+    """Estimación en bytes de la memoria ocupada por un resultado (listas de diccionarios)"""
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamano_estimado(v) for v in valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(sys.getsizeof(v) for v in valor.values())
+    return sys.getsizeof(valor)
+
+class CacheResultados:
+    """Caché de resultados por clase de consulta y parámetros
+
+    Las entradas se invalidan solo si un nuevo pesaje cae dentro de su rango de fechas y
+    corresponde a su vendedor. Como los pesajes de otros puestos no pasan por esta caché,
+    los rangos que incluyen el día actual vencen además tras ttl_abierto segundos; los
+    días ya cerrados no vencen.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl_abierto=30):
+        self.max_bytes = max_bytes
+        self.ttl_abierto = ttl_abierto
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        """Retorna (encontrado, valor) para la clave, marcándola como usada recientemente"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada.vence is not None and time.monotonic() > entrada.vence:
+                self._quitar(clave)
+                entrada = None
+            if entrada is None:
+                self.fallos += 1
+                return False, None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return True, entrada.valor
+
+    def guardar(self, clave, valor, desde=None, hasta=None, vendedor=None):
+        """Guarda un resultado indicando el rango de fechas y el vendedor que cubre (None = todos)"""
+        tamano = tamano_estimado(valor)
+        if tamano > self.max_bytes:
+            return
+
+        desde, hasta = a_datetime(desde), a_datetime(hasta)
+        hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        vence = None
+        if hasta is None or hasta >= hoy:
+            vence = time.monotonic() + self.ttl_abierto
+
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = EntradaCache(valor, tamano, desde, hasta, vendedor, vence)
+            self._bytes += tamano
+            # Desalojar las entradas menos usadas hasta respetar el tamaño máximo
+            while self._bytes > self.max_bytes:
+                self._quitar(next(iter(self._entradas)))
+
+    def _quitar(self, clave):
+        """Elimina una entrada (se llama con el lock tomado)"""
+        entrada = self._entradas.pop(clave)
+        self._bytes -= entrada.bytes
+
+    def invalidar(self, fecha_hora, codigo_vendedor=None):
+        """Elimina las entradas cuyo rango incluye fecha_hora y que corresponden al vendedor"""
+        fecha_hora = a_datetime(fecha_hora)
+        with self._lock:
+            afectadas = [
+                clave for clave, e in self._entradas.items()
+                if (e.desde is None or e.desde <= fecha_hora)
+                and (e.hasta is None or fecha_hora <= e.hasta)
+                and (e.vendedor is None or codigo_vendedor is None or e.vendedor == codigo_vendedor)
+            ]
+            for clave in afectadas:
+                self._quitar(clave)
+        if afectadas:
+            logger.debug("Caché de resultados: %s entradas invalidadas", len(afectadas))
+
+    def limpiar(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        """Retorna entradas, bytes ocupados y tasa de aciertos"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            }
@@ -0,0 +1,148 @@
+"""
+Caché local de los pesajes de una ventana reciente para filtrar el historial sin consultar la base
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from models.repository import PesajeRepository
+
+logger = logging.getLogger('historial_cache')
+
+# Pesajes del final de la ventana que se vuelven a leer para detectar bajas y altas fuera de orden
+REVALIDAR_ULTIMOS = 2000
+
+# Segundos entre revalidaciones del final de la ventana
+INTERVALO_REVALIDACION_S = 30
+
+class HistorialCache:
+    """Mantiene en memoria los pesajes de los últimos N días, completándolos a partir del último ID visto
+
+    Puede compartirse entre estaciones: las cargas de cada una corren en su propio hilo, por lo
+    que las modificaciones y lecturas se serializan con un lock.
+    
+    Leer solo IDs mayores al último visto no alcanza para los pesajes borrados por otra estación
+    ni para los que se confirman (o llegan a la réplica) después de otros con ID mayor: cada
+    intervalo_revalidacion_s se vuelven a leer los últimos pesajes de la ventana y se aplican las
+    diferencias. version cambia cada vez que la caché cambia de otra forma que agregando al final.
+    """
+    
+    def __init__(self, dias_ventana=90, tamano_lote=5000, revalidar_ultimos=REVALIDAR_ULTIMOS,
+                 intervalo_revalidacion_s=INTERVALO_REVALIDACION_S):
+        self.dias_ventana = dias_ventana
+        self.tamano_lote = tamano_lote
+        self.revalidar_ultimos = revalidar_ultimos
+        self.intervalo_revalidacion = intervalo_revalidacion_s
+        self.pesaje_repo = PesajeRepository()
+        self._filas = {}
+        self._ultimo_id = 0
+        self._inicio_ventana = None
+        self._ultima_revalidacion = time.monotonic()
+        self.version = 0
+        self._lock = threading.RLock()
+    
+    @property
+    def ultimo_id(self):
+        """ID del último pesaje incorporado"""
+        return self._ultimo_id
+    
+    @property
+    def inicio_ventana(self):
+        """Fecha y hora desde la que la caché contiene todos los pesajes (None si no se cargó)"""
+        return self._inicio_ventana
+    
+    def cubre(self, fecha_desde):
+        """Indica si un rango que comienza en fecha_desde puede responderse desde la caché"""
+        if self._inicio_ventana is None:
+            return False
+        return fecha_desde >= self._inicio_ventana
+    
+    def filas(self):
+        """Retorna los pesajes en caché ordenados por ID"""
+        with self._lock:
+            return list(self._filas.values())
+    
+    def filas_desde(self, ultimo_id):
+        """Retorna los pesajes en caché con ID mayor que ultimo_id, ordenados por ID"""
+        nuevas = []
+        with self._lock:
+            # Las filas se agregan en orden de ID: recorrer desde el final hasta alcanzar ultimo_id
+            for fila in reversed(self._filas.values()):
+                if fila['id'] <= ultimo_id:
+                    break
+                nuevas.append(fila)
+        nuevas.reverse()
+        return nuevas
+    
+    def actualizar(self):
+        """Incorpora los pesajes nuevos desde el último ID visto y retorna solo los agregados"""
+        with self._lock:
+            return self._actualizar()
+    
+    def _actualizar(self):
+        """Implementación de actualizar (se llama con el lock tomado)"""
+        inicio = (datetime.now() - timedelta(days=self.dias_ventana)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        
+        # Desplazar la ventana: descartar los pesajes que quedaron fuera
+        if self._inicio_ventana is not None and inicio > self._inicio_ventana:
+            self._filas = {
+                id_: fila for id_, fila in self._filas.items() if fila['fecha_hora'] >= inicio
+            }
+        
+        # Revalidar antes de agregar los nuevos, para que el tramo revisado sea el ya cargado
+        if self._inicio_ventana is not None and time.monotonic() - self._ultima_revalidacion >= self.intervalo_revalidacion:
+            self._revalidar(inicio)
+        
+        nuevas = self._leer_desde(self._ultimo_id, inicio)
+        for fila in nuevas:
+            self._filas[fila['id']] = fila
+        if nuevas:
+            self._ultimo_id = nuevas[-1]['id']
+        
+        if self._inicio_ventana is None:
+            logger.info("Caché de historial cargada con %s pesajes desde %s", len(self._filas), inicio.strftime('%Y-%m-%d'))
+        self._inicio_ventana = inicio
+        return nuevas
+    
+    def _leer_desde(self, desde_id, inicio):
+        """Lee de la base los pesajes de la ventana con ID mayor que desde_id, en lotes"""
+        filas = []
+        while True:
+            lote = self.pesaje_repo.get_desde_id(desde_id, fecha_desde=inicio, limit=self.tamano_lote)
+            filas.extend(lote)
+            if len(lote) < self.tamano_lote:
+                return filas
+            desde_id = lote[-1]['id']
+    
+    def _revalidar(self, inicio):
+        """Vuelve a leer los últimos pesajes de la ventana y aplica las bajas, altas tardías y cambios"""
+        self._ultima_revalidacion = time.monotonic()
+        ids = list(self._filas)
+        desde_id = ids[-self.revalidar_ultimos] - 1 if len(ids) >= self.revalidar_ultimos else 0
+        actuales = {fila['id']: fila for fila in self._leer_desde(desde_id, inicio)}
+        
+        bajas = [id_ for id_ in ids[-self.revalidar_ultimos:] if id_ > desde_id and id_ not in actuales]
+        cambios = [
+            fila for id_, fila in actuales.items()
+            if id_ <= self._ultimo_id and self._filas.get(id_) != fila
+        ]
+        if not bajas and not cambios:
+            return
+        
+        for id_ in bajas:
+            del self._filas[id_]
+        for fila in cambios:
+            self._filas[fila['id']] = fila
+        # Mantener el orden por ID del que dependen filas() y filas_desde()
+        self._filas = dict(sorted(self._filas.items()))
+        self.version += 1
+        logger.info("Caché de historial revalidada: %s pesajes quitados, %s agregados o modificados",
+                    len(bajas), len(cambios))
+    
+    def eliminar(self, pesaje_id):
+        """Quita un pesaje de la caché (p. ej. al deshacer un registro)"""
+        with self._lock:
+            if self._filas.pop(pesaje_id, None) is not None:
+                self.version += 1
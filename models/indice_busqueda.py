@@ -0,0 +1,327 @@
+"""
+Índice en memoria de prefijos y trigramas para autocompletar productos y vendedores
+"""
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+
+logger = logging.getLogger('indice_busqueda')
+
+# Longitud máxima de los prefijos indexados; consultas más largas se verifican sobre los candidatos
+LONGITUD_PREFIJO_MAX = 8
+
+def normalizar(texto):
+    """Pasa a minúsculas y elimina los acentos para comparar sin distinguirlos"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto or ''))
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower().strip()
+
+def trigramas(texto):
+    """Trigramas de un texto normalizado, con relleno para dar peso a los extremos"""
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+def es_subsecuencia(termino, palabra):
+    """Indica si las letras del término aparecen en la palabra en el mismo orden (p. ej. 'lmo' en 'lomo')"""
+    letras = iter(palabra)
+    return all(letra in letras for letra in termino)
+
+class IndiceBusqueda:
+    """Índice de prefijos por palabra y de trigramas para búsqueda aproximada"""
+
+    # Similitud mínima (Jaccard de trigramas) para considerar que una palabra es un error de tipeo de otra
+    SIMILITUD_MINIMA = 0.35
+
+    # Longitud mínima de un término para buscarlo como abreviatura (letras salteadas) de una palabra
+    LONGITUD_ABREVIATURA = 3
+
+    def __init__(self):
+        self._entradas = {}
+        self._prefijos = defaultdict(set)
+        self._prefijos_codigo = defaultdict(set)
+        # Vocabulario: palabra -> claves que la contienen, y trigrama -> palabras (búsqueda aproximada)
+        self._palabras = defaultdict(set)
+        self._palabras_por_prefijo = defaultdict(set)
+        self._trigramas = defaultdict(set)
+        self._palabras_por_inicial = defaultdict(set)
+        # Listas de claves por prefijo ya ordenadas por relevancia; se recalculan al modificar el índice
+        self._ordenados = {}
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def agregar(self, clave, campos, dato):
+        """Indexa un elemento por su clave (código) y campos de texto (nombre, apellido, ...)"""
+        self.eliminar(clave)
+
+        codigo = normalizar(clave)
+        palabras = {codigo}
+        for campo in campos:
+            palabras.update(normalizar(campo).split())
+        texto_completo = ' '.join([codigo] + [normalizar(c) for c in campos if c])
+
+        # A igual coincidencia, los textos más cortos son más específicos
+        relevancia = 1.0 / (1 + len(texto_completo))
+        self._entradas[clave] = (codigo, palabras, texto_completo, relevancia, dato)
+        for palabra in palabras:
+            for i in range(1, min(len(palabra), LONGITUD_PREFIJO_MAX) + 1):
+                self._prefijos[palabra[:i]].add(clave)
+        for i in range(1, min(len(codigo), LONGITUD_PREFIJO_MAX) + 1):
+            self._prefijos_codigo[codigo[:i]].add(clave)
+        for palabra in palabras:
+            if palabra not in self._palabras:
+                for trigrama in trigramas(palabra):
+                    self._trigramas[trigrama].add(palabra)
+                self._palabras_por_prefijo[palabra[:LONGITUD_PREFIJO_MAX]].add(palabra)
+                self._palabras_por_inicial[palabra[:1]].add(palabra)
+            self._palabras[palabra].add(clave)
+        self._ordenados.clear()
+
+    def eliminar(self, clave):
+        """Quita un elemento del índice"""
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        codigo, palabras, texto_completo, _, _ = entrada
+        for palabra in palabras:
+            for i in range(1, min(len(palabra), LONGITUD_PREFIJO_MAX) + 1):
+                self._prefijos[palabra[:i]].discard(clave)
+        for i in range(1, min(len(codigo), LONGITUD_PREFIJO_MAX) + 1):
+            self._prefijos_codigo[codigo[:i]].discard(clave)
+        for palabra in palabras:
+            self._palabras[palabra].discard(clave)
+            if not self._palabras[palabra]:
+                del self._palabras[palabra]
+                for trigrama in trigramas(palabra):
+                    self._trigramas[trigrama].discard(palabra)
+                self._palabras_por_prefijo[palabra[:LONGITUD_PREFIJO_MAX]].discard(palabra)
+                self._palabras_por_inicial[palabra[:1]].discard(palabra)
+        self._ordenados.clear()
+
+    def reconstruir(self, elementos):
+        """Reemplaza el contenido del índice por (clave, campos, dato) de cada elemento"""
+        self._entradas.clear()
+        self._prefijos.clear()
+        self._prefijos_codigo.clear()
+        self._palabras.clear()
+        self._palabras_por_prefijo.clear()
+        self._trigramas.clear()
+        self._palabras_por_inicial.clear()
+        for clave, campos, dato in elementos:
+            self.agregar(clave, campos, dato)
+
+    def _ordenar(self, claves):
+        """Ordena claves por relevancia descendente"""
+        return sorted(claves, key=lambda c: -self._entradas[c][3])
+
+    def _ordenados_por_prefijo(self, indice, prefijo):
+        """Claves de un prefijo ordenadas por relevancia (cacheadas hasta el próximo cambio)"""
+        clave_cache = (id(indice), prefijo)
+        ordenados = self._ordenados.get(clave_cache)
+        if ordenados is None:
+            ordenados = self._ordenar(indice.get(prefijo, ()))
+            self._ordenados[clave_cache] = ordenados
+        return ordenados
+
+    def _coincidencias_prefijo(self, consulta, terminos, k):
+        """Hasta k claves cuyas palabras comienzan con todos los términos; primero las de código"""
+        if len(terminos) == 1:
+            # Un solo término: recorrer las listas ya ordenadas y cortar al llegar a k
+            if len(consulta) <= LONGITUD_PREFIJO_MAX:
+                listas = [
+                    self._ordenados_por_prefijo(self._prefijos_codigo, consulta),
+                    self._ordenados_por_prefijo(self._prefijos, consulta),
+                ]
+            else:
+                # Más largo que los prefijos indexados: resolverlo sobre el vocabulario
+                palabras = [
+                    p for p in self._palabras_por_prefijo.get(consulta[:LONGITUD_PREFIJO_MAX], ())
+                    if p.startswith(consulta)
+                ]
+                listas = [self._ordenados_por_prefijo(self._palabras, p) for p in palabras]
+            
+            resultado = []
+            exacto = self._entradas_por_codigo().get(consulta)
+            if exacto is not None:
+                resultado.append(exacto)
+            for lista in listas:
+                for clave in lista:
+                    if len(resultado) >= k:
+                        return resultado
+                    if clave not in resultado:
+                        resultado.append(clave)
+            return resultado
+
+        # Varios términos: intersectar los conjuntos, empezando por el más pequeño
+        conjuntos = []
+        for termino in terminos:
+            if len(termino) <= LONGITUD_PREFIJO_MAX:
+                claves = self._prefijos.get(termino, set())
+            else:
+                claves = set().union(*(
+                    self._palabras[p]
+                    for p in self._palabras_por_prefijo.get(termino[:LONGITUD_PREFIJO_MAX], ())
+                    if p.startswith(termino)
+                ))
+            if not claves:
+                return []
+            conjuntos.append(claves)
+        conjuntos.sort(key=len)
+        candidatos = set.intersection(*conjuntos)
+        return heapq.nlargest(k, candidatos, key=lambda c: self._entradas[c][3])
+
+    def _entradas_por_codigo(self):
+        """Mapa de código normalizado a clave (cacheado hasta el próximo cambio)"""
+        mapa = self._ordenados.get('codigos')
+        if mapa is None:
+            mapa = {entrada[0]: clave for clave, entrada in self._entradas.items()}
+            self._ordenados['codigos'] = mapa
+        return mapa
+
+    def _palabras_similares(self, termino):
+        """Palabras del vocabulario parecidas al término, con su similitud
+
+        Además de los errores de tipeo (trigramas), acepta abreviaturas: palabras con la misma
+        inicial que contienen las letras del término en orden. Estas puntúan por debajo de
+        cualquier coincidencia por trigramas.
+        """
+        trigramas_termino = trigramas(termino)
+        comunes = Counter(chain.from_iterable(self._trigramas.get(t, ()) for t in trigramas_termino))
+        similares = {}
+        for palabra, cantidad in comunes.items():
+            similitud = cantidad / (len(trigramas_termino) + len(trigramas(palabra)) - cantidad)
+            if similitud >= self.SIMILITUD_MINIMA:
+                similares[palabra] = similitud
+        if len(termino) >= self.LONGITUD_ABREVIATURA:
+            for palabra in self._palabras_por_inicial.get(termino[0], ()):
+                if palabra not in similares and len(palabra) > len(termino) and es_subsecuencia(termino, palabra):
+                    similares[palabra] = self.SIMILITUD_MINIMA * len(termino) / len(palabra)
+        return similares
+
+    def _coincidencias_aproximadas(self, terminos, excluir, k):
+        """Hasta k claves cuyas palabras se parecen a todos los términos (tolera errores de tipeo)
+
+        La comparación se hace sobre el vocabulario de palabras distintas, que es mucho más
+        chico que el catálogo, y luego se expande a los elementos que contienen esas palabras.
+        """
+        similares = [self._palabras_similares(termino) for termino in terminos]
+        if not all(similares):
+            return []
+
+        if len(terminos) == 1:
+            # Un solo término: recorrer las palabras de mayor a menor similitud hasta completar k
+            resultado = []
+            for palabra in sorted(similares[0], key=similares[0].get, reverse=True):
+                for clave in self._ordenados_por_prefijo(self._palabras, palabra):
+                    if len(resultado) >= k:
+                        return resultado
+                    if clave not in excluir and clave not in resultado:
+                        resultado.append(clave)
+            return resultado
+
+        # Varios términos: intersectar los elementos de cada término y puntuar por similitud total
+        conjuntos = [set().union(*(self._palabras[p] for p in s)) for s in similares]
+        candidatos = set.intersection(*sorted(conjuntos, key=len)) - excluir
+
+        def puntaje(clave):
+            palabras = self._entradas[clave][1]
+            total = sum(max(s.get(p, 0) for p in palabras) for s in similares)
+            return (total, self._entradas[clave][3])
+
+        return heapq.nlargest(k, candidatos, key=puntaje)
+
+    def buscar(self, consulta, k=10):
+        """Retorna los datos de los k mejores resultados para la consulta
+
+        Primero se buscan coincidencias por prefijo de palabra (el código exacto y los
+        prefijos de código van primero); si no alcanzan, se completa con coincidencias
+        aproximadas por trigramas, que toleran errores de tipeo en nombres.
+        """
+        consulta = normalizar(consulta)
+        terminos = consulta.split()
+        if not terminos:
+            return []
+
+        claves = self._coincidencias_prefijo(consulta, terminos, k)
+        if len(claves) < k and len(consulta) >= 3 and not any(c.isdigit() for c in consulta):
+            claves += self._coincidencias_aproximadas(terminos, set(claves), k - len(claves))
+
+        return [self._entradas[clave][4] for clave in claves]
+
+class IndiceCatalogo:
+    """Índice de búsqueda que se reconstruye cuando cambia el catálogo de origen
+
+    Solo la primera búsqueda espera la carga del catálogo. Después, un cambio local (version) o,
+    cada intervalo_comprobacion segundos, un cambio de la versión del catálogo en la base
+    (version_base, que refleja también los cambios de otras instancias) se atiende en un hilo
+    aparte; mientras tanto las búsquedas siguen usando el índice anterior.
+    """
+
+    # Segundos entre comprobaciones de la versión del catálogo en la base
+    intervalo_comprobacion = 5
+
+    def __init__(self, cargar, campos, version, version_base):
+        # cargar: retorna (versión en la base, filas del catálogo); campos: retorna (clave, campos)
+        # de una fila; version: contador de cambios locales; version_base: versión en la base
+        self._cargar = cargar
+        self._campos = campos
+        self._version = version
+        self._version_base = version_base
+        self._indice = IndiceBusqueda()
+        self._version_indexada = None
+        self._version_base_indexada = None
+        self._cargado_en = None
+        self._comprobado_en = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def _vigente(self):
+        """Indica si el índice refleja la versión local y fue comprobado contra la base hace poco"""
+        return (
+            self._version_indexada == self._version()
+            and time.monotonic() - self._comprobado_en < self.intervalo_comprobacion
+        )
+
+    def reconstruir(self):
+        """Vuelve a cargar el catálogo e indexarlo"""
+        version = self._version()
+        version_base, filas = self._cargar()
+        indice = IndiceBusqueda()
+        indice.reconstruir((*self._campos(fila), fila) for fila in filas)
+
+        with self._lock:
+            self._indice = indice
+            self._version_indexada = version
+            self._version_base_indexada = version_base
+            self._cargado_en = self._comprobado_en = time.monotonic()
+        logger.info("Índice de búsqueda reconstruido con %s elementos", len(indice))
+
+    def _actualizar(self):
+        """Reconstruye el índice si cambió el catálogo (se ejecuta en el hilo de actualización)"""
+        try:
+            if self._version_indexada == self._version():
+                version_base = self._version_base()
+                if version_base is not None and version_base == self._version_base_indexada:
+                    with self._lock:
+                        self._comprobado_en = time.monotonic()
+                    return
+            self.reconstruir()
+        except Exception as e:
+            # Seguir con el índice anterior y reintentar en la próxima comprobación
+            logger.warning("No se pudo actualizar el índice de búsqueda: %s", e)
+            with self._lock:
+                self._comprobado_en = time.monotonic()
+
+    def buscar(self, consulta, k=10):
+        """Retorna los k mejores elementos del catálogo para la consulta"""
+        if self._cargado_en is None:
+            self.reconstruir()
+        elif not self._vigente():
+            with self._lock:
+                if self._hilo is None or not self._hilo.is_alive():
+                    self._hilo = threading.Thread(target=self._actualizar, name='indice-busqueda', daemon=True)
+                    self._hilo.start()
+        return self._indice.buscar(consulta, k)
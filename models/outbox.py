@@ -0,0 +1,154 @@
+"""
+Lectura de la bandeja de salida (outbox) de cambios con posiciones durables por consumidor
+
+Los triggers de database/db_schema.py escriben en outbox, dentro de la misma transacción, cada
+alta o baja de pesajes y cada alta o modificación del catálogo. Un consumidor lee por ID a partir
+de su última posición confirmada (solo las filas nuevas, por clave primaria) y la guarda en
+outbox_consumidores al confirmar cada lote: la entrega es al menos una vez.
+
+Como los IDs se asignan al insertar y no al confirmar, una transacción larga puede hacer visible
+un evento después de otros con ID mayor. Los IDs salteados se recuerdan como huecos y se vuelven
+a buscar durante espera_huecos_s; pasado ese tiempo se descartan (p. ej. transacciones revertidas).
+"""
+import json
+import logging
+import time
+from models.repository import Repository
+
+logger = logging.getLogger('outbox')
+
+# Eventos por lectura
+TAMANO_LOTE = 500
+
+# Segundos durante los que se vuelve a buscar un ID salteado
+ESPERA_HUECOS_S = 60
+
+# Máximo de huecos recordados por consumidor (un salto mayor de IDs no se sigue)
+MAX_HUECOS = 10000
+
+class ConsumidorOutbox(Repository):
+    """Lee los cambios del outbox en lotes a partir de la posición confirmada de un consumidor"""
+
+    def __init__(self, nombre, tamano_lote=TAMANO_LOTE, espera_huecos_s=ESPERA_HUECOS_S):
+        super().__init__()
+        self.nombre = nombre
+        self.tamano_lote = tamano_lote
+        self.espera_huecos = espera_huecos_s
+        self.ultimo_id = 0
+        # ID salteado -> momento (time.time()) en que se detectó
+        self.huecos = {}
+        self._pendiente = None
+        self._incremento = None
+        self._cargar_posicion()
+
+    def _cargar_posicion(self):
+        """Lee la posición confirmada del consumidor (un consumidor nuevo empieza desde el principio)"""
+        fila = self.db.execute_query(
+            "SELECT ultimo_id, huecos FROM outbox_consumidores WHERE consumidor = %s",
+            (self.nombre,), fetchall=False
+        )
+        if fila:
+            self.ultimo_id = fila['ultimo_id']
+            self.huecos = {int(i): t for i, t in json.loads(fila['huecos'] or '{}').items()}
+
+    def leer(self):
+        """Retorna el próximo lote de eventos (dicts con id, tabla, operacion, clave, datos y fecha)
+
+        El lote queda pendiente hasta confirmar(); si no se confirma, la próxima lectura en otro
+        proceso lo vuelve a entregar.
+        """
+        columnas = "SELECT id, tabla, operacion, clave, datos, fecha FROM outbox"
+        huecos = dict(self.huecos)
+        # Leer en una transacción que termina con commit: la conexión no usa autocommit y, si no,
+        # las lecturas siguientes seguirían viendo la misma instantánea sin los eventos nuevos
+        with self.db.transaction() as cursor:
+            if self._incremento is None:
+                cursor.execute("SELECT @@auto_increment_increment AS incremento")
+                self._incremento = cursor.fetchone()['incremento']
+            cursor.execute(f"{columnas} WHERE id > %s ORDER BY id LIMIT %s", (self.ultimo_id, self.tamano_lote))
+            eventos = cursor.fetchall()
+            if huecos:
+                marcadores = ", ".join(["%s"] * len(huecos))
+                cursor.execute(f"{columnas} WHERE id IN ({marcadores})", tuple(huecos))
+                recuperados = cursor.fetchall()
+                for evento in recuperados:
+                    del huecos[evento['id']]
+                eventos = recuperados + eventos
+
+        ahora = time.time()
+        ultimo_id = self.ultimo_id
+        for evento in eventos:
+            if evento['id'] <= ultimo_id:
+                continue
+            # Los IDs que faltan entre el último visto y éste pueden pertenecer a transacciones abiertas
+            salto = (evento['id'] - ultimo_id) // self._incremento - 1
+            if ultimo_id and 0 < salto <= MAX_HUECOS - len(huecos):
+                for hueco in range(ultimo_id + self._incremento, evento['id'], self._incremento):
+                    huecos[hueco] = ahora
+            elif ultimo_id and salto > 0:
+                logger.warning("Outbox %s: %s IDs salteados después de %s no se siguen", self.nombre, salto, ultimo_id)
+            ultimo_id = evento['id']
+
+        # Descartar los huecos que no aparecieron a tiempo
+        vencidos = [i for i, detectado in huecos.items() if ahora - detectado > self.espera_huecos]
+        for hueco in vencidos:
+            del huecos[hueco]
+        if vencidos:
+            logger.debug("Outbox %s: %s huecos descartados", self.nombre, len(vencidos))
+
+        for evento in eventos:
+            evento['datos'] = json.loads(evento['datos'])
+        self._pendiente = (ultimo_id, huecos)
+        return eventos
+
+    def confirmar(self):
+        """Guarda como posición del consumidor la alcanzada por la última lectura"""
+        if self._pendiente is None:
+            return
+        ultimo_id, huecos = self._pendiente
+        self._pendiente = None
+        if ultimo_id == self.ultimo_id and huecos == self.huecos:
+            return
+        self.db.execute_query("""
+            INSERT INTO outbox_consumidores (consumidor, ultimo_id, huecos) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE ultimo_id = VALUES(ultimo_id), huecos = VALUES(huecos)
+        """, (self.nombre, ultimo_id, json.dumps(huecos) if huecos else None))
+        self.ultimo_id, self.huecos = ultimo_id, huecos
+
+    def seguir(self, procesar, intervalo_s=1.0, detener=None):
+        """Entrega lotes a procesar(eventos) y los confirma, esperando intervalo_s cuando no hay novedades
+
+        Corre hasta que se active el Event detener (o indefinidamente). Si procesar lanza una
+        excepción, el lote no se confirma y la excepción se propaga.
+        """
+        while detener is None or not detener.is_set():
+            eventos = self.leer()
+            if eventos:
+                procesar(eventos)
+            self.confirmar()
+            if len(eventos) < self.tamano_lote:
+                if detener is not None:
+                    detener.wait(intervalo_s)
+                else:
+                    time.sleep(intervalo_s)
+
+    @staticmethod
+    def purgar(retencion_dias=7, tamano_lote=10000):
+        """Elimina los eventos ya confirmados por todos los consumidores y más antiguos que la retención"""
+        db = Repository().db
+        fila = db.execute_query("SELECT MIN(ultimo_id) AS minimo FROM outbox_consumidores", fetchall=False)
+        if not fila or fila['minimo'] is None:
+            return 0
+        total = 0
+        while True:
+            with db.transaction() as cursor:
+                cursor.execute(
+                    "DELETE FROM outbox WHERE id <= %s AND fecha < NOW(3) - INTERVAL %s DAY LIMIT %s",
+                    (fila['minimo'], retencion_dias, tamano_lote)
+                )
+                borradas = cursor.rowcount
+            total += borradas
+            if borradas < tamano_lote:
+                break
+        logger.info("Outbox: %s eventos purgados", total)
+        return total
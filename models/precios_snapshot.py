@@ -0,0 +1,95 @@
+"""
+Instantánea en memoria de los productos activos y sus precios vigentes
+"""
+import logging
+import threading
+import time
+from database.db_connector import DatabaseConnector
+
+logger = logging.getLogger('precios_snapshot')
+
+class PreciosSnapshot:
+    """Instantánea versionada del catálogo de productos para resolver precios sin consultar la base"""
+
+    _instance = None
+
+    # Segundos entre comprobaciones de la versión del catálogo en la base; cubre los cambios de
+    # precio o de estado hechos desde otra instancia de la aplicación sin consultar en cada pesaje
+    intervalo_comprobacion = 2
+
+    def __new__(cls):
+        """Implementación de patrón Singleton para compartir la instantánea en todo el proceso"""
+        if cls._instance is None:
+            cls._instance = super(PreciosSnapshot, cls).__new__(cls)
+            cls._instance._productos = {}
+            cls._instance._version = 0
+            cls._instance._cargado_en = None
+            cls._instance._version_catalogo = None
+            cls._instance._lock = threading.Lock()
+            # Una lectura de la base a la vez (comparte el pool de catálogos con los índices de búsqueda)
+            cls._instance._lock_lectura = threading.Lock()
+        return cls._instance
+
+    @property
+    def version(self):
+        """Versión de la instantánea; cambia cada vez que se recarga el catálogo"""
+        return self._version
+
+    def _consultar(self, con_productos):
+        """Lee la versión del catálogo y, si se pide, los productos activos en una misma transacción"""
+        query = "SELECT * FROM productos WHERE activo = TRUE" if con_productos else None
+        return DatabaseConnector().leer_con_version('productos', query)
+
+    def _vigente(self):
+        """Indica si la instantánea cargada todavía puede usarse
+
+        Dentro del intervalo de comprobación se confía en la instantánea; pasado ese intervalo se
+        compara la versión del catálogo con la de la carga y solo se recarga si cambió. Si otro
+        hilo ya está comprobando, se usa la instantánea actual.
+        """
+        if self._cargado_en is None:
+            return False
+        if time.monotonic() - self._cargado_en < self.intervalo_comprobacion:
+            return True
+        if not self._lock_lectura.acquire(blocking=False):
+            return True
+        try:
+            version, _ = self._consultar(False)
+        finally:
+            self._lock_lectura.release()
+        if version is None or version != self._version_catalogo:
+            return False
+        with self._lock:
+            self._cargado_en = time.monotonic()
+        return True
+
+    def recargar(self):
+        """Carga los productos activos desde la base de datos"""
+        with self._lock_lectura:
+            version, productos = self._consultar(True)
+
+        with self._lock:
+            self._productos = {p['codigo']: p for p in productos}
+            self._version_catalogo = version
+            self._version += 1
+            self._cargado_en = time.monotonic()
+
+        logger.info("Instantánea de precios cargada (versión %s, %s productos)", self._version, len(self._productos))
+
+    def invalidar(self):
+        """Marca la instantánea como desactualizada; se recargará en el próximo acceso"""
+        with self._lock:
+            self._cargado_en = None
+
+    def get_producto(self, codigo):
+        """Obtiene los datos del producto activo con el código indicado, o None si no existe"""
+        if not self._vigente():
+            self.recargar()
+        return self._productos.get(codigo)
+
+    def get_precio(self, codigo):
+        """Obtiene el precio por kg vigente del producto, o None si no existe"""
+        producto = self.get_producto(codigo)
+        if producto:
+            return producto.get('precio_kg')
+        return None
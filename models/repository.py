@@ -1,25 +1,58 @@
 """
 Repositorio para acceder a los datos de la base de datos MySQL
 """
+from datetime import datetime
+from decimal import Decimal
+from database.coalescedor import CoalescedorEscrituras
 from database.db_connector import DatabaseConnector
+from config.db_config import get_agrupacion_config
+from models.precios_snapshot import PreciosSnapshot
+from models.cache_resultados import CacheResultados
+from herramientas.metricas import RegistroMetricas
 import logging
+import threading
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('repository')
 
 class Repository:
-    """Clase base para el acceso a datos"""
+    """Clase base para el acceso a datos
+    
+    Las consultas de historial, estadísticas y exportación se marcan con replica=True para
+    que DatabaseConnector pueda resolverlas en una réplica de lectura; las escrituras y las
+    lecturas del flujo de registro van siempre a la primaria.
+    """
     
     def __init__(self):
         self.db = DatabaseConnector()
+    
+    @staticmethod
+    def _upsert_en_lotes(cursor, tabla, columnas, filas, tamano_lote):
+        """Inserta o actualiza (por clave única) las filas con sentencias de múltiples filas dentro de la transacción del cursor"""
+        marcadores = "(" + ", ".join(["%s"] * len(columnas)) + ")"
+        actualizaciones = ", ".join(f"{c} = VALUES({c})" for c in columnas if c != 'codigo')
+        for i in range(0, len(filas), tamano_lote):
+            lote = filas[i:i + tamano_lote]
+            cursor.execute(
+                f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES {', '.join([marcadores] * len(lote))} "
+                f"ON DUPLICATE KEY UPDATE {actualizaciones}",
+                [valor for fila in lote for valor in fila]
+            )
+    
+    @staticmethod
+    def _desactivar_en_lotes(cursor, tabla, codigos, tamano_lote):
+        """Desactiva (baja lógica) los registros con los códigos indicados dentro de la transacción del cursor"""
+        for i in range(0, len(codigos), tamano_lote):
+            lote = codigos[i:i + tamano_lote]
+            cursor.execute(
+                f"UPDATE {tabla} SET activo = FALSE WHERE codigo IN ({', '.join(['%s'] * len(lote))})", lote
+            )
 
 class ProductoRepository(Repository):
     """Repositorio para gestionar los datos de productos"""
     
+    # Contador de cambios del catálogo hechos desde este proceso (para invalidar índices en memoria)
+    version_catalogo = 0
+    
     def get_by_id(self, id):
         """Obtiene un producto por su ID"""
         query = "SELECT * FROM productos WHERE id = %s AND activo = TRUE"
@@ -35,13 +68,28 @@ class ProductoRepository(Repository):
         query = "SELECT * FROM productos WHERE activo = TRUE ORDER BY nombre"
         return self.db.execute_query(query)
     
+    def get_all_con_version(self):
+        """Obtiene (versión del catálogo, productos activos) leídos juntos en una conexión de pool"""
+        return self.db.leer_con_version('productos', "SELECT * FROM productos WHERE activo = TRUE ORDER BY nombre")
+    
+    def get_version(self):
+        """Obtiene la versión del catálogo de productos (cambia con cada alta, modificación o baja)"""
+        return self.db.leer_con_version('productos')[0]
+    
     def create(self, codigo, nombre, descripcion=None, precio_kg=None):
-        """Crea un nuevo producto"""
+        """Crea un nuevo producto y abre su primera vigencia de precio"""
         query = """
         INSERT INTO productos (codigo, nombre, descripcion, precio_kg)
         VALUES (%s, %s, %s, %s)
         """
-        return self.db.execute_query(query, (codigo, nombre, descripcion, precio_kg))
+        with self.db.transaction() as cursor:
+            cursor.execute(query, (codigo, nombre, descripcion, precio_kg))
+            producto_id = cursor.lastrowid
+            PrecioHistorialRepository.abrir_vigencia(cursor, codigo, precio_kg, datetime.now())
+        
+        PreciosSnapshot().invalidar()
+        ProductoRepository.version_catalogo += 1
+        return producto_id
     
     def update(self, id, nombre=None, descripcion=None, precio_kg=None, activo=None):
         """Actualiza un producto existente"""
@@ -71,16 +119,138 @@ class ProductoRepository(Repository):
         query = f"UPDATE productos SET {', '.join(update_fields)} WHERE id = %s"
         params.append(id)
         
-        return self.db.execute_query(query, tuple(params))
+        with self.db.transaction() as cursor:
+            # Si cambia el precio, cerrar la vigencia actual y abrir una nueva en la misma transacción
+            if precio_kg is not None:
+                cursor.execute(
+                    "SELECT codigo, precio_kg FROM productos WHERE id = %s FOR UPDATE", (id,)
+                )
+                actual = cursor.fetchone()
+                nuevo_precio = Decimal(str(precio_kg)).quantize(Decimal('0.01'))
+                if actual and actual['precio_kg'] != nuevo_precio:
+                    ahora = datetime.now()
+                    PrecioHistorialRepository.cerrar_vigencia(cursor, actual['codigo'], ahora)
+                    PrecioHistorialRepository.abrir_vigencia(cursor, actual['codigo'], nuevo_precio, ahora)
+            
+            cursor.execute(query, tuple(params))
+            resultado = cursor.lastrowid
+        
+        PreciosSnapshot().invalidar()
+        ProductoRepository.version_catalogo += 1
+        return resultado
     
     def delete(self, id):
         """Desactiva un producto (no lo elimina físicamente)"""
         query = "UPDATE productos SET activo = FALSE WHERE id = %s"
-        return self.db.execute_query(query, (id,))
+        resultado = self.db.execute_query(query, (id,))
+        PreciosSnapshot().invalidar()
+        ProductoRepository.version_catalogo += 1
+        return resultado
+    
+    def get_catalogo_completo(self):
+        """Obtiene todos los productos, incluidos los inactivos (para sincronizar el catálogo)"""
+        query = "SELECT codigo, nombre, descripcion, precio_kg, activo FROM productos"
+        return self.db.execute_query(query)
+    
+    def sincronizar(self, filas, codigos_baja, cambios_precio, tamano_lote=1000):
+        """Aplica en una sola transacción las altas y modificaciones, las bajas y los cambios de precio
+        
+        filas son tuplas (codigo, nombre, descripcion, precio_kg) que se insertan o actualizan
+        como activas; cambios_precio son tuplas (codigo, precio_kg) cuya vigencia se renueva.
+        """
+        ahora = datetime.now()
+        with self.db.transaction() as cursor:
+            self._upsert_en_lotes(
+                cursor, 'productos', ('codigo', 'nombre', 'descripcion', 'precio_kg', 'activo'),
+                [tuple(f) + (True,) for f in filas], tamano_lote
+            )
+            self._desactivar_en_lotes(cursor, 'productos', list(codigos_baja), tamano_lote)
+            PrecioHistorialRepository.renovar_vigencias(cursor, cambios_precio, ahora, tamano_lote)
+        
+        PreciosSnapshot().invalidar()
+        ProductoRepository.version_catalogo += 1
+
+class PrecioHistorialRepository(Repository):
+    """Repositorio para consultar el historial de precios de los productos"""
+    
+    @staticmethod
+    def abrir_vigencia(cursor, codigo_producto, precio_kg, desde):
+        """Inserta una nueva vigencia abierta dentro de la transacción del cursor"""
+        query = """
+        INSERT INTO precios_historial (codigo_producto, precio_kg, vigente_desde)
+        VALUES (%s, %s, %s)
+        """
+        cursor.execute(query, (codigo_producto, precio_kg, desde))
+    
+    @staticmethod
+    def cerrar_vigencia(cursor, codigo_producto, hasta):
+        """Cierra la vigencia abierta de un producto dentro de la transacción del cursor"""
+        query = """
+        UPDATE precios_historial SET vigente_hasta = %s
+        WHERE codigo_producto = %s AND vigente_hasta IS NULL
+        """
+        cursor.execute(query, (hasta, codigo_producto))
+    
+    @staticmethod
+    def renovar_vigencias(cursor, precios, desde, tamano_lote=1000):
+        """Cierra la vigencia abierta y abre una nueva para cada (codigo_producto, precio_kg), en lotes"""
+        precios = list(precios)
+        for i in range(0, len(precios), tamano_lote):
+            lote = precios[i:i + tamano_lote]
+            cursor.execute(
+                "UPDATE precios_historial SET vigente_hasta = %s "
+                f"WHERE vigente_hasta IS NULL AND codigo_producto IN ({', '.join(['%s'] * len(lote))})",
+                [desde] + [codigo for codigo, _ in lote]
+            )
+            cursor.execute(
+                "INSERT INTO precios_historial (codigo_producto, precio_kg, vigente_desde) VALUES "
+                + ", ".join(["(%s, %s, %s)"] * len(lote)),
+                [valor for codigo, precio in lote for valor in (codigo, precio, desde)]
+            )
+    
+    def get_precio_vigente(self, codigo_producto, fecha):
+        """Obtiene el precio por kg que estaba vigente para un producto en una fecha dada"""
+        query = """
+        SELECT codigo_producto, precio_kg, vigente_desde, vigente_hasta
+        FROM precios_historial
+        WHERE codigo_producto = %s
+          AND vigente_desde <= %s
+          AND (vigente_hasta IS NULL OR vigente_hasta > %s)
+        ORDER BY vigente_desde DESC
+        LIMIT 1
+        """
+        return self.db.execute_query(query, (codigo_producto, fecha, fecha), fetchall=False)
+    
+    def get_historial(self, codigo_producto, fecha_desde, fecha_hasta):
+        """Obtiene las vigencias de precio de un producto que se solapan con un rango de fechas"""
+        query = """
+        SELECT codigo_producto, precio_kg, vigente_desde, vigente_hasta
+        FROM precios_historial
+        WHERE codigo_producto = %s
+          AND vigente_desde <= %s
+          AND (vigente_hasta IS NULL OR vigente_hasta > %s)
+        ORDER BY vigente_desde ASC
+        """
+        return self.db.execute_query(query, (codigo_producto, fecha_hasta, fecha_desde), replica=True)
+    
+    def get_cambios_en_rango(self, fecha_desde, fecha_hasta):
+        """Obtiene todos los cambios de precio que entraron en vigencia dentro de un rango de fechas"""
+        query = """
+        SELECT h.codigo_producto, prod.nombre AS nombre_producto,
+               h.precio_kg, h.vigente_desde, h.vigente_hasta
+        FROM precios_historial h
+            JOIN productos prod ON h.codigo_producto = prod.codigo
+        WHERE h.vigente_desde BETWEEN %s AND %s
+        ORDER BY h.vigente_desde ASC
+        """
+        return self.db.execute_query(query, (fecha_desde, fecha_hasta), replica=True)
 
 class VendedorRepository(Repository):
     """Repositorio para gestionar los datos de vendedores"""
     
+    # Contador de cambios del catálogo hechos desde este proceso (para invalidar índices en memoria)
+    version_catalogo = 0
+    
     def get_by_id(self, id):
         """Obtiene un vendedor por su ID"""
         query = "SELECT * FROM vendedores WHERE id = %s AND activo = TRUE"
@@ -96,13 +266,23 @@ class VendedorRepository(Repository):
         query = "SELECT * FROM vendedores WHERE activo = TRUE ORDER BY apellido, nombre"
         return self.db.execute_query(query)
     
+    def get_all_con_version(self):
+        """Obtiene (versión del catálogo, vendedores activos) leídos juntos en una conexión de pool"""
+        return self.db.leer_con_version('vendedores', "SELECT * FROM vendedores WHERE activo = TRUE ORDER BY apellido, nombre")
+    
+    def get_version(self):
+        """Obtiene la versión del catálogo de vendedores (cambia con cada alta, modificación o baja)"""
+        return self.db.leer_con_version('vendedores')[0]
+    
     def create(self, codigo, nombre, apellido, documento=None, telefono=None):
         """Crea un nuevo vendedor"""
         query = """
         INSERT INTO vendedores (codigo, nombre, apellido, documento, telefono)
         VALUES (%s, %s, %s, %s, %s)
         """
-        return self.db.execute_query(query, (codigo, nombre, apellido, documento, telefono))
+        resultado = self.db.execute_query(query, (codigo, nombre, apellido, documento, telefono))
+        VendedorRepository.version_catalogo += 1
+        return resultado
     
     def update(self, id, nombre=None, apellido=None, documento=None, telefono=None, activo=None):
         """Actualiza un vendedor existente"""
@@ -136,16 +316,57 @@ class VendedorRepository(Repository):
         query = f"UPDATE vendedores SET {', '.join(update_fields)} WHERE id = %s"
         params.append(id)
         
-        return self.db.execute_query(query, tuple(params))
+        resultado = self.db.execute_query(query, tuple(params))
+        VendedorRepository.version_catalogo += 1
+        return resultado
     
     def delete(self, id):
         """Desactiva un vendedor (no lo elimina físicamente)"""
         query = "UPDATE vendedores SET activo = FALSE WHERE id = %s"
-        return self.db.execute_query(query, (id,))
+        resultado = self.db.execute_query(query, (id,))
+        VendedorRepository.version_catalogo += 1
+        return resultado
+    
+    def get_catalogo_completo(self):
+        """Obtiene todos los vendedores, incluidos los inactivos (para sincronizar el catálogo)"""
+        query = "SELECT codigo, nombre, apellido, documento, telefono, activo FROM vendedores"
+        return self.db.execute_query(query)
+    
+    def sincronizar(self, filas, codigos_baja, tamano_lote=1000):
+        """Aplica en una sola transacción las altas y modificaciones (codigo, nombre, apellido, documento, telefono) y las bajas"""
+        with self.db.transaction() as cursor:
+            self._upsert_en_lotes(
+                cursor, 'vendedores', ('codigo', 'nombre', 'apellido', 'documento', 'telefono', 'activo'),
+                [tuple(f) + (True,) for f in filas], tamano_lote
+            )
+            self._desactivar_en_lotes(cursor, 'vendedores', list(codigos_baja), tamano_lote)
+        
+        VendedorRepository.version_catalogo += 1
 
 class PesajeRepository(Repository):
     """Repositorio para gestionar los datos de pesajes"""
     
+    # Caché de resultados de historial y estadísticas, compartida por todas las instancias
+    cache_resultados = CacheResultados()
+    
+    # Coalescedor de inserciones compartido (si la agrupación está activa)
+    coalescedor = None
+    _lock_coalescedor = threading.Lock()
+    
+    def _coalescedor(self):
+        """Retorna el coalescedor de inserciones, o None si la agrupación no está activa"""
+        config = get_agrupacion_config()
+        if not config['activa']:
+            return None
+        with PesajeRepository._lock_coalescedor:
+            if PesajeRepository.coalescedor is None:
+                PesajeRepository.coalescedor = CoalescedorEscrituras(
+                    'pesajes', ('codigo_producto', 'peso', 'codigo_vendedor', 'precio_kg', 'observaciones', 'fecha_hora'),
+                    ventana_ms=config['ventana_ms'], max_filas=config['max_filas'],
+                    al_confirmar=self.db.registrar_escritura
+                )
+        return PesajeRepository.coalescedor
+    
     def get_by_id(self, id):
         """Obtiene un pesaje por su ID"""
         query = """
@@ -162,6 +383,26 @@ class PesajeRepository(Repository):
         """
         return self.db.execute_query(query, (id,), fetchall=False)
     
+    def get_by_ids(self, ids):
+        """Obtiene los pesajes indicados, del más reciente al más antiguo"""
+        if not ids:
+            return []
+        query = f"""
+        SELECT 
+            p.id, p.codigo_producto, prod.nombre AS nombre_producto,
+            p.peso, p.codigo_vendedor, CONCAT(v.nombre, ' ', v.apellido) AS nombre_vendedor,
+            p.fecha_hora, p.precio_kg, p.total, p.observaciones
+        FROM 
+            pesajes p
+            JOIN productos prod ON p.codigo_producto = prod.codigo
+            JOIN vendedores v ON p.codigo_vendedor = v.codigo
+        WHERE 
+            p.id IN ({', '.join(['%s'] * len(ids))})
+        ORDER BY 
+            p.id DESC
+        """
+        return self.db.execute_query(query, tuple(ids))
+    
     def get_all(self, limit=100):
         """Obtiene todos los pesajes con límite opcional"""
         query = """
@@ -196,7 +437,14 @@ class PesajeRepository(Repository):
         ORDER BY 
             p.fecha_hora ASC
         """
-        return self.db.execute_query(query, (fecha_desde, fecha_hasta))
+        clave = ('fechas', str(fecha_desde), str(fecha_hasta))
+        encontrado, resultado = self.cache_resultados.obtener(clave)
+        if encontrado:
+            return resultado
+        
+        resultado = self.db.execute_query(query, (fecha_desde, fecha_hasta), replica=True)
+        self.cache_resultados.guardar(clave, resultado, desde=fecha_desde, hasta=fecha_hasta)
+        return resultado
     
     def get_by_vendedor(self, codigo_vendedor, limit=100):
         """Obtiene pesajes de un vendedor específico"""
@@ -215,23 +463,191 @@ class PesajeRepository(Repository):
             p.fecha_hora ASC
         LIMIT %s
         """
-        return self.db.execute_query(query, (codigo_vendedor, limit))
+        clave = ('vendedor', codigo_vendedor, limit)
+        encontrado, resultado = self.cache_resultados.obtener(clave)
+        if encontrado:
+            return resultado
+        
+        resultado = self.db.execute_query(query, (codigo_vendedor, limit), replica=True)
+        self.cache_resultados.guardar(clave, resultado, vendedor=codigo_vendedor)
+        return resultado
+    
+    def get_desde_id(self, ultimo_id, fecha_desde=None, limit=5000):
+        """Obtiene los pesajes con ID mayor al indicado (opcionalmente desde una fecha), ordenados por ID"""
+        where_fecha = ""
+        params = [ultimo_id]
+        if fecha_desde:
+            where_fecha = "AND p.fecha_hora >= %s"
+            params.append(fecha_desde)
+        params.append(limit)
+        
+        query = f"""
+        SELECT 
+            p.id, p.codigo_producto, prod.nombre AS nombre_producto,
+            p.peso, p.codigo_vendedor, CONCAT(v.nombre, ' ', v.apellido) AS nombre_vendedor,
+            p.fecha_hora, p.precio_kg, p.total, p.observaciones
+        FROM 
+            pesajes p
+            JOIN productos prod ON p.codigo_producto = prod.codigo
+            JOIN vendedores v ON p.codigo_vendedor = v.codigo
+        WHERE 
+            p.id > %s {where_fecha}
+        ORDER BY 
+            p.id ASC
+        LIMIT %s
+        """
+        return self.db.execute_query(query, tuple(params), replica=True)
+    
+    def get_ultimo_id(self):
+        """Obtiene el mayor ID de pesaje existente (0 si no hay pesajes)"""
+        resultado = self.db.execute_query(
+            "SELECT COALESCE(MAX(id), 0) AS ultimo_id FROM pesajes", fetchall=False, replica=True
+        )
+        return resultado['ultimo_id']
+    
+    def iter_lotes(self, fecha_desde=None, fecha_hasta=None, tamano_lote=5000):
+        """Recorre los pesajes (opcionalmente entre dos fechas) en lotes ordenados por ID
+        
+        Usa paginación por clave (id > último visto) para que cada lote sea una consulta
+        acotada y la memoria no dependa del tamaño del rango.
+        """
+        where_fechas = ""
+        params_fechas = ()
+        if fecha_desde and fecha_hasta:
+            where_fechas = "AND p.fecha_hora BETWEEN %s AND %s"
+            params_fechas = (fecha_desde, fecha_hasta)
+        
+        query = f"""
+        SELECT 
+            p.id, p.codigo_producto, prod.nombre AS nombre_producto,
+            p.peso, p.codigo_vendedor, CONCAT(v.nombre, ' ', v.apellido) AS nombre_vendedor,
+            p.fecha_hora, p.precio_kg, p.total, p.observaciones
+        FROM 
+            pesajes p
+            JOIN productos prod ON p.codigo_producto = prod.codigo
+            JOIN vendedores v ON p.codigo_vendedor = v.codigo
+        WHERE 
+            p.id > %s {where_fechas}
+        ORDER BY 
+            p.id ASC
+        LIMIT %s
+        """
+        ultimo_id = 0
+        while True:
+            lote = self.db.execute_query(query, (ultimo_id,) + params_fechas + (tamano_lote,), replica=True)
+            if not lote:
+                return
+            yield lote
+            if len(lote) < tamano_lote:
+                return
+            ultimo_id = lote[-1]['id']
+    
+    @staticmethod
+    def _condiciones_exportacion(fecha_desde, fecha_hasta, codigo_vendedor=None, producto=None):
+        """Condiciones (sobre pesajes p y productos prod) del rango y de los filtros del historial
+        
+        producto coincide con el código exacto o con parte del nombre, como el filtro de la vista.
+        """
+        condiciones = ["p.fecha_hora >= %s", "p.fecha_hora < %s"]
+        params = [fecha_desde, fecha_hasta]
+        if codigo_vendedor:
+            condiciones.append("p.codigo_vendedor = %s")
+            params.append(codigo_vendedor)
+        if producto:
+            patron = producto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            condiciones.append("(p.codigo_producto = %s OR prod.nombre LIKE %s)")
+            params += [producto, f"%{patron}%"]
+        return ' AND '.join(condiciones), tuple(params)
+    
+    def contar(self, fecha_desde, fecha_hasta, codigo_vendedor=None, producto=None):
+        """Cuenta los pesajes en el rango [fecha_desde, fecha_hasta), opcionalmente filtrados por vendedor y producto"""
+        where, params = self._condiciones_exportacion(fecha_desde, fecha_hasta, codigo_vendedor, producto)
+        join = "JOIN productos prod ON p.codigo_producto = prod.codigo" if producto else ""
+        resultado = self.db.execute_query(
+            f"SELECT COUNT(*) AS cantidad FROM pesajes p {join} WHERE {where}",
+            params, fetchall=False, replica=True
+        )
+        return resultado['cantidad']
+    
+    def iter_tramo(self, connection, fecha_desde, fecha_hasta, tamano_lote=20000, codigo_vendedor=None, producto=None):
+        """Recorre los pesajes del rango [fecha_desde, fecha_hasta) con una conexión dada, en lotes de tuplas
+        
+        Las filas se leen en modo streaming (cursor sin búfer) en el orden de las columnas de
+        exportación; pensado para leer varios tramos a la vez, cada uno con su conexión.
+        """
+        where, params = self._condiciones_exportacion(fecha_desde, fecha_hasta, codigo_vendedor, producto)
+        query = f"""
+        SELECT 
+            p.id, p.fecha_hora, p.codigo_producto, prod.nombre AS nombre_producto,
+            p.peso, p.codigo_vendedor, CONCAT(v.nombre, ' ', v.apellido) AS nombre_vendedor,
+            p.precio_kg, p.total, p.observaciones
+        FROM 
+            pesajes p
+            JOIN productos prod ON p.codigo_producto = prod.codigo
+            JOIN vendedores v ON p.codigo_vendedor = v.codigo
+        WHERE 
+            {where}
+        ORDER BY 
+            p.fecha_hora ASC, p.id ASC
+        """
+        cursor = connection.cursor(buffered=False)
+        try:
+            cursor.execute(query, params)
+            while True:
+                lote = cursor.fetchmany(tamano_lote)
+                if not lote:
+                    return
+                yield lote
+        finally:
+            cursor.close()
     
     def create(self, codigo_producto, peso, codigo_vendedor, precio_kg=None, observaciones=None):
         """Crea un nuevo registro de pesaje"""
         
-        # Si no se proporciona el precio_kg, obtenerlo del producto
+        # Si no se proporciona el precio_kg, resolverlo desde la instantánea de precios
         if precio_kg is None:
-            prod_repo = ProductoRepository()
-            producto = prod_repo.get_by_codigo(codigo_producto)
-            if producto:
-                precio_kg = producto.get('precio_kg')
+            precio_kg = PreciosSnapshot().get_precio(codigo_producto)
         
+        # La fecha se fija aquí con el reloj del servidor (sin fracción, como la guarda la columna
+        # TIMESTAMP) para invalidar la caché con el mismo valor que queda escrito
+        fecha_hora = self.db.hora_servidor()
+        fila = (codigo_producto, peso, codigo_vendedor, precio_kg, observaciones, fecha_hora)
+        coalescedor = self._coalescedor()
+        if coalescedor is not None:
+            # Se agrupa con las inserciones concurrentes en un solo commit
+            pesaje_id = coalescedor.insertar(fila)
+        else:
+            query = """
+            INSERT INTO pesajes (codigo_producto, peso, codigo_vendedor, precio_kg, observaciones, fecha_hora)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """
+            pesaje_id = self.db.execute_query(query, fila)
+        self.cache_resultados.invalidar(fecha_hora, codigo_vendedor)
+        return pesaje_id
+    
+    def create_many(self, pesajes):
+        """Crea varios registros de pesaje (codigo_producto, peso, codigo_vendedor, precio_kg, observaciones) con un único commit"""
         query = """
-        INSERT INTO pesajes (codigo_producto, peso, codigo_vendedor, precio_kg, observaciones)
-        VALUES (%s, %s, %s, %s, %s)
+        INSERT INTO pesajes (codigo_producto, peso, codigo_vendedor, precio_kg, observaciones, fecha_hora)
+        VALUES (%s, %s, %s, %s, %s, %s)
         """
-        return self.db.execute_query(query, (codigo_producto, peso, codigo_vendedor, precio_kg, observaciones))
+        fecha_hora = self.db.hora_servidor()
+        # executemany reescribe los INSERT como una sentencia de múltiples filas
+        resultado = self.db.execute_many(query, [tuple(p) + (fecha_hora,) for p in pesajes])
+        for codigo_vendedor in {p[2] for p in pesajes}:
+            self.cache_resultados.invalidar(fecha_hora, codigo_vendedor)
+        return resultado
+    
+    def delete(self, id):
+        """Elimina un registro de pesaje (usado para deshacer registros recientes)"""
+        pesaje = self.db.execute_query(
+            "SELECT fecha_hora, codigo_vendedor FROM pesajes WHERE id = %s", (id,), fetchall=False
+        )
+        query = "DELETE FROM pesajes WHERE id = %s"
+        resultado = self.db.execute_query(query, (id,))
+        if pesaje:
+            self.cache_resultados.invalidar(pesaje['fecha_hora'], pesaje['codigo_vendedor'])
+        return resultado
     
     def get_estadisticas_vendedores(self, fecha_desde=None, fecha_hasta=None):
         """Obtiene estadísticas de pesajes por vendedor"""
@@ -261,4 +677,28 @@ class PesajeRepository(Repository):
             SUM(p.peso) DESC
         """
         
-        return self.db.execute_query(query, tuple(params))
\ No newline at end of file
+        clave = ('estadisticas', str(fecha_desde), str(fecha_hasta))
+        encontrado, resultado = self.cache_resultados.obtener(clave)
+        if encontrado:
+            return resultado
+        
+        resultado = self.db.execute_query(query, tuple(params), replica=True)
+        if fecha_desde and fecha_hasta:
+            self.cache_resultados.guardar(clave, resultado, desde=fecha_desde, hasta=fecha_hasta)
+        else:
+            self.cache_resultados.guardar(clave, resultado)
+        return resultado
+
+# Métricas de la caché de resultados (se leen de la caché compartida al exportar)
+RegistroMetricas().medidor(
+    'carni_cache_resultados_aciertos_total', "Consultas resueltas desde la caché de resultados", tipo='counter'
+).observar(lambda: PesajeRepository.cache_resultados.aciertos)
+RegistroMetricas().medidor(
+    'carni_cache_resultados_fallos_total', "Consultas que no estaban en la caché de resultados", tipo='counter'
+).observar(lambda: PesajeRepository.cache_resultados.fallos)
+RegistroMetricas().medidor(
+    'carni_cache_resultados_tasa_aciertos', "Proporción de consultas resueltas desde la caché de resultados"
+).observar(lambda: PesajeRepository.cache_resultados.estadisticas()['tasa_aciertos'])
+RegistroMetricas().medidor(
+    'carni_cache_resultados_bytes', "Memoria estimada ocupada por la caché de resultados"
+).observar(lambda: PesajeRepository.cache_resultados.estadisticas()['bytes'])
@@ -0,0 +1,129 @@
+"""
+Series de kilos por vendedor (y producto) en intervalos de hora, día y semana
+
+La tabla series_kilos se mantiene con triggers sobre pesajes (ver database/db_schema.py) y
+puede reconstruirse para un rango con reconstruir(). Las consultas eligen la resolución más fina
+que no supere unos pocos intervalos por punto y agrupan en la base hasta la cantidad de puntos
+pedida, de modo que el costo depende de los puntos devueltos y no de los pesajes del rango.
+"""
+import logging
+from datetime import datetime, timedelta
+from models.cache_resultados import a_datetime
+from models.repository import Repository
+
+logger = logging.getLogger('series_kilos')
+
+# Resoluciones disponibles y su duración
+RESOLUCIONES = (
+    ('hora', timedelta(hours=1)),
+    ('dia', timedelta(days=1)),
+    ('semana', timedelta(weeks=1)),
+)
+
+# Máximo de intervalos de la tabla que se agrupan en un punto antes de pasar a la resolución siguiente
+INTERVALOS_POR_PUNTO = 4
+
+# Código de producto que acumula todos los productos del vendedor
+TODOS_LOS_PRODUCTOS = ''
+
+def inicio_semana(fecha):
+    """Lunes 00:00 de la semana de la fecha"""
+    dia = datetime(fecha.year, fecha.month, fecha.day)
+    return dia - timedelta(days=dia.weekday())
+
+def elegir_resolucion(desde, hasta, puntos):
+    """Retorna (resolucion, ancho_punto) para cubrir [desde, hasta) con a lo sumo 'puntos' puntos"""
+    rango = hasta - desde
+    for nombre, duracion in RESOLUCIONES:
+        if rango / duracion <= puntos * INTERVALOS_POR_PUNTO:
+            break
+    # Ancho de cada punto: múltiplo entero de la resolución elegida
+    intervalos = max(1, -(-rango // (duracion * puntos)))
+    return nombre, duracion * intervalos
+
+class SeriesKilos(Repository):
+    """Consultas y mantenimiento de las series de kilos"""
+
+    def consultar(self, fecha_desde, fecha_hasta, puntos=200, codigo_vendedor=None, codigo_producto=None):
+        """Serie de kilos de cada vendedor en [fecha_desde, fecha_hasta), con a lo sumo 'puntos' puntos
+
+        Retorna {'resolucion', 'ancho', 'inicios', 'series': {codigo_vendedor: [kilos por punto]}};
+        los puntos sin pesajes valen 0.
+        """
+        desde, hasta = a_datetime(fecha_desde), a_datetime(fecha_hasta)
+        resolucion, ancho = elegir_resolucion(desde, hasta, puntos)
+        # Alinear al comienzo del intervalo para no perder el primero, que empieza antes de 'desde'
+        if resolucion == 'hora':
+            desde = desde.replace(minute=0, second=0, microsecond=0)
+        elif resolucion == 'dia':
+            desde = desde.replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            desde = inicio_semana(desde)
+        segundos_punto = int(ancho.total_seconds())
+        cantidad = max(1, -(-int((hasta - desde).total_seconds()) // segundos_punto))
+
+        condiciones = ["resolucion = %s", "codigo_producto = %s", "inicio >= %s", "inicio < %s"]
+        params = [desde, segundos_punto, resolucion, codigo_producto or TODOS_LOS_PRODUCTOS, desde, hasta]
+        if codigo_vendedor:
+            condiciones.append("codigo_vendedor = %s")
+            params.append(codigo_vendedor)
+
+        query = f"""
+        SELECT codigo_vendedor,
+               FLOOR(TIMESTAMPDIFF(SECOND, %s, inicio) / %s) AS punto,
+               SUM(kilos) AS kilos
+        FROM series_kilos
+        WHERE {' AND '.join(condiciones)}
+        GROUP BY codigo_vendedor, punto
+        """
+        series = {}
+        for fila in self.db.execute_query(query, tuple(params), replica=True):
+            serie = series.setdefault(fila['codigo_vendedor'], [0.0] * cantidad)
+            punto = int(fila['punto'])
+            if 0 <= punto < cantidad:
+                serie[punto] = float(fila['kilos'])
+
+        return {
+            'resolucion': resolucion,
+            'ancho': ancho,
+            'inicios': [desde + ancho * i for i in range(cantidad)],
+            'series': series,
+        }
+
+    def reconstruir(self, fecha_desde=None, fecha_hasta=None):
+        """Recalcula las series de un rango (todas, si no se indica) a partir de pesajes
+
+        El rango se amplía a semanas completas para que los intervalos semanales queden exactos.
+        La reconstrucción ocurre en una transacción: las lecturas ven las series anteriores
+        hasta que termina.
+        """
+        condicion = ""
+        params = ()
+        if fecha_desde is not None or fecha_hasta is not None:
+            desde = inicio_semana(a_datetime(fecha_desde or datetime(1970, 1, 5)))
+            hasta = inicio_semana(a_datetime(fecha_hasta or datetime.now()) + timedelta(weeks=1))
+            condicion = "fecha_hora >= %s AND fecha_hora < %s"
+            params = (desde, hasta)
+
+        inicios = {
+            'hora': "TIMESTAMP(DATE(fecha_hora), MAKETIME(HOUR(fecha_hora), 0, 0))",
+            'dia': "TIMESTAMP(DATE(fecha_hora))",
+            'semana': "TIMESTAMP(DATE(fecha_hora) - INTERVAL WEEKDAY(fecha_hora) DAY)",
+        }
+        with self.db.transaction() as cursor:
+            if condicion:
+                cursor.execute(f"DELETE FROM series_kilos WHERE {condicion.replace('fecha_hora', 'inicio')}", params)
+            else:
+                cursor.execute("DELETE FROM series_kilos")
+            for resolucion, inicio in inicios.items():
+                for producto in ("codigo_producto", "''"):
+                    cursor.execute(f"""
+                        INSERT INTO series_kilos
+                            (resolucion, codigo_vendedor, codigo_producto, inicio, kilos, pesajes, importe)
+                        SELECT %s, codigo_vendedor, {producto}, {inicio},
+                               SUM(peso), COUNT(*), IFNULL(SUM(peso * precio_kg), 0)
+                        FROM pesajes
+                        {'WHERE ' + condicion if condicion else ''}
+                        GROUP BY codigo_vendedor, {producto}, {inicio}
+                    """, (resolucion,) + params)
+        logger.info("Series de kilos reconstruidas%s", f" entre {params[0]} y {params[1]}" if params else "")
@@ -0,0 +1,582 @@
+"""
+Punto de entrada en modo servicio (sin interfaz gráfica) para el sistema de registro de pesajes
+
+Ejemplos:
+    python servicio.py escanear --fuente stdin --vendedor V001
+    python servicio.py escanear --fuente fifo:/tmp/etiquetas
+    python servicio.py escanear --fuente socket:/tmp/etiquetas.sock --lote 500
+    python servicio.py cierre --fecha 2025-03-01
+    python servicio.py sincronizar precios.csv --catalogo productos
+    python servicio.py outbox --consumidor erp --destino archivo:cambios.jsonl --seguir
+    python servicio.py estaciones --estacion mostrador1=fifo:/tmp/m1 --estacion mostrador2=socket:/tmp/m2.sock
+    python servicio.py analitica --desde 2024-03-01 --dimension producto --exacto
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import re
+import socket
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, timedelta
+from controllers.etiquetas import decodificar_etiqueta
+from controllers.pesaje_core import PesajeControllerCore, RECIENTES_POR_ESTACION
+from controllers.sincronizacion_catalogo import SincronizacionCatalogo
+from database.db_connector import DatabaseConnector
+from models.bocetos import BocetosDiarios, CUANTILES
+from models.outbox import ConsumidorOutbox
+from config.logging_config import configurar_logging
+from herramientas import metricas, perfilador
+
+logger = logging.getLogger('servicio')
+
+# Marca de fin de la entrada
+FIN_ENTRADA = None
+
+# Separadores admitidos entre la etiqueta y el código de vendedor
+SEPARADOR_EVENTO = re.compile(r'[;,\s]+')
+
+class EstadisticasServicio:
+    """Contadores de rendimiento del servicio de escaneo"""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.leidos = 0
+        self.registrados = 0
+        self.rechazados = 0
+        self.lotes = 0
+        self._ultimo_reporte = self.inicio
+        self._registrados_ultimo_reporte = 0
+
+    def reporte(self, cola):
+        """Construye una línea con el estado y el rendimiento actual"""
+        ahora = time.monotonic()
+        intervalo = max(ahora - self._ultimo_reporte, 1e-9)
+        total = max(ahora - self.inicio, 1e-9)
+        tasa_intervalo = (self.registrados - self._registrados_ultimo_reporte) / intervalo
+        self._ultimo_reporte = ahora
+        self._registrados_ultimo_reporte = self.registrados
+
+        lote_promedio = self.registrados / self.lotes if self.lotes else 0
+        return (
+            f"leidos={self.leidos} registrados={self.registrados} rechazados={self.rechazados} "
+            f"pesajes/s={tasa_intervalo:.1f} (promedio {self.registrados / total:.1f}) "
+            f"lote_promedio={lote_promedio:.1f} cola={cola.qsize()}"
+        )
+
+def interpretar_evento(linea, vendedor_por_defecto):
+    """Convierte una línea 'ETIQUETA[;VENDEDOR]' en (codigo_producto, peso, codigo_vendedor) o None"""
+    partes = [p for p in SEPARADOR_EVENTO.split(linea.strip()) if p]
+    if not partes:
+        return None
+
+    etiqueta = decodificar_etiqueta(partes[0])
+    codigo_vendedor = partes[1] if len(partes) > 1 else vendedor_por_defecto
+    if not etiqueta or not codigo_vendedor:
+        return None
+
+    codigo_producto, peso = etiqueta
+    return codigo_producto, peso, codigo_vendedor
+
+def leer_flujo(flujo, cola):
+    """Lee líneas de un flujo de texto y las encola; la cola llena bloquea la lectura (contrapresión)"""
+    for linea in flujo:
+        if linea.strip():
+            cola.put(linea)
+
+def leer_stdin(cola, detener):
+    """Lee eventos de la entrada estándar hasta EOF"""
+    leer_flujo(sys.stdin, cola)
+    cola.put(FIN_ENTRADA)
+
+def leer_fifo(ruta, cola, detener):
+    """Lee eventos de una FIFO, reabriéndola cada vez que el escritor la cierra"""
+    if not os.path.exists(ruta):
+        os.mkfifo(ruta)
+
+    while not detener.is_set():
+        with open(ruta, 'r', encoding='utf-8') as fifo:
+            leer_flujo(fifo, cola)
+
+def leer_socket(ruta, cola, detener):
+    """Acepta conexiones en un socket Unix local y lee eventos de cada una en su propio hilo"""
+    if os.path.exists(ruta):
+        os.unlink(ruta)
+
+    servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    servidor.bind(ruta)
+    servidor.listen()
+    servidor.settimeout(1.0)
+
+    def atender(conexion):
+        with conexion, conexion.makefile('r', encoding='utf-8') as flujo:
+            leer_flujo(flujo, cola)
+
+    try:
+        while not detener.is_set():
+            try:
+                conexion, _ = servidor.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(target=atender, args=(conexion,), daemon=True).start()
+    finally:
+        servidor.close()
+        os.unlink(ruta)
+
+def iniciar_lector(fuente, cola, detener):
+    """Inicia el hilo lector correspondiente a la fuente indicada (stdin, fifo:RUTA o socket:RUTA)"""
+    if fuente == 'stdin':
+        destino, args = leer_stdin, (cola, detener)
+    elif fuente.startswith('fifo:'):
+        destino, args = leer_fifo, (fuente[len('fifo:'):], cola, detener)
+    elif fuente.startswith('socket:'):
+        destino, args = leer_socket, (fuente[len('socket:'):], cola, detener)
+    else:
+        raise ValueError(f"Fuente de eventos no válida: {fuente}")
+
+    hilo = threading.Thread(target=destino, args=args, name='lector-eventos', daemon=True)
+    hilo.start()
+    return hilo
+
+def tomar_lote(cola, tamano_lote, espera):
+    """Toma hasta tamano_lote eventos de la cola, esperando como máximo 'espera' segundos tras el primero
+
+    Retorna (lote, fin) donde fin indica que se alcanzó el final de la entrada.
+    """
+    try:
+        primero = cola.get(timeout=1.0)
+    except queue.Empty:
+        return [], False
+    if primero is FIN_ENTRADA:
+        return [], True
+
+    lote = [primero]
+    limite = time.monotonic() + espera
+    while len(lote) < tamano_lote:
+        restante = limite - time.monotonic()
+        try:
+            evento = cola.get(timeout=restante) if restante > 0 else cola.get_nowait()
+        except queue.Empty:
+            break
+        if evento is FIN_ENTRADA:
+            return lote, True
+        lote.append(evento)
+
+    return lote, False
+
+def comando_escanear(args):
+    """Registra pesajes a partir de eventos de etiquetas, en lotes y con contrapresión"""
+    controller = PesajeControllerCore()
+    controller.error_ocurrido.connect(lambda mensaje: logger.error(mensaje))
+
+    cola = queue.Queue(maxsize=args.cola)
+    metricas.RegistroMetricas().medidor(
+        'carni_servicio_eventos_pendientes', "Eventos leídos a la espera de registrarse"
+    ).observar(cola.qsize)
+    detener = threading.Event()
+    iniciar_lector(args.fuente, cola, detener)
+
+    estadisticas = EstadisticasServicio()
+    proximo_reporte = time.monotonic() + args.estadisticas_cada
+    fin = False
+
+    try:
+        while not fin:
+            lote, fin = tomar_lote(cola, args.lote, args.espera_ms / 1000)
+
+            pesajes = []
+            for linea in lote:
+                estadisticas.leidos += 1
+                evento = interpretar_evento(linea, args.vendedor)
+                if evento is None:
+                    estadisticas.rechazados += 1
+                    logger.warning("Evento no válido: %r", linea.strip())
+                    continue
+                pesajes.append(evento + (None,))
+
+            if pesajes:
+                registrados, rechazados = controller.registrar_pesajes_lote(pesajes)
+                estadisticas.registrados += registrados
+                estadisticas.rechazados += len(rechazados)
+                estadisticas.lotes += 1
+                for codigo_producto, codigo_vendedor, motivo in rechazados:
+                    logger.warning("Pesaje rechazado (%s, %s): %s", codigo_producto, codigo_vendedor, motivo)
+
+            if time.monotonic() >= proximo_reporte:
+                print(estadisticas.reporte(cola), file=sys.stderr, flush=True)
+                proximo_reporte = time.monotonic() + args.estadisticas_cada
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detener.set()
+        controller.detector.guardar()
+        print(estadisticas.reporte(cola), file=sys.stderr, flush=True)
+
+    return 0
+
+class EstacionServicio:
+    """Puesto del modo multiestación: su sesión de vendedor, sus pesajes recientes y sus contadores"""
+
+    def __init__(self, nombre, vendedor=None):
+        self.nombre = nombre
+        # Vendedor de la sesión: el último indicado en un evento vale para los siguientes sin vendedor
+        self.vendedor = vendedor
+        self.recientes = deque(maxlen=RECIENTES_POR_ESTACION)
+        self.registrados = 0
+        self.rechazados = 0
+        self.terminada = False
+
+    def reporte(self):
+        """Línea de estado del puesto: contadores, vendedor de la sesión y pesajes recientes"""
+        recientes = " ".join(f"{codigo_producto}:{peso}" for codigo_producto, peso, _ in self.recientes)
+        return (f"{self.nombre}: registrados={self.registrados} rechazados={self.rechazados} "
+                f"vendedor={self.vendedor or '-'} recientes=[{recientes}]")
+
+class ColaEstacion:
+    """Encola en la cola común las líneas de un lector junto con el nombre de su estación"""
+
+    def __init__(self, cola, nombre):
+        self._cola = cola
+        self._nombre = nombre
+
+    def put(self, linea):
+        self._cola.put((self._nombre, linea))
+
+def interpretar_estaciones(especificaciones, vendedores):
+    """Convierte las opciones NOMBRE=FUENTE y NOMBRE=VENDEDOR en {nombre: (estacion, fuente)}"""
+    vendedor_por_estacion = dict(v.split('=', 1) for v in vendedores)
+    estaciones = {}
+    for especificacion in especificaciones:
+        nombre, separador, fuente = especificacion.partition('=')
+        if not separador or not nombre or not fuente:
+            raise ValueError(f"Estación no válida (se espera NOMBRE=FUENTE): {especificacion}")
+        if nombre in estaciones:
+            raise ValueError(f"Estación repetida: {nombre}")
+        estaciones[nombre] = (EstacionServicio(nombre, vendedor_por_estacion.get(nombre)), fuente)
+    return estaciones
+
+def comando_estaciones(args):
+    """Atiende varias estaciones sin interfaz en un proceso, con una sola escritura por lote para todas"""
+    try:
+        estaciones = interpretar_estaciones(args.estacion, args.vendedor)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    # Un solo controlador: una conexión, un catálogo en memoria y una escritura por lote para todos los puestos
+    controller = PesajeControllerCore()
+    controller.error_ocurrido.connect(lambda mensaje: logger.error(mensaje))
+
+    cola = queue.Queue(maxsize=args.cola)
+    metricas.RegistroMetricas().medidor(
+        'carni_servicio_eventos_pendientes', "Eventos leídos a la espera de registrarse"
+    ).observar(cola.qsize)
+    detener = threading.Event()
+    for estacion, fuente in estaciones.values():
+        iniciar_lector(fuente, ColaEstacion(cola, estacion.nombre), detener)
+    estaciones = {nombre: estacion for nombre, (estacion, _) in estaciones.items()}
+
+    estadisticas = EstadisticasServicio()
+    proximo_reporte = time.monotonic() + args.estadisticas_cada
+
+    try:
+        while not all(estacion.terminada for estacion in estaciones.values()):
+            lote, _ = tomar_lote(cola, args.lote, args.espera_ms / 1000)
+
+            pesajes = []
+            origenes = []
+            for nombre, linea in lote:
+                estacion = estaciones[nombre]
+                if linea is FIN_ENTRADA:
+                    estacion.terminada = True
+                    continue
+                estadisticas.leidos += 1
+                evento = interpretar_evento(linea, estacion.vendedor)
+                if evento is None:
+                    estadisticas.rechazados += 1
+                    estacion.rechazados += 1
+                    logger.warning("Evento no válido en %s: %r", nombre, linea.strip())
+                    continue
+                estacion.vendedor = evento[2]
+                pesajes.append(evento + (None,))
+                origenes.append(estacion)
+
+            if pesajes:
+                registrados, rechazados = controller.registrar_pesajes_lote(pesajes)
+                estadisticas.registrados += registrados
+                estadisticas.rechazados += len(rechazados)
+                estadisticas.lotes += 1
+                # Atribuir los rechazos (producto, vendedor) a las estaciones que enviaron esos pesajes
+                pendientes = Counter((codigo_producto, codigo_vendedor) for codigo_producto, codigo_vendedor, _ in rechazados)
+                for estacion, (codigo_producto, peso, codigo_vendedor, _) in zip(origenes, pesajes):
+                    if pendientes[(codigo_producto, codigo_vendedor)]:
+                        pendientes[(codigo_producto, codigo_vendedor)] -= 1
+                        estacion.rechazados += 1
+                    else:
+                        estacion.registrados += 1
+                        estacion.recientes.append((codigo_producto, peso, codigo_vendedor))
+                for codigo_producto, codigo_vendedor, motivo in rechazados:
+                    logger.warning("Pesaje rechazado (%s, %s): %s", codigo_producto, codigo_vendedor, motivo)
+
+            if time.monotonic() >= proximo_reporte:
+                print(estadisticas.reporte(cola), file=sys.stderr, flush=True)
+                for estacion in estaciones.values():
+                    print(estacion.reporte(), file=sys.stderr, flush=True)
+                proximo_reporte = time.monotonic() + args.estadisticas_cada
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detener.set()
+        controller.detector.guardar()
+        print(estadisticas.reporte(cola), file=sys.stderr, flush=True)
+        for estacion in estaciones.values():
+            print(estacion.reporte(), file=sys.stderr, flush=True)
+
+    return 0
+
+def comando_cierre(args):
+    """Genera el cierre diario de la fecha indicada"""
+    controller = PesajeControllerCore()
+    resultado = controller.generar_cierre(
+        args.fecha, forzar=args.forzar, directorio_base=args.directorio, procesos=args.procesos
+    )
+    if resultado is None:
+        print("No se pudo generar el cierre; ver servicio.log", file=sys.stderr)
+        return 1
+
+    print(f"Cierre generado en {resultado['directorio']}: {resultado['pesajes']} pesajes, "
+          f"{resultado['regenerados']} vendedores regenerados, {resultado['reutilizados']} sin cambios")
+    # Dejar listos los bocetos del día cerrado para las consultas de rango
+    BocetosDiarios().construir(args.fecha, args.fecha + timedelta(days=1))
+    return 0
+
+def comando_analitica(args):
+    """Informa por vendedor o producto pesajes, kilos, códigos distintos y cuantiles de peso de un rango"""
+    inicio = time.perf_counter()
+    resumen = BocetosDiarios().consultar(
+        args.desde, args.hasta, dimension=args.dimension, codigo=args.codigo, exacto=args.exacto
+    )
+    segundos = time.perf_counter() - inicio
+
+    if args.json:
+        resumen['resultados'] = {
+            codigo: dict(r, cuantiles={str(q): v for q, v in r['cuantiles'].items()})
+            for codigo, r in resumen['resultados'].items()
+        }
+        print(json.dumps(dict(resumen, segundos=round(segundos, 3)), ensure_ascii=False))
+        return 0
+
+    distintos = 'productos' if args.dimension == 'vendedor' else 'vendedores'
+    print(f"{args.dimension} pesajes kilos {distintos} " + " ".join(f"p{q * 100:g}" for q in args.cuantiles))
+    for codigo, r in sorted(resumen['resultados'].items()):
+        cuantiles = " ".join(f"{r['cuantiles'][q]:.2f}" for q in args.cuantiles)
+        print(f"{codigo} {r['pesajes']} {r['kilos']:.3f} {r['distintos']} {cuantiles}")
+    print(f"{resumen['dias']} días, {'exacto' if args.exacto else 'aproximado'} ({segundos:.3f} s)", file=sys.stderr)
+    return 0
+
+def comando_sincronizar(args):
+    """Sincroniza el catálogo de productos o vendedores con un archivo CSV"""
+    try:
+        reporte = SincronizacionCatalogo(args.catalogo).sincronizar(
+            args.archivo, desactivar_ausentes=not args.conservar_ausentes,
+            simular=args.simular, forzar=args.forzar
+        )
+    except (OSError, ValueError) as e:
+        print(f"No se pudo sincronizar el catálogo: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{'Simulación de sincronización' if args.simular else 'Sincronización'} de {args.catalogo} "
+          f"en {reporte['segundos']} s: {reporte['leidos']} filas leídas, {len(reporte['altas'])} altas, "
+          f"{len(reporte['modificados'])} modificados, {len(reporte['reactivados'])} reactivados, "
+          f"{len(reporte['bajas'])} bajas, {len(reporte['cambios_precio'])} cambios de precio, "
+          f"{reporte['sin_cambios']} sin cambios")
+    for linea, motivo in reporte['rechazados']:
+        print(f"Línea {linea} rechazada: {motivo}", file=sys.stderr)
+    for linea, codigo in reporte['duplicados']:
+        print(f"Línea {linea}: código {codigo} repetido, prevalece la última fila", file=sys.stderr)
+    return 0
+
+class DestinoOutbox:
+    """Escribe eventos del outbox como líneas JSON en stdout, un archivo (agregando) o un socket Unix"""
+
+    def __init__(self, destino):
+        self._socket = None
+        self._archivo = None
+        if destino == 'stdout':
+            self._flujo = sys.stdout
+        elif destino.startswith('archivo:'):
+            self._archivo = self._flujo = open(destino[len('archivo:'):], 'a', encoding='utf-8')
+        elif destino.startswith('socket:'):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(destino[len('socket:'):])
+            self._flujo = self._socket.makefile('w', encoding='utf-8')
+        else:
+            raise ValueError(f"Destino de eventos no válido: {destino}")
+
+    def escribir(self, eventos):
+        """Escribe el lote y lo asegura (fsync en archivos) antes de que se confirme la posición"""
+        for evento in eventos:
+            self._flujo.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+        self._flujo.flush()
+        if self._archivo is not None:
+            os.fsync(self._archivo.fileno())
+
+    def cerrar(self):
+        """Cierra el archivo o el socket"""
+        if self._archivo is not None:
+            self._archivo.close()
+        if self._socket is not None:
+            self._flujo.close()
+            self._socket.close()
+
+def comando_outbox(args):
+    """Entrega los cambios del outbox a un destino local, confirmando la posición del consumidor"""
+    try:
+        destino = DestinoOutbox(args.destino)
+    except (OSError, ValueError) as e:
+        print(f"No se pudo abrir el destino: {e}", file=sys.stderr)
+        return 1
+
+    consumidor = ConsumidorOutbox(args.consumidor, tamano_lote=args.lote)
+    entregados = 0
+    try:
+        if args.seguir:
+            def procesar(eventos):
+                nonlocal entregados
+                destino.escribir(eventos)
+                entregados += len(eventos)
+            consumidor.seguir(procesar, intervalo_s=args.intervalo)
+        else:
+            # Entregar lo acumulado y terminar
+            while True:
+                eventos = consumidor.leer()
+                if eventos:
+                    destino.escribir(eventos)
+                    entregados += len(eventos)
+                consumidor.confirmar()
+                if len(eventos) < args.lote:
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        destino.cerrar()
+        print(f"{entregados} eventos entregados a {args.destino}; posición de {args.consumidor}: "
+              f"{consumidor.ultimo_id}", file=sys.stderr)
+
+    return 0
+
+def crear_parser():
+    """Construye el analizador de argumentos de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Sistema de Registro de Pesajes - modo servicio")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    escanear = subparsers.add_parser('escanear', help="Registrar pesajes a partir de eventos de etiquetas")
+    escanear.add_argument('--fuente', default='stdin',
+                          help="Origen de los eventos: stdin, fifo:RUTA o socket:RUTA (por defecto stdin)")
+    escanear.add_argument('--vendedor', default=None,
+                          help="Código de vendedor para los eventos que no lo incluyan")
+    escanear.add_argument('--lote', type=int, default=200,
+                          help="Cantidad máxima de pesajes por escritura (por defecto 200)")
+    escanear.add_argument('--espera-ms', type=float, default=50,
+                          help="Tiempo máximo para completar un lote en milisegundos (por defecto 50)")
+    escanear.add_argument('--cola', type=int, default=10000,
+                          help="Eventos pendientes antes de frenar la lectura (por defecto 10000)")
+    escanear.add_argument('--estadisticas-cada', type=float, default=5,
+                          help="Segundos entre reportes de rendimiento (por defecto 5)")
+    escanear.set_defaults(funcion=comando_escanear)
+
+    cierre = subparsers.add_parser('cierre', help="Generar el cierre diario (reportes por vendedor y producto)")
+    cierre.add_argument('--fecha', type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help="Día a cerrar AAAA-MM-DD (por defecto ayer)")
+    cierre.add_argument('--directorio', default='cierres',
+                        help="Directorio base de los cierres (por defecto cierres)")
+    cierre.add_argument('--procesos', type=int, default=None,
+                        help="Procesos para generar los reportes (por defecto uno por CPU)")
+    cierre.add_argument('--forzar', action='store_true',
+                        help="Regenerar todos los reportes aunque los datos no hayan cambiado")
+    cierre.set_defaults(funcion=comando_cierre)
+
+    sincronizar = subparsers.add_parser('sincronizar', help="Sincronizar el catálogo con un archivo CSV")
+    sincronizar.add_argument('archivo', help="Archivo CSV con encabezado (codigo, nombre, ...)")
+    sincronizar.add_argument('--catalogo', choices=('productos', 'vendedores'), default='productos',
+                             help="Catálogo a sincronizar (por defecto productos)")
+    sincronizar.add_argument('--conservar-ausentes', action='store_true',
+                             help="No dar de baja los registros que no figuran en el archivo")
+    sincronizar.add_argument('--simular', action='store_true',
+                             help="Mostrar los cambios sin aplicarlos")
+    sincronizar.add_argument('--forzar', action='store_true',
+                             help="Aplicar aunque se dé de baja más de la mitad del catálogo")
+    sincronizar.set_defaults(funcion=comando_sincronizar)
+
+    estaciones = subparsers.add_parser('estaciones', help="Atender varias estaciones de escaneo en un solo proceso")
+    estaciones.add_argument('--estacion', action='append', required=True,
+                            help="Estación y su fuente de eventos NOMBRE=FUENTE (stdin, fifo:RUTA o socket:RUTA); repetible")
+    estaciones.add_argument('--vendedor', action='append', default=[],
+                            help="Vendedor inicial de una estación NOMBRE=CODIGO; repetible")
+    estaciones.add_argument('--lote', type=int, default=200,
+                            help="Cantidad máxima de pesajes por escritura, sumando todas las estaciones (por defecto 200)")
+    estaciones.add_argument('--espera-ms', type=float, default=50,
+                            help="Tiempo máximo para completar un lote en milisegundos (por defecto 50)")
+    estaciones.add_argument('--cola', type=int, default=10000,
+                            help="Eventos pendientes antes de frenar la lectura (por defecto 10000)")
+    estaciones.add_argument('--estadisticas-cada', type=float, default=5,
+                            help="Segundos entre reportes de rendimiento y del estado de cada estación (por defecto 5)")
+    estaciones.set_defaults(funcion=comando_estaciones)
+
+    analitica = subparsers.add_parser('analitica', help="Resumen aproximado (o exacto) de un rango de días")
+    analitica.add_argument('--desde', type=date.fromisoformat, default=date.today() - timedelta(days=365),
+                           help="Primer día AAAA-MM-DD (por defecto hace un año)")
+    analitica.add_argument('--hasta', type=date.fromisoformat, default=date.today() + timedelta(days=1),
+                           help="Día siguiente al último AAAA-MM-DD (por defecto mañana, incluye hoy)")
+    analitica.add_argument('--dimension', choices=('vendedor', 'producto'), default='vendedor',
+                           help="Agrupar por vendedor o por producto (por defecto vendedor)")
+    analitica.add_argument('--codigo', default=None,
+                           help="Limitar a un vendedor o producto")
+    analitica.add_argument('--exacto', action='store_true',
+                           help="Calcular sobre los pesajes en lugar de combinar bocetos")
+    analitica.add_argument('--json', action='store_true',
+                           help="Imprimir el resultado como JSON")
+    analitica.set_defaults(funcion=comando_analitica, cuantiles=CUANTILES)
+
+    outbox = subparsers.add_parser('outbox', help="Entregar los cambios del outbox a un consumidor local")
+    outbox.add_argument('--consumidor', required=True,
+                        help="Nombre del consumidor cuya posición se lee y se confirma")
+    outbox.add_argument('--destino', default='stdout',
+                        help="Destino de los eventos: stdout, archivo:RUTA o socket:RUTA (por defecto stdout)")
+    outbox.add_argument('--lote', type=int, default=500,
+                        help="Eventos por lectura (por defecto 500)")
+    outbox.add_argument('--seguir', action='store_true',
+                        help="Seguir esperando cambios nuevos en lugar de terminar al alcanzar el final")
+    outbox.add_argument('--intervalo', type=float, default=1.0,
+                        help="Segundos entre consultas cuando no hay cambios (por defecto 1)")
+    outbox.set_defaults(funcion=comando_outbox)
+
+    return parser
+
+def main(argv=None):
+    """Función principal del modo servicio"""
+    args = crear_parser().parse_args(argv)
+    configurar_logging('servicio.log')
+
+    if not DatabaseConnector().test_connection():
+        print("No se pudo conectar a la base de datos MySQL. "
+              "Verifique la configuración en config/db_config.py", file=sys.stderr)
+        return 1
+
+    modo_perfil = perfilador.modo_desde_entorno()
+    if modo_perfil:
+        perfilador.instrumentar(PesajeControllerCore, perfilador.metodos_publicos(PesajeControllerCore))
+        perfilador.Perfilador().iniciar(modo_perfil)
+    metricas.iniciar_exportacion()
+    try:
+        return args.funcion(args)
+    finally:
+        metricas.detener_exportacion()
+        perfilador.Perfilador().detener()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+from PySide6.QtCore import Qt, QSortFilterProxyModel
+
+# Formato de la fecha guardada en Qt.UserRole (ordenable como texto)
+FORMATO_FECHA_ORDENABLE = "%Y-%m-%d %H:%M:%S"
+
+# Columnas del modelo de historial
+COLUMNA_ID = 0
+COLUMNA_FECHA = 1
+COLUMNA_PRODUCTO = 2
+COLUMNA_CODIGO_VENDEDOR = 4
+
+class FiltroHistorialProxy(QSortFilterProxyModel):
+    """Filtra el historial por vendedor, producto y rango de fechas sin consultar la base de datos"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.codigo_vendedor = None
+        self.producto = None
+        self.fecha_desde = None
+        self.fecha_hasta = None
+    
+    def establecer_filtros(self, codigo_vendedor=None, producto=None, fecha_desde=None, fecha_hasta=None):
+        """Actualiza los criterios de filtrado y vuelve a evaluar las filas"""
+        self.codigo_vendedor = codigo_vendedor or None
+        self.producto = producto.lower() if producto else None
+        self.fecha_desde = fecha_desde.strftime(FORMATO_FECHA_ORDENABLE) if fecha_desde else None
+        self.fecha_hasta = fecha_hasta.strftime(FORMATO_FECHA_ORDENABLE) if fecha_hasta else None
+        self.invalidateFilter()
+    
+    def filterAcceptsRow(self, source_row, source_parent):
+        """Evaluar una fila del modelo de origen contra los filtros activos"""
+        modelo = self.sourceModel()
+        
+        if self.codigo_vendedor is not None:
+            codigo = modelo.index(source_row, COLUMNA_CODIGO_VENDEDOR, source_parent).data()
+            if codigo != self.codigo_vendedor:
+                return False
+        
+        if self.producto is not None:
+            indice = modelo.index(source_row, COLUMNA_PRODUCTO, source_parent)
+            codigo = (indice.data(Qt.UserRole) or "").lower()
+            nombre = (indice.data() or "").lower()
+            if codigo != self.producto and self.producto not in nombre:
+                return False
+        
+        if self.fecha_desde is not None or self.fecha_hasta is not None:
+            fecha_hora = modelo.index(source_row, COLUMNA_FECHA, source_parent).data(Qt.UserRole)
+            if fecha_hora is None:
+                return False
+            if self.fecha_desde is not None and fecha_hora < self.fecha_desde:
+                return False
+            if self.fecha_hasta is not None and fecha_hora > self.fecha_hasta:
+                return False
+        
+        return True
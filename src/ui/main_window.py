@@ -1,21 +1,56 @@
 import os
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from PySide6.QtWidgets import (
     QMainWindow, QMessageBox, QFileDialog, 
     QTableView, QPushButton, QLineEdit, 
-    QDoubleSpinBox, QDateEdit, QLabel
+    QDoubleSpinBox, QDateEdit, QLabel, QCompleter, QComboBox
 )
-from PySide6.QtCore import Qt, QDate, Slot, QSortFilterProxyModel
-from PySide6.QtGui import QStandardItemModel, QStandardItem
+from PySide6.QtCore import Qt, QDate, QDateTime, Slot, QSortFilterProxyModel, QTimer, QStringListModel
+from PySide6.QtGui import QStandardItemModel, QStandardItem, QAction, QKeySequence
+from controllers.etiquetas import decodificar_etiqueta, codigo_producto_de
+from controllers.escaner import PipelineEscaner, LectorEscanerSerie
+from controllers.balanza import EmparejadorPesaje, FiltroEstabilidad, LectorBalanzaSerie
+from controllers.exportadores import FORMATOS
+from config.dispositivos_config import get_escaner_config, get_balanza_config
+from herramientas.perfilador import Perfilador, modo_desde_entorno
+from herramientas.repeticion import GrabadorSesion
+from .filtro_historial import FiltroHistorialProxy, FORMATO_FECHA_ORDENABLE
 from .ui_main_window import Ui_MainWindow  # Este archivo se generará automáticamente desde el .ui
 from PySide6.QtWidgets import QHeaderView
+
+# El gráfico de series es opcional: requiere el módulo QtCharts de PySide6
+try:
+    from PySide6.QtCharts import QChart, QChartView, QLineSeries, QDateTimeAxis, QValueAxis
+except ImportError:
+    QChart = None
+
+# Rangos del gráfico de kilos: (nombre, función que retorna (desde, hasta) a partir del momento actual)
+RANGOS_GRAFICO = (
+    ("Hoy por hora", lambda ahora: (datetime.combine(ahora.date(), time()), datetime.combine(ahora.date(), time()) + timedelta(days=1))),
+    ("Últimos 7 días", lambda ahora: (datetime.combine(ahora.date(), time()) - timedelta(days=6), ahora)),
+    ("Últimos 30 días", lambda ahora: (datetime.combine(ahora.date(), time()) - timedelta(days=29), ahora)),
+    ("Último año", lambda ahora: (datetime.combine(ahora.date(), time()) - timedelta(days=364), ahora)),
+)
+
+# Puntos por serie del gráfico y vendedores (los de más kilos) que se dibujan
+PUNTOS_GRAFICO = 200
+VENDEDORES_GRAFICO = 8
+
+# Espera antes de consultar el historial o las estadísticas; las solicitudes seguidas se agrupan
+ANTIRREBOTE_CARGAS_MS = 150
+
 class MainWindow(QMainWindow):
 
-    def __init__(self, controller):
+    def __init__(self, controller, dispositivos=True):
+        """dispositivos=False omite el escáner y la balanza serie (p. ej. en las estaciones secundarias)"""
         super().__init__()
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.controller = controller
+        # Grabación de las entradas del operador (CARNI_GRABAR) y destino alternativo de los
+        # errores (la reproducción los cuenta en lugar de abrir diálogos modales)
+        self.grabador = GrabadorSesion.desde_entorno()
+        self.manejador_errores = None
         
         # Modelos para las tablas
         self.modelo_registros = QStandardItemModel(0, 4, self)
@@ -24,12 +59,55 @@ class MainWindow(QMainWindow):
         
         self.modelo_historial = QStandardItemModel(0, 6, self)
         self.modelo_historial.setHorizontalHeaderLabels(["ID", "Fecha", "Producto", "Peso", "Código V", "Vendedor"])
-        self.ui.tableView_pesajes.setModel(self.modelo_historial)
+        # El historial se filtra en el cliente mediante un proxy sobre la ventana en caché
+        self.proxy_historial = FiltroHistorialProxy(self)
+        self.proxy_historial.setSourceModel(self.modelo_historial)
+        self.ui.tableView_pesajes.setModel(self.proxy_historial)
+        self._historial_desde_cache = False
+        # Generaciones de las últimas cargas solicitadas; los resultados de otras se descartan
+        self._generacion_historial = None
+        self._generacion_estadisticas = None
+        self._generacion_series = None
+        self._historial_pendiente = False
+        self._solicitud_historial = None
+        self._fecha_desde_historial = None
+        
+        # Las cargas se difieren unos milisegundos: las solicitudes seguidas se resuelven con una sola
+        self.timer_historial = QTimer(self)
+        self.timer_historial.setSingleShot(True)
+        self.timer_historial.setInterval(ANTIRREBOTE_CARGAS_MS)
+        self.timer_historial.timeout.connect(self.solicitar_historial)
+        self.timer_estadisticas = QTimer(self)
+        self.timer_estadisticas.setSingleShot(True)
+        self.timer_estadisticas.setInterval(ANTIRREBOTE_CARGAS_MS)
+        self.timer_estadisticas.timeout.connect(self.solicitar_estadisticas)
+        
+        # Filtro por producto (código o parte del nombre)
+        self.label_filtro_producto = QLabel("Producto:", self.ui.groupBox_4)
+        self.lineEdit_filtro_producto = QLineEdit(self.ui.groupBox_4)
+        self.lineEdit_filtro_producto.setPlaceholderText("Código o nombre...")
+        self.ui.horizontalLayout_2.insertWidget(2, self.label_filtro_producto)
+        self.ui.horizontalLayout_2.insertWidget(3, self.lineEdit_filtro_producto)
         
         self.modelo_estadisticas = QStandardItemModel(0, 4, self)
         self.modelo_estadisticas.setHorizontalHeaderLabels(["Código", "Vendedor", "Total Pesajes", "Peso Total", "Peso Promedio"])
         self.ui.tableView_estadisticas.setModel(self.modelo_estadisticas)
         
+        # Gráfico de kilos por vendedor en el tiempo, con selector de rango
+        self.comboBox_rango_grafico = QComboBox(self.ui.tab_estadisticas)
+        self.comboBox_rango_grafico.addItems([nombre for nombre, _ in RANGOS_GRAFICO])
+        self.ui.verticalLayout_5.insertWidget(2, self.comboBox_rango_grafico)
+        self.grafico_series = None
+        if QChart is not None:
+            self.grafico_series = QChart()
+            self.grafico_series.legend().setAlignment(Qt.AlignRight)
+            self.vista_grafico = QChartView(self.grafico_series, self.ui.tab_estadisticas)
+            self.vista_grafico.setMinimumHeight(240)
+            self.ui.verticalLayout_5.insertWidget(3, self.vista_grafico)
+        else:
+            self.comboBox_rango_grafico.setEnabled(False)
+            self.comboBox_rango_grafico.setToolTip("El gráfico requiere el módulo QtCharts de PySide6")
+        
         # Configurar fechas por defecto
         hoy = QDate.currentDate()
         self.ui.dateEdit_desde.setDate(hoy.addDays(-30))  # 30 días atrás
@@ -43,6 +121,56 @@ class MainWindow(QMainWindow):
         self.controller.producto_encontrado.connect(self.on_producto_encontrado)
         self.controller.vendedor_encontrado.connect(self.on_vendedor_encontrado)
         self.controller.error_ocurrido.connect(self.on_error_ocurrido)
+        self.controller.pesaje_deshecho.connect(self.on_pesaje_deshecho)
+        self.controller.historial_actualizado.connect(self.on_historial_actualizado)
+        self.controller.cierre_completado.connect(self.on_cierre_completado)
+        self.controller.exportacion_progreso.connect(self.on_exportacion_progreso)
+        self.controller.anomalia_detectada.connect(self.on_anomalia_detectada)
+        self.controller.series_actualizadas.connect(self.on_series_actualizadas)
+        
+        # Autocompletado de vendedores y búsqueda de productos por nombre
+        self._sugerencias = {}
+        self.completer_vendedor = self.crear_completer(self.ui.lineEdit_codigo_vendedor)
+        self.completer_vendedor.activated.connect(self.on_sugerencia_vendedor_elegida)
+        self.ui.lineEdit_codigo_vendedor.textEdited.connect(self.on_codigo_vendedor_editado)
+        
+        self.lineEdit_buscar_producto = QLineEdit(self.ui.groupBox_formulario)
+        self.lineEdit_buscar_producto.setPlaceholderText("Buscar producto por nombre...")
+        self.ui.horizontalLayout_codigo_barra.addWidget(self.lineEdit_buscar_producto)
+        self.completer_producto = self.crear_completer(self.lineEdit_buscar_producto)
+        self.completer_producto.activated.connect(self.on_sugerencia_producto_elegida)
+        self.lineEdit_buscar_producto.textEdited.connect(self.on_buscar_producto_editado)
+        
+        # Canal de entrada del escáner: las lecturas se encolan y se procesan en orden
+        config_escaner = get_escaner_config()
+        self.etiqueta_actual = None
+        self._procesando_escaneos = False
+        # Balanza por puerto serie (opcional): sus pesos estables se emparejan con los escaneos de productos
+        config_balanza = get_balanza_config()
+        puerto_balanza = config_balanza['puerto'] if dispositivos else None
+        self.emparejador_balanza = None
+        self.lector_balanza = None
+        if puerto_balanza:
+            self.emparejador_balanza = EmparejadorPesaje(config_balanza['vigencia_s'])
+        self.pipeline_escaner = PipelineEscaner(config_escaner['antirrebote_ms'], self.emparejador_balanza)
+        self.lector_escaner = None
+        if dispositivos and config_escaner['puerto']:
+            self.lector_escaner = LectorEscanerSerie(config_escaner['puerto'], self.pipeline_escaner)
+            self.lector_escaner.start()
+        if puerto_balanza:
+            filtro = FiltroEstabilidad(
+                config_balanza['ventana_ms'], config_balanza['lecturas_minimas'],
+                config_balanza['tolerancia_kg'], config_balanza['peso_minimo_kg']
+            )
+            self.lector_balanza = LectorBalanzaSerie(puerto_balanza, filtro, self.emparejador_balanza)
+            self.lector_balanza.start()
+            # Peso en vivo en la barra de estado
+            self.label_peso_balanza = QLabel("Balanza: --", self)
+            self.statusBar().addPermanentWidget(self.label_peso_balanza)
+            self._peso_mostrado = None
+        self.timer_escaner = QTimer(self)
+        self.timer_escaner.timeout.connect(self.procesar_escaneos_pendientes)
+        self.timer_escaner.start(config_escaner['intervalo_proceso_ms'])
         
         # Conectar señales de la UI
         self.ui.lineEdit_codigo_barra.returnPressed.connect(self.on_codigo_barra_entered)
@@ -52,7 +180,37 @@ class MainWindow(QMainWindow):
         self.ui.pushButton_filtrar.clicked.connect(self.on_filtrar_clicked)
         self.ui.pushButton_exportar.clicked.connect(self.on_exportar_clicked)
         self.ui.pushButton_actualizar_estadisticas.clicked.connect(self.on_actualizar_estadisticas_clicked)
+        self.comboBox_rango_grafico.currentIndexChanged.connect(self.on_actualizar_estadisticas_clicked)
         self.ui.actionSalir.triggered.connect(self.close)
+        
+        # Modo rápido: guarda al escanear con vendedor establecido, sin diálogos modales
+        self.actionModo_rapido = QAction("Modo rápido", self)
+        self.actionModo_rapido.setCheckable(True)
+        self.actionModo_rapido.setShortcut(QKeySequence("F9"))
+        self.ui.menuArchivo.insertAction(self.ui.actionSalir, self.actionModo_rapido)
+        self.actionModo_rapido.toggled.connect(self.on_modo_rapido_toggled)
+        if self.grabador is not None:
+            # La reproducción necesita el modo en que comenzó la sesión
+            self.grabador.registrar('modo', self.modo_rapido)
+        
+        self.actionDeshacer = QAction("Deshacer último registro", self)
+        self.actionDeshacer.setShortcut(QKeySequence.Undo)
+        self.actionDeshacer.setShortcutContext(Qt.ApplicationShortcut)
+        self.ui.menuArchivo.insertAction(self.ui.actionSalir, self.actionDeshacer)
+        self.ui.menuArchivo.insertSeparator(self.ui.actionSalir)
+        self.actionDeshacer.triggered.connect(self.controller.deshacer_ultimo_pesaje)
+        
+        # Cierre del día: se genera en segundo plano y se avisa al terminar
+        self.actionCierre_diario = QAction("Generar cierre del día", self)
+        self.ui.menuArchivo.insertAction(self.ui.actionSalir, self.actionCierre_diario)
+        self.ui.menuArchivo.insertSeparator(self.ui.actionSalir)
+        self.actionCierre_diario.triggered.connect(self.on_cierre_diario_triggered)
+        
+        # Acción oculta (sin menú) para iniciar o detener una sesión de perfilado
+        self.actionPerfilar = QAction("Perfilar", self)
+        self.actionPerfilar.setShortcut(QKeySequence("Ctrl+Shift+P"))
+        self.addAction(self.actionPerfilar)
+        self.actionPerfilar.triggered.connect(self.on_perfilar_triggered)
         self.ui.actionAcerca_de.triggered.connect(self.on_acerca_de)
 
         # Conectar señal de filtrado prueba
@@ -85,24 +243,67 @@ class MainWindow(QMainWindow):
     @Slot()
     def on_codigo_barra_entered(self):
         """Manejar evento cuando se presiona Enter en el campo de código de barra"""
-        codigo_completo = self.ui.lineEdit_codigo_barra.text().strip()
+        # Encolar la lectura y liberar el campo de inmediato para el siguiente escaneo
+        texto = self.ui.lineEdit_codigo_barra.text()
+        if self.pipeline_escaner.enviar(texto) and self.grabador is not None:
+            self.grabador.registrar('escaneo', texto.strip())
+        self.ui.lineEdit_codigo_barra.clear()
+    
+    @Slot()
+    def procesar_escaneos_pendientes(self):
+        """Procesar en orden de llegada las lecturas encoladas por el escáner"""
+        # Evitar reentradas mientras un diálogo modal mantiene vivo el bucle de eventos
+        if self._procesando_escaneos:
+            return
+        
+        self._procesando_escaneos = True
+        try:
+            for evento in self.pipeline_escaner.vaciar():
+                self.procesar_etiqueta(evento.etiqueta, evento.peso)
+            if self.lector_balanza is not None:
+                self.mostrar_peso_balanza()
+        finally:
+            self._procesando_escaneos = False
+    
+    def mostrar_peso_balanza(self):
+        """Actualizar el peso en vivo de la balanza (solo si cambió)"""
+        lectura = self.lector_balanza.ultima_lectura
+        if lectura is None or lectura == self._peso_mostrado:
+            return
+        self._peso_mostrado = lectura
+        estado = "" if lectura.estable else " (inestable)"
+        self.label_peso_balanza.setText(f"Balanza: {lectura.peso:.3f} kg{estado}")
+    
+    def procesar_etiqueta(self, codigo_completo, peso_balanza=None):
+        """Decodificar una etiqueta leída y completar el formulario
+        
+        peso_balanza es el peso estable de la balanza emparejado con el escaneo de un código
+        de producto; en ese caso no hace falta la etiqueta impresa.
+        """
+        if peso_balanza is not None:
+            self.etiqueta_actual = codigo_completo
+            self.statusBar().showMessage(f"Producto {codigo_completo} con peso de balanza {peso_balanza:.3f} kg")
+            self.ui.lineEdit_peso.setText(f"{peso_balanza:.4f}")
+            self.controller.buscar_producto_por_codigo(codigo_producto_de(codigo_completo))
+            return
+        
+        etiqueta = decodificar_etiqueta(codigo_completo)
     
     # Verificar si el código tiene exactamente 13 dígitos
-        if len(codigo_completo) == 13 and codigo_completo.isdigit():
-        # Extraer código de producto (primeros 7 dígitos)
-            codigo_producto = codigo_completo[:7]
-        # Extraer información de peso (últimos 6 dígitos)
-            info_peso = codigo_completo[7:]
-        # Los primeros 2 dígitos son kg (parte entera)
-        # Los últimos 4 dígitos son gramos (parte decimal)
-            kg = int(info_peso[:2])
-            g = int(info_peso[2:])
-        # Calcular el peso en kg (kg + g/10000)
-            peso = kg + (g / 10000)
-        # Buscar el producto y establecer el peso automáticamente
-            self.controller.buscar_producto_por_codigo(codigo_producto)
+        if etiqueta:
+            codigo_producto, peso = etiqueta
+            self.etiqueta_actual = codigo_completo
+            self.statusBar().showMessage(f"Etiqueta leída: {codigo_completo}")
         # Establecer el peso calculado en el campo de peso
             self.ui.lineEdit_peso.setText(f"{peso:.4f}")
+        # Buscar el producto (en modo rápido esto puede guardar el registro de inmediato)
+            self.controller.buscar_producto_por_codigo(codigo_producto)
+        elif self.emparejador_balanza is not None:
+            # Con balanza, un código de producto sin peso espera la próxima pesada estable
+            self.etiqueta_actual = codigo_completo
+            self.ui.lineEdit_peso.clear()
+            self.statusBar().showMessage(f"Producto {codigo_completo}: esperando peso estable de la balanza")
+            self.controller.buscar_producto_por_codigo(codigo_producto_de(codigo_completo))
         else:
             self.mostrar_error("El código de barras debe tener exactamente 13 dígitos numéricos")
     
@@ -111,14 +312,82 @@ class MainWindow(QMainWindow):
         """Manejar evento cuando se presiona Enter en el campo de código de vendedor"""
         codigo = self.ui.lineEdit_codigo_vendedor.text().strip()
         if codigo:
+            if self.grabador is not None:
+                self.grabador.registrar('vendedor', codigo)
             self.controller.buscar_vendedor_por_codigo(codigo)
         else:
             self.mostrar_error("Debe ingresar un código de vendedor válido")
     
+    def crear_completer(self, line_edit):
+        """Crear un completer cuyas sugerencias las decide el índice de búsqueda del controlador"""
+        completer = QCompleter(QStringListModel(self), self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.setWidget(line_edit)
+        return completer
+    
+    def mostrar_sugerencias(self, completer, elementos, etiqueta):
+        """Mostrar en el completer los elementos encontrados"""
+        textos = []
+        for elemento in elementos:
+            texto = etiqueta(elemento)
+            self._sugerencias[texto] = elemento
+            textos.append(texto)
+        completer.model().setStringList(textos)
+        if textos:
+            completer.complete()
+        else:
+            completer.popup().hide()
+    
+    @Slot(str)
+    def on_codigo_vendedor_editado(self, texto):
+        """Sugerir vendedores por código, nombre o apellido mientras se escribe"""
+        self.mostrar_sugerencias(
+            self.completer_vendedor,
+            self.controller.buscar_vendedores(texto),
+            lambda v: f"{v['codigo']} - {v['nombre']} {v['apellido']}"
+        )
+    
+    @Slot(str)
+    def on_sugerencia_vendedor_elegida(self, texto):
+        """Establecer el vendedor elegido en el autocompletado"""
+        vendedor = self._sugerencias.get(texto)
+        if vendedor:
+            if self.grabador is not None:
+                self.grabador.registrar('vendedor', vendedor['codigo'])
+            self.ui.lineEdit_codigo_vendedor.setText(vendedor['codigo'])
+            self.on_vendedor_encontrado(vendedor)
+    
+    @Slot(str)
+    def on_buscar_producto_editado(self, texto):
+        """Sugerir productos por código o nombre mientras se escribe"""
+        self.mostrar_sugerencias(
+            self.completer_producto,
+            self.controller.buscar_productos(texto),
+            lambda p: f"{p['codigo']} - {p['nombre']}"
+        )
+    
+    @Slot(str)
+    def on_sugerencia_producto_elegida(self, texto):
+        """Cargar el producto elegido en el formulario para ingresar el peso a mano"""
+        producto = self._sugerencias.get(texto)
+        if producto:
+            if self.grabador is not None:
+                self.grabador.registrar('producto', producto['codigo'])
+            self.ui.lineEdit_codigo_barra.setText(producto['codigo'])
+            self.ui.lineEdit_producto.setText(producto['nombre'])
+            self.lineEdit_buscar_producto.clear()
+            self.ui.lineEdit_peso.setFocus()
+    
     @Slot()
     def on_guardar_clicked(self):
-        """Manejar evento para guardar el registro actual"""
-        codigo_completo = self.ui.lineEdit_codigo_barra.text().strip()
+        """Guardar el registro a pedido del operador (botón Guardar)"""
+        if self.grabador is not None:
+            self.grabador.registrar('guardar', {'peso': self.ui.lineEdit_peso.text().strip()})
+        # El código escrito a mano tiene prioridad sobre la última etiqueta procesada
+        self.guardar_registro(self.ui.lineEdit_codigo_barra.text().strip() or self.etiqueta_actual or "")
+    
+    def guardar_registro(self, codigo_completo):
+        """Validar el formulario y registrar el pesaje del código indicado"""
         nombre_producto = self.ui.lineEdit_producto.text().strip()
         peso_str = self.ui.lineEdit_peso.text().strip()
         codigo_vendedor = self.ui.lineEdit_codigo_vendedor.text().strip()
@@ -129,11 +398,8 @@ class MainWindow(QMainWindow):
             self.mostrar_error("Debe escanear o ingresar un código de producto")
             return
     
-    # Extraer solo los primeros 7 dígitos como código de producto
-        if len(codigo_completo) == 13 and codigo_completo.isdigit():
-            codigo_producto = codigo_completo[:7]
-        else:
-            codigo_producto = codigo_completo  # Si no tiene 13 dígitos, usar el código completo
+    # Extraer solo los primeros 7 dígitos como código de producto (o el código completo si no es etiqueta)
+        codigo_producto = codigo_producto_de(codigo_completo)
     
         if not nombre_producto:
             self.mostrar_error("El producto no es válido")
@@ -153,6 +419,11 @@ class MainWindow(QMainWindow):
             self.mostrar_error("El vendedor no es válido")
             return
     
+    # En modo rápido se guarda sin confirmación
+        if self.modo_rapido:
+            self.controller.registrar_pesaje(codigo_producto, peso, codigo_vendedor)
+            return
+    
     # Mostrar confirmación
         confirmacion = QMessageBox.question(
             self,
@@ -172,50 +443,139 @@ class MainWindow(QMainWindow):
     @Slot()
     def on_limpiar_clicked(self):
         """Limpiar todos los campos del formulario"""
-        self.ui.lineEdit_codigo_barra.clear()
-        self.ui.lineEdit_producto.clear()
-        self.ui.lineEdit_peso.clear()
+        if self.grabador is not None:
+            self.grabador.registrar('limpiar')
+        self.limpiar_producto()
+        if self.emparejador_balanza is not None:
+            self.emparejador_balanza.descartar()
+        self.statusBar().clearMessage()
         self.ui.lineEdit_codigo_vendedor.clear()
         self.ui.lineEdit_vendedor.clear()
+    
+    def limpiar_producto(self, conservar_entrada=False):
+        """Limpiar los campos del producto, conservando el vendedor"""
+        self.etiqueta_actual = None
+        # conservar_entrada evita borrar un escaneo que se está tecleando en ese momento
+        if not conservar_entrada:
+            self.ui.lineEdit_codigo_barra.clear()
+        self.ui.lineEdit_producto.clear()
+        self.ui.lineEdit_peso.clear()
+        self.ui.lineEdit_codigo_barra.setFocus()
+    
+    @property
+    def modo_rapido(self):
+        """Indica si está activo el modo rápido de registro"""
+        return self.actionModo_rapido.isChecked()
+    
+    @Slot(bool)
+    def on_modo_rapido_toggled(self, activo):
+        """Informar el cambio de modo en la barra de estado"""
+        if self.grabador is not None:
+            self.grabador.registrar('modo', activo)
+        if activo:
+            self.statusBar().showMessage("Modo rápido activado: los escaneos se guardan sin confirmación", 5000)
+        else:
+            self.statusBar().showMessage("Modo rápido desactivado", 5000)
         self.ui.lineEdit_codigo_barra.setFocus()
     
     @Slot()
     def on_filtrar_clicked(self):
         """Aplicar filtros en la pestaña de historial"""
-        codigo_vendedor = self.ui.lineEdit_filtro_vendedor.text().strip()
-        fecha_desde = self.ui.dateEdit_desde.date().toString("yyyy-MM-dd")
-        fecha_hasta = self.ui.dateEdit_hasta.date().toString("yyyy-MM-dd")
-        
-        # Si hay código de vendedor, filtramos por vendedor
-        if codigo_vendedor:
-            self.controller.cargar_pesajes_por_vendedor(codigo_vendedor)
-        else:
-            # Filtrar por fechas
-            self.controller.cargar_pesajes_por_fecha(fecha_desde, fecha_hasta + " 23:59:59")
+        self.filtrar_historial(actualizar=False)
     
     @Slot()
     def on_tab_changed(self, index):
     # Compara si la pestaña activa es tab_historial
         if self.ui.tabWidget.widget(index) == self.ui.tab_historial:
-            self.on_filtrar_clicked()
+            self.filtrar_historial(actualizar=True)
+    
+    def filtrar_historial(self, actualizar):
+        """Filtrar el historial en el cliente y consultar la base solo si hace falta
+        
+        Dentro de la ventana en caché el filtro lo resuelve el proxy sin consultas; con
+        actualizar se incorporan además los pesajes nuevos desde el último ID visto.
+        """
+        codigo_vendedor = self.ui.lineEdit_filtro_vendedor.text().strip()
+        producto = self.lineEdit_filtro_producto.text().strip()
+        fecha_desde = datetime.combine(self.ui.dateEdit_desde.date().toPython(), time.min)
+        fecha_hasta = datetime.combine(self.ui.dateEdit_hasta.date().toPython(), time(23, 59, 59))
+        
+        self.proxy_historial.establecer_filtros(codigo_vendedor, producto, fecha_desde, fecha_hasta)
+        
+        en_cache = self.controller.historial_cache.cubre(fecha_desde)
+        if en_cache and self._historial_desde_cache and not actualizar:
+            return
+        
+        self._solicitud_historial = (fecha_desde, fecha_hasta, en_cache and self._historial_desde_cache)
+        self.timer_historial.start()
+    
+    def solicitar_historial(self):
+        """Iniciar la carga del historial diferida por filtrar_historial"""
+        fecha_desde, fecha_hasta, solo_nuevos = self._solicitud_historial
+        if self._historial_pendiente:
+            # Si la carga anterior se reemplaza sin llegar a la vista, sus agregados se perderían
+            solo_nuevos = False
+        self._generacion_historial = self.controller.iniciar_carga_historial(fecha_desde, fecha_hasta, solo_nuevos)
+        self._historial_pendiente = True
+        self._fecha_desde_historial = fecha_desde
 
     @Slot()
     def on_exportar_clicked(self):
-        """Exportar datos a un archivo CSV"""
-        ruta_archivo, _ = QFileDialog.getSaveFileName(
+        """Exportar datos a un archivo en el formato elegido"""
+        filtros = {
+            "Archivos CSV (*.csv)": 'csv',
+            "Parquet (*.parquet)": 'parquet',
+            "Arrow IPC (*.arrow)": 'arrow',
+            "JSON Lines comprimido gzip (*.jsonl.gz)": 'jsonl.gz',
+            "JSON Lines comprimido zstd (*.jsonl.zst)": 'jsonl.zst',
+            "JSON Lines (*.jsonl)": 'jsonl',
+        }
+        ruta_archivo, filtro = QFileDialog.getSaveFileName(
             self,
-            "Exportar a CSV",
+            "Exportar pesajes",
             os.path.expanduser("~/pesajes_export.csv"),
-            "Archivos CSV (*.csv)"
+            ";;".join(filtros)
         )
         
         if ruta_archivo:
-            self.controller.exportar_a_csv(ruta_archivo)
+            formato = filtros.get(filtro, 'csv')
+            extension = FORMATOS[formato][0]
+            if not ruta_archivo.lower().endswith(extension):
+                ruta_archivo = os.path.splitext(ruta_archivo)[0] + extension
+            
+            if self.ui.tabWidget.currentWidget() == self.ui.tab_historial:
+                # Desde el historial se exporta lo filtrado (fechas, vendedor y producto), en paralelo y en segundo plano
+                fecha_desde = datetime.combine(self.ui.dateEdit_desde.date().toPython(), time.min)
+                fecha_hasta = datetime.combine(self.ui.dateEdit_hasta.date().toPython(), time.min) + timedelta(days=1)
+                if self.controller.iniciar_exportacion_paralela(
+                    ruta_archivo, fecha_desde, fecha_hasta, formato,
+                    codigo_vendedor=self.ui.lineEdit_filtro_vendedor.text().strip() or None,
+                    producto=self.lineEdit_filtro_producto.text().strip() or None
+                ):
+                    self.statusBar().showMessage("Exportando...")
+                else:
+                    self.statusBar().showMessage("Ya hay una exportación en curso", 5000)
+            else:
+                self.controller.exportar(ruta_archivo, formato)
     
     @Slot()
     def on_actualizar_estadisticas_clicked(self):
         """Actualizar las estadísticas de vendedores"""
-        self.controller.cargar_estadisticas()
+        self.timer_estadisticas.start()
+    
+    def solicitar_estadisticas(self):
+        """Iniciar la carga de las estadísticas diferida por on_actualizar_estadisticas_clicked"""
+        self._generacion_estadisticas = self.controller.iniciar_carga_estadisticas()
+        self.solicitar_series()
+    
+    def solicitar_series(self):
+        """Iniciar la carga de las series de kilos del rango elegido para el gráfico"""
+        if self.grafico_series is None:
+            return
+        # Redondear al minuto para que las solicitudes seguidas del mismo rango se unan
+        ahora = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        desde, hasta = RANGOS_GRAFICO[self.comboBox_rango_grafico.currentIndex()][1](ahora)
+        self._generacion_series = self.controller.iniciar_carga_series(desde, hasta, PUNTOS_GRAFICO)
     
     @Slot()
     def on_acerca_de(self):
@@ -228,11 +588,53 @@ class MainWindow(QMainWindow):
             "© 2025 - Todos los derechos reservados"
         )
     
+    @Slot()
+    def on_cierre_diario_triggered(self):
+        """Iniciar la generación del cierre del día en segundo plano"""
+        if self.controller.iniciar_cierre(datetime.now().date()):
+            self.statusBar().showMessage("Generando el cierre del día...")
+        else:
+            self.statusBar().showMessage("Ya hay un cierre en curso", 5000)
+    
+    @Slot()
+    def on_perfilar_triggered(self):
+        """Iniciar o detener una sesión de perfilado"""
+        ruta = Perfilador().alternar(modo_desde_entorno() or 'tiempos')
+        if ruta:
+            self.statusBar().showMessage(f"Reporte de perfilado guardado en {ruta}", 5000)
+        else:
+            self.statusBar().showMessage("Perfilado iniciado (Ctrl+Shift+P para detener)", 5000)
+    
+    def closeEvent(self, event):
+        """Detener los hilos de entrada antes de cerrar la ventana"""
+        self.timer_escaner.stop()
+        if self.lector_escaner is not None:
+            self.lector_escaner.detener()
+        if self.lector_balanza is not None:
+            self.lector_balanza.detener()
+        self.controller.carga_historial.cancelar()
+        self.controller.carga_estadisticas.cancelar()
+        self.controller.carga_series.cancelar()
+        self.controller.detector.guardar()
+        if self.grabador is not None:
+            self.grabador.cerrar()
+        Perfilador().detener()
+        super().closeEvent(event)
+    
     # ===== SLOTS PARA SEÑALES DEL CONTROLADOR =====
     
     @Slot(int)
     def on_pesaje_guardado(self, pesaje_id):
         """Manejar evento cuando se guarda un pesaje correctamente"""
+        if self.modo_rapido:
+            # Aviso no bloqueante; el vendedor queda establecido para el siguiente escaneo
+            self.statusBar().showMessage(
+                f"Registro {pesaje_id} guardado - "
+                f"{self.controller.pesajes_por_minuto():.0f} pesajes/min - Ctrl+Z para deshacer"
+            )
+            self.limpiar_producto(conservar_entrada=True)
+            return
+        
         QMessageBox.information(
             self,
             "Registro guardado",
@@ -242,18 +644,44 @@ class MainWindow(QMainWindow):
         # Limpiar el formulario después de guardar
         self.on_limpiar_clicked()
     
+    @Slot(int)
+    def on_pesaje_deshecho(self, pesaje_id):
+        """Informar que se revirtió un registro"""
+        # Quitarlo también del historial si está cargado
+        for row in range(self.modelo_historial.rowCount()):
+            if self.modelo_historial.item(row, 0).text() == str(pesaje_id):
+                self.modelo_historial.removeRow(row)
+                break
+        
+        self.statusBar().showMessage(
+            f"Registro {pesaje_id} deshecho "
+            f"({self.controller.deshacer.disponibles()} más disponibles para deshacer)",
+            5000
+        )
+    
     @Slot(list)
     def on_pesajes_actualizados(self, pesajes):
-        """Actualizar la tabla con los pesajes cargados"""
-        # Determinar qué tabla actualizar según la pestaña activa
-        if self.ui.tabWidget.currentIndex() == 0:  # Pestaña Registro
-            self.actualizar_tabla_registros(pesajes)
-        else:  # Pestaña Historial
+        """Actualizar la tabla de registros recientes con los pesajes cargados"""
+        self.actualizar_tabla_registros(pesajes)
+    
+    @Slot(list, bool, int)
+    def on_historial_actualizado(self, pesajes, incremental, generacion):
+        """Actualizar la tabla de historial; los agregados incrementales se suman a las filas existentes"""
+        if generacion != self._generacion_historial:
+            return  # resultado de una carga reemplazada
+        self._historial_pendiente = False
+        self._historial_desde_cache = self.controller.historial_cache.cubre(self._fecha_desde_historial)
+        if incremental:
+            for pesaje in pesajes:
+                self.agregar_fila_historial(pesaje)
+        else:
             self.actualizar_tabla_historial(pesajes)
     
-    @Slot(list)
-    def on_estadisticas_actualizadas(self, estadisticas):
+    @Slot(list, int)
+    def on_estadisticas_actualizadas(self, estadisticas, generacion):
         """Actualizar la tabla con las estadísticas de vendedores"""
+        if generacion != self._generacion_estadisticas:
+            return  # resultado de una carga reemplazada
         self.modelo_estadisticas.setRowCount(0)  # Limpiar la tabla
         
         for row, est in enumerate(estadisticas):
@@ -264,9 +692,69 @@ class MainWindow(QMainWindow):
             self.modelo_estadisticas.setItem(row, 3, QStandardItem(f"{est['peso_total']:.2f} kg"))
             self.modelo_estadisticas.setItem(row, 4, QStandardItem(f"{est['peso_promedio']:.2f} kg"))
     
+    @Slot(object, int)
+    def on_series_actualizadas(self, resultado, generacion):
+        """Redibujar el gráfico con las series de kilos de los vendedores con más kilos"""
+        if generacion != self._generacion_series or self.grafico_series is None:
+            return  # resultado de una carga reemplazada
+        self.grafico_series.removeAllSeries()
+        for eje in self.grafico_series.axes():
+            self.grafico_series.removeAxis(eje)
+        
+        instantes = [int(inicio.timestamp() * 1000) for inicio in resultado['inicios']]
+        eje_x = QDateTimeAxis()
+        eje_x.setFormat("HH:mm" if resultado['ancho'] < timedelta(days=1) else "dd/MM")
+        eje_x.setRange(
+            QDateTime.fromMSecsSinceEpoch(instantes[0]),
+            QDateTime.fromMSecsSinceEpoch(int((resultado['inicios'][-1] + resultado['ancho']).timestamp() * 1000))
+        )
+        eje_y = QValueAxis()
+        eje_y.setLabelFormat("%.0f kg")
+        self.grafico_series.addAxis(eje_x, Qt.AlignBottom)
+        self.grafico_series.addAxis(eje_y, Qt.AlignLeft)
+        
+        principales = sorted(resultado['series'].items(), key=lambda item: sum(item[1]), reverse=True)
+        maximo = 0
+        for codigo_vendedor, kilos in principales[:VENDEDORES_GRAFICO]:
+            serie = QLineSeries()
+            serie.setName(codigo_vendedor)
+            for instante, valor in zip(instantes, kilos):
+                serie.append(instante, valor)
+            maximo = max(maximo, max(kilos))
+            self.grafico_series.addSeries(serie)
+            serie.attachAxis(eje_x)
+            serie.attachAxis(eje_y)
+        eje_y.setRange(0, maximo * 1.1 or 1)
+        horas = int(resultado['ancho'].total_seconds() // 3600)
+        intervalo = f"{horas} h" if horas < 24 else f"{horas // 24} d"
+        self.grafico_series.setTitle(f"Kilos por vendedor (intervalos de {intervalo})")
+    
+    @Slot(object)
+    def on_cierre_completado(self, resultado):
+        """Manejar evento cuando termina la generación del cierre diario"""
+        self.statusBar().showMessage(
+            f"Cierre generado en {resultado['directorio']}: {resultado['pesajes']} pesajes, "
+            f"{resultado['regenerados']} de {resultado['vendedores']} vendedores actualizados",
+            10000
+        )
+    
+    @Slot(int, list)
+    def on_anomalia_detectada(self, pesaje_id, anomalias):
+        """Avisar, sin interrumpir la carga, que el pesaje registrado parece anómalo"""
+        self.statusBar().showMessage(
+            f"Atención: el registro {pesaje_id} parece anómalo - " + "; ".join(a.detalle for a in anomalias),
+            15000
+        )
+    
+    @Slot(int, int)
+    def on_exportacion_progreso(self, filas, total):
+        """Mostrar el avance de una exportación en paralelo"""
+        self.statusBar().showMessage(f"Exportando... {filas} de {total} pesajes ({filas / total:.0%})")
+    
     @Slot(str)
     def on_exportacion_completada(self, ruta_archivo):
         """Manejar evento cuando se completa la exportación"""
+        self.statusBar().clearMessage()
         QMessageBox.information(
             self,
             "Exportación completada",
@@ -279,6 +767,14 @@ class MainWindow(QMainWindow):
         """Actualizar los campos con la información del producto encontrado"""
         if producto:
             self.ui.lineEdit_producto.setText(producto["nombre"])
+            
+        # En modo rápido, con el vendedor ya establecido, guardar de inmediato la etiqueta procesada
+        # (no el campo de código, donde ya puede estar entrando el próximo escaneo; si el producto
+        # espera el peso de la balanza, se guarda cuando llegue)
+            if (self.modo_rapido and self.etiqueta_actual and self.ui.lineEdit_vendedor.text().strip()
+                    and self.ui.lineEdit_peso.text().strip()):
+                self.guardar_registro(self.etiqueta_actual)
+                return
                 
         # Mover el foco al campo de código de vendedor
             self.ui.lineEdit_codigo_vendedor.setFocus()
@@ -320,23 +816,37 @@ class MainWindow(QMainWindow):
         """Actualizar la tabla de historial completo"""
         self.modelo_historial.setRowCount(0)  # Limpiar la tabla
         
-        for row, pesaje in enumerate(pesajes):
-            self.modelo_historial.insertRow(row)
-            
-            # Formatear la fecha/hora
-            fecha_hora = datetime.fromisoformat(str(pesaje['fecha_hora']))
-            fecha_formateada = fecha_hora.strftime("%d/%m/%Y %H:%M")
-            
-            # Poblar la tabla
-            self.modelo_historial.setItem(row, 0, QStandardItem(str(pesaje['id'])))
-            self.modelo_historial.setItem(row, 1, QStandardItem(fecha_formateada))
-            self.modelo_historial.setItem(row, 2, QStandardItem(pesaje['nombre_producto']))
-            self.modelo_historial.setItem(row, 3, QStandardItem(f"{pesaje['peso']:.2f} kg"))
-            self.modelo_historial.setItem(row, 4, QStandardItem(pesaje['codigo_vendedor']))
-            self.modelo_historial.setItem(row, 5, QStandardItem(pesaje['nombre_vendedor']))
+        for pesaje in pesajes:
+            self.agregar_fila_historial(pesaje)
+    
+    def agregar_fila_historial(self, pesaje):
+        """Agregar un pesaje al final de la tabla de historial"""
+        # Formatear la fecha/hora
+        fecha_hora = datetime.fromisoformat(str(pesaje['fecha_hora']))
+        fecha_formateada = fecha_hora.strftime("%d/%m/%Y %H:%M")
+        
+        # La fecha y el código de producto se guardan aparte para el filtrado en el cliente
+        item_fecha = QStandardItem(fecha_formateada)
+        item_fecha.setData(fecha_hora.strftime(FORMATO_FECHA_ORDENABLE), Qt.UserRole)
+        item_producto = QStandardItem(pesaje['nombre_producto'])
+        item_producto.setData(pesaje['codigo_producto'], Qt.UserRole)
+        
+        # Poblar la tabla
+        self.modelo_historial.appendRow([
+            QStandardItem(str(pesaje['id'])),
+            item_fecha,
+            item_producto,
+            QStandardItem(f"{pesaje['peso']:.2f} kg"),
+            QStandardItem(pesaje['codigo_vendedor']),
+            QStandardItem(pesaje['nombre_vendedor']),
+        ])
     
     def mostrar_error(self, mensaje):
         """Mostrar un diálogo de error"""
+        if self.manejador_errores is not None:
+            self.manejador_errores(mensaje)
+            self.statusBar().showMessage(mensaje, 5000)
+            return
         QMessageBox.critical(
             self,
             "Error",
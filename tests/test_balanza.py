@@ -0,0 +1,48 @@
+"""
+Pruebas del emparejamiento entre los pesos de la balanza y los escaneos de productos
+"""
+import time
+import unittest
+from controllers.balanza import EmparejadorPesaje, FiltroEstabilidad, LectorBalanzaSerie
+from controllers.escaner import EventoEscaneo
+
+class PruebaEmparejamientoBalanza(unittest.TestCase):
+    """Secuencias de tramas de la balanza seguidas de escaneos de productos"""
+
+    def setUp(self):
+        self.emparejador = EmparejadorPesaje(vigencia_s=10)
+        self.lector = LectorBalanzaSerie('/dev/null', FiltroEstabilidad(), self.emparejador)
+
+    def tramas(self, *tramas):
+        """Entrega las tramas al lector (todas caen dentro de la ventana del filtro)"""
+        for trama in tramas:
+            self.lector.procesar_trama(trama)
+
+    def escanear(self, codigo):
+        return self.emparejador.emparejar(EventoEscaneo(codigo, time.monotonic(), 'teclado'))
+
+    def test_peso_estable_se_empareja_con_el_escaneo(self):
+        self.tramas("ST,GS,+  1.234kg", "ST,GS,+  1.234kg", "ST,GS,+  1.234kg")
+        self.assertEqual(self.escanear('P001').peso, 1.234)
+
+    def test_descarga_olvida_el_peso_anterior(self):
+        self.tramas("ST,GS,+  1.234kg", "ST,GS,+  1.234kg", "ST,GS,+  1.234kg")
+        self.tramas("ST,GS,+  0.000kg")
+        self.tramas("US,GS,+  0.870kg", "US,GS,+  0.910kg")
+        self.assertIsNone(self.escanear('P002').peso)
+
+    def test_lectura_inestable_olvida_el_peso_anterior(self):
+        self.tramas("ST,GS,+  1.234kg", "ST,GS,+  1.234kg", "ST,GS,+  1.234kg")
+        self.tramas("US,GS,+  1.560kg")
+        self.assertIsNone(self.escanear('P002').peso)
+
+    def test_escaneo_pendiente_recibe_el_peso_de_la_pieza_nueva(self):
+        entregados = []
+        self.emparejador.pipeline = type('Pipeline', (), {'encolar': lambda _, evento: entregados.append(evento)})()
+        self.tramas("ST,GS,+  1.234kg", "ST,GS,+  1.234kg", "ST,GS,+  1.234kg", "ST,GS,+  0.000kg")
+        self.assertIsNone(self.escanear('P002').peso)
+        self.tramas("US,GS,+  0.900kg", "ST,GS,+  0.850kg", "ST,GS,+  0.850kg", "ST,GS,+  0.850kg")
+        self.assertEqual([(e.etiqueta, e.peso) for e in entregados], [('P002', 0.85)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+Pruebas de la actualización de las estadísticas del detector de anomalías
+"""
+import unittest
+from controllers.detector_anomalias import DetectorAnomalias
+
+class PruebaIncorporacionDetector(unittest.TestCase):
+    """Puntuar no altera las estadísticas; incorporar las actualiza y revertir las restaura"""
+
+    def setUp(self):
+        self.detector = DetectorAnomalias(ruta_estado=None)
+        self.marca = 1000.0
+        for i in range(40):
+            self.incorporar(1.0 + (i % 5) * 0.02)
+
+    def puntuar(self, peso):
+        self.marca += 30
+        return self.detector.puntuar('P001', 'V001', peso, self.marca)
+
+    def incorporar(self, peso):
+        return self.detector.incorporar(self.puntuar(peso))
+
+    def estado(self):
+        producto = self.detector._productos['P001']
+        return (producto.n, round(producto.media, 12), round(producto.m2, 12),
+                self.detector._vendedores['V001'].campos())
+
+    def test_puntuar_no_modifica_las_estadisticas(self):
+        antes = self.estado()
+        evaluacion = self.puntuar(1.05)
+        self.assertEqual(evaluacion.anomalias, [])
+        self.assertEqual(self.estado(), antes)
+
+    def test_revertir_restaura_el_estado_anterior(self):
+        antes = self.estado()
+        self.detector.revertir(self.incorporar(1.05))
+        self.assertEqual(self.estado(), antes)
+
+    def test_revertir_con_pesajes_posteriores_quita_solo_su_aporte(self):
+        n_producto, _, _, (n_vendedor, _, _, _) = self.estado()
+        incorporacion = self.incorporar(1.07)
+        self.incorporar(1.01)
+        self.detector.revertir(incorporacion)
+        self.assertEqual(self.detector._productos['P001'].n, n_producto + 1)
+        self.assertEqual(self.detector._vendedores['V001'].n, n_vendedor + 1)
+
+    def test_peso_atipico_no_se_incorpora_al_producto(self):
+        evaluacion = self.puntuar(5.0)
+        self.assertEqual([a.tipo for a in evaluacion.anomalias], ['peso_atipico'])
+        self.detector.incorporar(evaluacion)
+        self.assertEqual(self.detector._productos['P001'].n, 40)
+
+if __name__ == '__main__':
+    unittest.main()